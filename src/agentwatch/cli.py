@@ -3,7 +3,10 @@ import shutil
 import sys
 from pathlib import Path
 
-from agentwatch.consts import AGENTWATCH_INTERNAL
+from agentwatch.consts import (AGENTWATCH_COLLECTOR, AGENTWATCH_EXPORT_TOKEN, AGENTWATCH_INTERNAL, DEFAULT_DRAIN_TIMEOUT,
+                               DEFAULT_SHARD_QUEUE_SIZE)
+from agentwatch.enums import BacklogPolicy
+from agentwatch.export.consts import DEFAULT_AGGREGATOR_HOST, DEFAULT_AGGREGATOR_PORT, DEFAULT_MAX_AGGREGATED_GRAPHS
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 os.environ[AGENTWATCH_INTERNAL] = "1"
@@ -17,7 +20,7 @@ from pathlib import Path
 from typing import Any
 
 from agentwatch.visualization.app import run_fastapi
-from agentwatch.visualization.consts import VISUALIZATION_SERVER_PORT
+from agentwatch.visualization.consts import API_EVENTS, VISUALIZATION_SERVER_PORT
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
@@ -58,6 +61,27 @@ def run_ui(args: argparse.Namespace) -> None:
     except KeyboardInterrupt:
         pass
     
+def run_collector(args: argparse.Namespace) -> None:
+    from agentwatch.collector import default_collector_address
+    from agentwatch.collector import run_collector as serve
+
+    address = args.socket or default_collector_address()
+    print(f"Collector listening on {address}, set {AGENTWATCH_COLLECTOR}={address} in clients using another path")
+    try:
+        serve(address, args.export, args.process_pool, args.queue_size, BacklogPolicy(args.backlog_policy), args.drain_timeout)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+
+def run_aggregator(args: argparse.Namespace) -> None:
+    from agentwatch.export.aggregator import run_aggregator as serve
+
+    webhooks = args.webhook or [f"http://localhost:{VISUALIZATION_SERVER_PORT}{API_EVENTS}"]
+    print(f"Aggregator listening on {args.bind}:{args.port}, forwarding the merged graphs to {', '.join(webhooks)}")
+    try:
+        serve(args.bind, args.port, os.environ.get(AGENTWATCH_EXPORT_TOKEN), args.tls_cert, args.tls_key, args.max_graphs, webhooks)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+
 def main() -> None:
     parser = argparse.ArgumentParser(prog="agentwatch", description="agentwatch - a platform agnostic agentic ai observability framework")
     subparsers = parser.add_subparsers(dest="command", required=True)
@@ -68,6 +92,33 @@ def main() -> None:
 
     ui_parser.set_defaults(func=run_ui)
 
+    # Collector Command
+    collector_parser = subparsers.add_parser("collector", help="Run a collector shared by every agentwatch process of this user")
+    collector_parser.add_argument('-s', '--socket', help='Unix socket to listen on')
+    collector_parser.add_argument('-e', '--export', help='host:port of an aggregator to export the graph updates to')
+    collector_parser.add_argument('-p', '--process-pool', type=int, default=0, help='Worker processes that parse large payloads')
+    collector_parser.add_argument('-q', '--queue-size', type=int, default=DEFAULT_SHARD_QUEUE_SIZE, help='Events queued per worker, 0 is unbounded')
+    collector_parser.add_argument('-b', '--backlog-policy', choices=[policy.value for policy in BacklogPolicy], default=BacklogPolicy.BACKPRESSURE.value,
+                                  help='Once a queue is full, stop reading events (clients buffer them) or shed them')
+    collector_parser.add_argument('-d', '--drain-timeout', type=float, default=DEFAULT_DRAIN_TIMEOUT,
+                                  help='Seconds to keep processing the queued events once interrupted')
+
+    collector_parser.set_defaults(func=run_collector)
+
+    # Aggregator Command
+    aggregator_parser = subparsers.add_parser("aggregator", help="Merge the graphs exported by the collectors of many hosts")
+    aggregator_parser.add_argument('-b', '--bind', default=DEFAULT_AGGREGATOR_HOST,
+                                   help=f'Address to listen on, any other than loopback requires {AGENTWATCH_EXPORT_TOKEN} to be set')
+    aggregator_parser.add_argument('-p', '--port', type=int, default=DEFAULT_AGGREGATOR_PORT, help='Port to listen on')
+    aggregator_parser.add_argument('--tls-cert', help='Certificate (chain) to serve the exporters over TLS')
+    aggregator_parser.add_argument('--tls-key', help='Private key of the certificate, unless it holds it')
+    aggregator_parser.add_argument('-m', '--max-graphs', type=int, default=DEFAULT_MAX_AGGREGATED_GRAPHS,
+                                   help='Graphs (per host and execution) kept, the least recently updated are evicted')
+    aggregator_parser.add_argument('-w', '--webhook', action='append',
+                                   help='URL the merged graph updates are posted to, repeatable (the local UI by default)')
+
+    aggregator_parser.set_defaults(func=run_aggregator)
+
     args = parser.parse_args()
     args.func(args)
 
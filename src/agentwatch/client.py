@@ -1,32 +1,100 @@
+import asyncio
 import atexit
+import functools
 import logging
 import multiprocessing
 import multiprocessing.synchronize
 import os
 import signal
+import threading
 import time
 import uuid
+import weakref
+from multiprocessing.connection import Connection
 from typing import Any, Optional, Type
 
-from agentwatch.enums import CommandAction
-from agentwatch.event_processor import EventProcessor
+from agentwatch.collector import connect_collector, run_private_collector
+from agentwatch.consts import (COLLECTOR_STARTUP_TIMEOUT, DEFAULT_BUFFER_SHUTDOWN_TIMEOUT, DEFAULT_DRAIN_TIMEOUT,
+                               DEFAULT_EVENT_BATCH_BYTES, DEFAULT_EVENT_BATCH_LINGER, DEFAULT_EVENT_BATCH_SIZE,
+                               DEFAULT_EVENT_BUFFER_SIZE)
+from agentwatch.enums import CommandAction, OverflowPolicy, OverheadStage
+from agentwatch.event_buffer import EventBuffer
 from agentwatch.hooks.base import BaseHook, HookCallbackProto
 from agentwatch.hooks.http.http_base_hook import HttpInterceptHook
 from agentwatch.hooks.http.httpcore_hook import HttpcoreHook
+from agentwatch.hooks.http.models import HostConnectionStats, HostTrafficStats, HttpInterceptRule, HttpSamplingRule
 from agentwatch.hooks.models import HookEvent
-from agentwatch.models import Command, CommandResponse
+from agentwatch.metrics import overhead_metrics
+from agentwatch.models import (AgentwatchStats, BufferStats, CollectorStats, Command, CommandResponse, DeliveryStats,
+                               DrainStats, EventAck, StartupStats)
 from agentwatch.pipes import Pipes
+from agentwatch.response_dispatcher import ResponseDispatcher
+from agentwatch.shm_ring import ShmRing
 
 logger = logging.getLogger(__name__)
 class AgentwatchClient(HookCallbackProto):
-    def __init__(self) -> None:
+    def __init__(self,
+                 buffer_size: int = DEFAULT_EVENT_BUFFER_SIZE,
+                 overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                 batch_size: int = DEFAULT_EVENT_BATCH_SIZE,
+                 batch_linger: float = DEFAULT_EVENT_BATCH_LINGER,
+                 batch_bytes: int = DEFAULT_EVENT_BATCH_BYTES,
+                 shm_ring_size: Optional[int] = None,
+                 collector_address: Optional[str] = None) -> None:
+        """
+        Args:
+            batch_bytes: A frame of events stops before the event that would take its captured bodies past this size
+            shm_ring_size: Send events to the collector through a shared memory ring of this many bytes,
+                           falling back to the pipe when it's full. By default only the pipe is used.
+            collector_address: Unix socket of a shared collector (see `agentwatch collector`), defaults to
+                               $AGENTWATCH_COLLECTOR or the per-user default path. When no collector listens
+                               there, a private collector process is spawned instead.
+        """
+        self._created_at = time.perf_counter()
         self._process: Optional[multiprocessing.Process] = None
         self._running = False
+        self._write_lock = threading.Lock()
+        self._control_lock = threading.Lock()
+
+        # Events are numbered on the flusher thread, the collector acknowledges them in bulk
+        self._event_seq = 0
+        self._ack = EventAck()
+        self._last_ack: Optional[float] = None
+
+        # Hook callbacks only enqueue, the flusher thread serializes and writes batches to the pipe
+        self._buffer_size = buffer_size
+        self._overflow_policy = overflow_policy
+        self._batch_size = batch_size
+        self._batch_linger = batch_linger
+        self._batch_bytes = batch_bytes
+        self._event_buffer = self._create_event_buffer()
 
         self._initialized_event = multiprocessing.Event()
+        # Set once the collector takes events, until then they're held in the event buffer
+        self._ready = threading.Event()
+        self._startup = StartupStats(hooks_ms=0)
+        # How the collector's shutdown went, only a private collector reports it
+        self._drain: Optional[DrainStats] = None
+
+        # Events go through their own pipe (and ring), other commands and every response through the
+        # control pipe, so they never wait behind an event backlog
+        self._collector_address = collector_address
+        self._client_fd: Optional[Connection] = None
+        self._control_client_fd: Optional[Connection] = None
+        self._ring: Optional[ShmRing] = None
 
-        self._client_fd, self._agentwatch_fd = multiprocessing.Pipe()
-        self._agentwatch = EventProcessor()
+        connections = connect_collector(collector_address)
+        self._shared = connections is not None
+        if connections is not None:
+            self._agentwatch_fd, self._control_fd = connections
+            if shm_ring_size:
+                logger.info("The shared memory ring isn't used with a shared collector")
+        else:
+            self._client_fd, self._agentwatch_fd = multiprocessing.Pipe()
+            self._control_client_fd, self._control_fd = multiprocessing.Pipe()
+            self._ring = ShmRing(capacity=shm_ring_size, create=True) if shm_ring_size else None
+        self._dispatcher = ResponseDispatcher(self._control_fd, on_ack=self._on_ack)
+        self._hooks: list[BaseHook] = []
 
         self._llm_hosts =[
             "api.openai.com",
@@ -44,20 +112,130 @@ class AgentwatchClient(HookCallbackProto):
         ])
 
         atexit.register(self._cleanup)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=functools.partial(_reinitialize_after_fork, weakref.ref(self)))
 
         self._execution_id = uuid.uuid4().hex
         self._start_agentwatch()
+        self._startup.hooks_ms = (time.perf_counter() - self._created_at) * 1000
 
     def set_verbose(self) -> None:
         logger.setLevel(logging.DEBUG)
         
     async def on_hook_callback(self, hook: BaseHook, obj: HookEvent) -> None:
-        logger.debug(f"Hook callback received: {obj.event_type}")
-        self.send_command(CommandAction.EVENT, obj.model_dump())
+        self._event_buffer.put(obj)
         
     def on_hook_callback_sync(self, hook: BaseHook, obj: HookEvent) -> None:
-        logger.debug(f"Hook callback received: {obj.event_type}")
-        self.send_command(CommandAction.EVENT, obj.model_dump())
+        self._event_buffer.put(obj)
+
+    def get_buffer_stats(self) -> BufferStats:
+        """
+        Counters of the in-process event buffer, including events dropped due to overflow
+        """
+        return self._event_buffer.stats()
+
+    def get_stats(self, include_collector: bool = True, timeout: float = 1.0) -> AgentwatchStats:
+        """
+        Self-overhead histograms per stage. Normalization and model_dump run on the intercepted
+        call's thread, command construction and the pipe write run on the flusher thread.
+
+        Args:
+            include_collector: Also ask the collector process for its processing histogram and its shards' queues
+            timeout: Maximum time to wait for the collector in seconds
+        """
+        collector = CollectorStats(overhead={})
+        if include_collector and self._running:
+            try:
+                response = self.send_command_wait(CommandAction.STATS, timeout=timeout)
+                if response is not None and response.success and response.data:
+                    collector = CollectorStats.model_validate(response.data)
+            except TimeoutError:
+                logger.debug("Timeout waiting for collector stats")
+            except (ConnectionError, EOFError) as e:
+                # The collector went away (BrokenPipeError is a ConnectionError), report the client's side only
+                logger.debug(f"Collector unreachable for stats: {e}")
+
+        return AgentwatchStats(overhead=overhead_metrics.snapshot(),
+                               buffer=self._event_buffer.stats(),
+                               collector=collector.overhead,
+                               shards=collector.shards,
+                               ring=self._ring.stats() if self._ring else None,
+                               delivery=self.get_delivery_stats(),
+                               startup=self.get_startup_stats())
+
+    def get_delivery_stats(self) -> DeliveryStats:
+        """
+        How far behind the collector is (events sent but not acknowledged yet) and how many events were lost on the way
+        """
+        ack = self._ack
+        return DeliveryStats(sent=self._event_seq,
+                             acked=ack.seq,
+                             lag=self._event_seq - ack.seq,
+                             processed=ack.processed,
+                             buffer_dropped=self._event_buffer.stats().dropped,
+                             collector_dropped=ack.dropped,
+                             lost=ack.lost,
+                             last_ack=self._last_ack)
+
+    def get_startup_stats(self) -> StartupStats:
+        return self._startup.model_copy()
+
+    def get_drain_stats(self) -> Optional[DrainStats]:
+        return self._drain.model_copy() if self._drain else None
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the collector to start, events captured meanwhile are buffered and sent once it has.
+
+        Returns:
+            False if the timeout expired first
+        """
+        return self._ready.wait(timeout)
+
+    def get_connection_stats(self) -> dict[str, HostConnectionStats]:
+        """
+        Per-host connection metrics of the intercepted requests, i.e. how many of them paid for
+        a new TCP connection and TLS handshake instead of reusing a pooled connection
+        """
+        stats: dict[str, HostConnectionStats] = {}
+        for hook in self._hooks:
+            if isinstance(hook, HttpcoreHook):
+                for host, host_stats in hook.connection_stats().items():
+                    if host not in stats:
+                        stats[host] = host_stats
+                    else:
+                        stats[host].merge(host_stats)
+        return stats
+
+    def get_traffic_stats(self) -> dict[str, HostTrafficStats]:
+        """
+        Per-host count and latency of every intercepted call, including the ones sampled out
+        """
+        stats: dict[str, HostTrafficStats] = {}
+        for hook in self._hooks:
+            if isinstance(hook, HttpcoreHook):
+                for host, host_stats in hook.traffic_stats().items():
+                    if host not in stats:
+                        stats[host] = host_stats
+                    else:
+                        stats[host].merge(host_stats)
+        return stats
+
+    def set_sampling_rules(self, rules: list[HttpSamplingRule]) -> None:
+        """
+        Capture only a sample of the intercepted calls, per host (see HttpSamplingRule)
+        """
+        for hook in self._hooks:
+            if isinstance(hook, HttpcoreHook):
+                hook.set_sampling_rules(rules)
+
+    def set_intercept_rules(self, rules: list[HttpInterceptRule]) -> None:
+        """
+        Replace the intercept rules of all HTTP hooks at runtime.
+        Requests that don't match any rule are passed to the original handler untouched.
+        The rules only live in this process, the collector processes whatever the hooks report.
+        """
+        self._apply_intercept_rules(rules)
 
     def send_command(self, action: CommandAction, params: Optional[dict[str, Any]] = None) -> str:
         """
@@ -73,7 +251,9 @@ class AgentwatchClient(HookCallbackProto):
         if not self._running:
             raise RuntimeError("Library is not initialized")
         
+        start = time.perf_counter_ns()
         cmd = Command.from_dict(self._execution_id, action, params)
+        overhead_metrics.record(OverheadStage.COMMAND, start)
         self._write_command(cmd)
         
         return cmd.callback_id
@@ -93,27 +273,43 @@ class AgentwatchClient(HookCallbackProto):
         if not self._running:
             raise RuntimeError("Library is not initialized")
         
-        # Create and send command
+        # Create and send command, the future is registered first in case the response is fast
         cmd = Command.from_dict(self._execution_id, action, params)
-        self._write_command(cmd)
-        
-        # Wait for response with timeout
-        while True:
-            try:
-                response = self._read_response(timeout)
-                if response:
-                    if response.callback_id == cmd.callback_id:
-                        logger.debug(f"Received response: {response}")
-                        return response
-                    else:
-                        logger.debug(f"Skipping response with id {response.callback_id}")
-                        continue
-                else:
-                    # TODO: Fix timeout stuff
-                    logger.debug("No response received")
-                    return None
-            except TimeoutError:
-                raise TimeoutError(f"Timeout waiting for response to {action}")
+        future = self._dispatcher.register(cmd.callback_id)
+        try:
+            self._write_command(cmd)
+            response = future.result(timeout)
+            logger.debug(f"Received response: {response}")
+            return response
+        except TimeoutError:
+            raise TimeoutError(f"Timeout waiting for response to {action}")
+        finally:
+            self._dispatcher.discard(cmd.callback_id)
+
+    async def send_command_async(self, action: CommandAction, params: Optional[dict[str, Any]] = None, timeout: float = 5.0) -> Optional[CommandResponse]:
+        """
+        Send a command and wait for the response without blocking the event loop
+
+        Args:
+            action: Command action name
+            params: Optional parameters for the command
+            timeout: Maximum time to wait for response in seconds
+
+        Returns:
+            Response object
+        """
+        if not self._running:
+            raise RuntimeError("Library is not initialized")
+
+        cmd = Command.from_dict(self._execution_id, action, params)
+        future = self._dispatcher.register(cmd.callback_id)
+        try:
+            self._write_command(cmd)
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Timeout waiting for response to {action}")
+        finally:
+            self._dispatcher.discard(cmd.callback_id)
 
     def _start_agentwatch(self) -> None:
         """Initialize the library by starting the process"""
@@ -121,63 +317,203 @@ class AgentwatchClient(HookCallbackProto):
             logger.warning("Library is already initialized")
             return
         
+        if self._shared:
+            self._running = True
+            self._dispatcher.start()
+            self._event_buffer.start()
+            self.send_command(CommandAction.HELLO)
+            self._mark_ready()
+            logger.info("agentwatch connected to the shared collector")
+            return
+
         logger.debug("Initializing library process")
         self._process = multiprocessing.Process(
-            target=self._agentwatch.start,
-            args=(self._client_fd, self._initialized_event),
+            target=run_private_collector,
+            args=(self._client_fd,
+                  self._initialized_event,
+                  self._ring.name if self._ring else None,
+                  self._control_client_fd,
+                  self._ring.lock if self._ring else None),
             daemon=True
         )
         
         self._process.start()
         self._running = True
-        
-        try:
-            self._initialized_event.wait(5)
-        except multiprocessing.TimeoutError:
-            logger.error("Timeout waiting for agentwatch to initialize")
-            self._cleanup()
+        self._dispatcher.start()
+        # Hooks are already in place, their events wait in the buffer until the collector is up
+        self._event_buffer.start(paused=True)
+        threading.Thread(target=self._wait_for_collector, name="agentwatch-startup", daemon=True).start()
+
+    def _wait_for_collector(self) -> None:
+        """Runs on the startup thread, releases the buffered events once the collector is initialized"""
+        deadline = time.monotonic() + COLLECTOR_STARTUP_TIMEOUT
+        while not self._initialized_event.wait(0.1):
+            if self._process is None or not self._process.is_alive() or time.monotonic() > deadline:
+                logger.error("agentwatch collector didn't start, buffered events are sent in case it does")
+                self._startup.timed_out = True
+                break
 
-        if self._initialized_event.is_set():
-            logger.info("agentwatch initialized successfully")
+        self._mark_ready()
+
+    def _mark_ready(self) -> None:
+        if not self._startup.timed_out:
+            self._startup.ready_ms = (time.perf_counter() - self._created_at) * 1000
+            self._startup.buffered = self._event_buffer.stats().size
+            logger.info(f"agentwatch initialized in {self._startup.ready_ms:.0f}ms "
+                        f"({self._startup.buffered} events buffered while starting)")
+        self._event_buffer.resume()
+        self._ready.set()
 
     
     def _apply_hooks(self, hooks: list[Type[BaseHook]]) -> None:
         for hook in hooks:
             hook_instance = hook(callback_handler=self)
             hook_instance.apply_hook()
-            
-            if isinstance(hook_instance, HttpInterceptHook):
-                for host in self._llm_hosts:
-                    hook_instance.add_intercept_rule(host)
+            self._hooks.append(hook_instance)
+
+        self._apply_intercept_rules([HttpInterceptRule(host=host) for host in self._llm_hosts])
+
+    def _apply_intercept_rules(self, rules: list[HttpInterceptRule]) -> None:
+        for hook in self._hooks:
+            if isinstance(hook, HttpInterceptHook):
+                hook.set_intercept_rules(rules)
                     
+    def _flush_events(self, events: list[HookEvent]) -> None:
+        """Runs on the flusher thread, the whole batch is written as a single frame"""
+        if not self._running:
+            raise RuntimeError("Library is not initialized")
+
+        commands: list[Command] = []
+        seq = self._event_seq
+        for event in events:
+            start = time.perf_counter_ns()
+            params = event.model_dump()
+            overhead_metrics.record(OverheadStage.MODEL_DUMP, start)
+
+            start = time.perf_counter_ns()
+            command = Command.from_dict(self._execution_id, CommandAction.EVENT, params)
+            seq += 1
+            command.seq = seq
+            commands.append(command)
+            overhead_metrics.record(OverheadStage.COMMAND, start)
+
+        # Unsent events don't take a seq, the collector would wait for them when draining
+        self._write_commands(commands)
+        self._event_seq = seq
+
+    def _on_ack(self, ack: EventAck) -> None:
+        self._ack = ack
+        self._last_ack = time.time()
+
+    def _create_event_buffer(self) -> EventBuffer[HookEvent]:
+        return EventBuffer(self._flush_events,
+                           max_size=self._buffer_size,
+                           overflow_policy=self._overflow_policy,
+                           max_batch_size=self._batch_size,
+                           linger=self._batch_linger,
+                           max_batch_bytes=self._batch_bytes,
+                           size_of=_captured_bytes)
+
+    def _after_fork(self) -> None:
+        """
+        Runs in the child of a fork. The flusher and dispatcher threads didn't survive it and the
+        connections are shared with the parent, writing to them would interleave with its frames.
+        A shared collector is reconnected to as a new client, a private one belongs to the parent
+        so the child doesn't report anything.
+        """
+        was_running = self._running
+        self._running = False
+        self._created_at = time.perf_counter()
+        self._ready = threading.Event()
+        self._startup = StartupStats(hooks_ms=0)
+        self._drain = None
+        self._process = None
+        self._ring = None
+        self._write_lock = threading.Lock()
+        self._control_lock = threading.Lock()
+        self._event_seq = 0
+        self._ack = EventAck()
+        self._last_ack = None
+        self._event_buffer = self._create_event_buffer()
+        self._execution_id = uuid.uuid4().hex
+
+        # Only the child's copies, the collector still has its end (a private collector is such a child)
+        self._agentwatch_fd.close()
+        self._control_fd.close()
+
+        if not was_running or not self._shared:
+            return
+
+        connections = connect_collector(self._collector_address)
+        if connections is None:
+            logger.debug("Couldn't reconnect to the shared collector after fork")
+            return
+
+        self._agentwatch_fd, self._control_fd = connections
+        self._dispatcher = ResponseDispatcher(self._control_fd, on_ack=self._on_ack)
+        self._start_agentwatch()
+
     def _cleanup(self) -> None:
         """Cleanup function called on program exit"""
         if self._running:
             self.shutdown()
 
     def _write_command(self, command: Command) -> None:
-        """Write a command to the command pipe"""
+        """Write a command to the event pipe, or to the control pipe unless it's an event"""
+        if command.action == CommandAction.EVENT:
+            fd, lock, ring = self._agentwatch_fd, self._write_lock, self._ring
+        else:
+            fd, lock, ring = self._control_fd, self._control_lock, None
+
         try:
-            logger.debug(f"Sending command: {command.action}:{command.callback_id} to fd {self._agentwatch_fd.fileno()}")
-            Pipes.write_payload_sync(self._agentwatch_fd, command)
+            logger.debug(f"Sending command: {command.action}:{command.callback_id} to fd {fd.fileno()}")
+            with lock:
+                start = time.perf_counter_ns()
+                Pipes.write_payload_sync(fd, command, ring)
+                overhead_metrics.record(OverheadStage.PIPE_WRITE, start)
         except Exception as e:
             logger.error(f"Error writing command: {e}")
             raise
-    
-    def _read_response(self, timeout: float = 5.0) -> Optional[CommandResponse]:
-        """Read a response from the response pipe with timeout"""
-        return Pipes.read_response(self._agentwatch_fd, timeout)
 
-    def shutdown(self) -> None:
+    def _write_commands(self, commands: list[Command]) -> None:
+        """Write a batch of commands to the command pipe as a single frame"""
+        try:
+            logger.debug(f"Sending {len(commands)} commands to fd {self._agentwatch_fd.fileno()}")
+            with self._write_lock:
+                start = time.perf_counter_ns()
+                Pipes.write_frame_sync(self._agentwatch_fd, commands, self._ring)
+                overhead_metrics.record(OverheadStage.PIPE_WRITE, start)
+        except Exception as e:
+            logger.error(f"Error writing commands: {e}")
+            raise
+    
+    def shutdown(self, drain_timeout: float = DEFAULT_DRAIN_TIMEOUT) -> None:
+        """
+        Args:
+            drain_timeout: How long the collector may keep processing the events sent so far, what's
+                           left after that is abandoned (see get_drain_stats). A private collector
+                           that's still starting is first given as long to start
+        """
         if not self._running:
             logger.warning("agentwatch is not running")
             return
         
         logger.debug("Shutting down agentwatch")
         try:
-            # Send shutdown command
-            self.send_command(CommandAction.SHUTDOWN)
+            # Flush whatever the hooks buffered before asking the collector to stop
+            self._event_buffer.stop(DEFAULT_BUFFER_SHUTDOWN_TIMEOUT)
+
+            # A private collector that's still starting already has the events, give it a chance to drain them
+            if not self._ready.is_set() and self._process is not None and self._process.is_alive():
+                self._ready.wait(drain_timeout)
+
+            # Send shutdown command, a shared collector only ends our session
+            # Nobody's left to drain when the private collector is gone
+            if self._process is None or self._process.is_alive():
+                self._drain_collector(drain_timeout)
+            self._dispatcher.stop(DEFAULT_BUFFER_SHUTDOWN_TIMEOUT)
             self._agentwatch_fd.close()
+            self._control_fd.close()
             
             if self._process:
                 self._process.join(5)
@@ -198,4 +534,35 @@ class AgentwatchClient(HookCallbackProto):
             logger.error(f"Error shutting down process: {e}")
         finally:
             self._running = False
-            logger.debug("Library shutdown complete")      
\ No newline at end of file
+            if self._ring is not None:
+                with self._write_lock:
+                    self._ring.close()
+                    self._ring = None
+            logger.debug("Library shutdown complete")      
+
+    def _drain_collector(self, timeout: float) -> None:
+        try:
+            response = self.send_command_wait(CommandAction.SHUTDOWN,
+                                              {"last_seq": self._event_seq, "timeout": timeout},
+                                              timeout + DEFAULT_BUFFER_SHUTDOWN_TIMEOUT)
+        except TimeoutError:
+            logger.warning(f"agentwatch collector didn't drain within {timeout}s")
+            return
+
+        if response is not None and response.data:
+            self._drain = DrainStats.model_validate(response.data)
+            log = logger.warning if self._drain.abandoned else logger.debug
+            log(f"agentwatch collector processed {self._drain.flushed} events while shutting down, "
+                f"{self._drain.abandoned} abandoned")
+
+def _captured_bytes(event: HookEvent) -> int:
+    """Size of the bodies and stream messages an event carries, which is what makes a frame large"""
+    size = len(event.data.get("content") or b"") + len(event.data.get("body") or "")
+    for frame in event.data.get("frames") or []:
+        size += len(frame.get("data") or "")
+    return size
+
+def _reinitialize_after_fork(client_ref: "weakref.ref[AgentwatchClient]") -> None:
+    client = client_ref()
+    if client is not None:
+        client._after_fork()
@@ -0,0 +1,168 @@
+import logging
+import os
+import socket
+import stat
+import tempfile
+from multiprocessing.connection import Client, Connection, Listener
+from multiprocessing.synchronize import Event, Lock
+from typing import Optional
+
+from agentwatch.consts import AGENTWATCH_COLLECTOR, DEFAULT_DRAIN_TIMEOUT, DEFAULT_SHARD_QUEUE_SIZE
+from agentwatch.enums import BacklogPolicy
+
+logger = logging.getLogger(__name__)
+
+# Only the collector process imports the processing side (EventProcessor, the LLM models, aiohttp...),
+# the agent process gets by with the hooks and the transport.
+
+# A shared collector listens on a Unix socket, clients authenticate with the key stored next to it.
+# Both live in a directory only the user that started the collector can access, and clients refuse
+# a socket or a key owned by anyone else (or accessible to anyone else): the events carry captured
+# bodies and headers, and the connection is authenticated before anything is unpickled.
+
+def collector_dir() -> str:
+    """
+    The user's runtime directory when there's one, otherwise a directory of its own in the temp dir
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "agentwatch")
+    return os.path.join(tempfile.gettempdir(), f"agentwatch-{os.getuid()}")
+
+def default_collector_address() -> str:
+    return os.environ.get(AGENTWATCH_COLLECTOR) or os.path.join(collector_dir(), "collector.sock")
+
+def authkey_path(address: str) -> str:
+    return f"{address}.key"
+
+def is_private(path: str, file_type: Optional[int] = None) -> bool:
+    """
+    Whether `path` (not following symlinks) is owned by this user and inaccessible to anyone else.
+    With `file_type` (i.e. stat.S_IFSOCK), it must also be of that type.
+    """
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+
+    if file_type is not None and stat.S_IFMT(st.st_mode) != file_type:
+        return False
+    return st.st_uid == os.getuid() and stat.S_IMODE(st.st_mode) & 0o077 == 0
+
+def connect_collector(address: Optional[str] = None) -> Optional[tuple[Connection, Connection]]:
+    """
+    Open the event and control connections to the shared collector at `address`.
+
+    Returns:
+        None if no collector listens there, or if the socket or its key aren't private to this user
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    address = address or default_collector_address()
+    if not os.path.exists(address):
+        return None
+
+    key_path = authkey_path(address)
+    if not is_private(address, stat.S_IFSOCK) or not is_private(key_path, stat.S_IFREG):
+        logger.warning(f"Ignoring the collector at {address}, its socket or key is accessible to other users")
+        return None
+
+    connections: list[Connection] = []
+    try:
+        with open(key_path, "rb") as f:
+            authkey = f.read()
+        for _ in range(2):
+            connections.append(Client(address, family="AF_UNIX", authkey=authkey))
+    except Exception as e:
+        logger.debug(f"Couldn't connect to the collector at {address}: {e}")
+        for connection in connections:
+            connection.close()
+        return None
+
+    return connections[0], connections[1]
+
+def _prepare_collector_dir(address: str) -> None:
+    directory = os.path.dirname(os.path.abspath(address))
+    if address != os.path.join(collector_dir(), "collector.sock"):
+        # A path of the user's choice, only our own files in it are trusted
+        return
+
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not is_private(directory, stat.S_IFDIR):
+        raise RuntimeError(f"{directory} is accessible to other users (or isn't ours), refusing to listen there")
+
+def _write_authkey(key_path: str, authkey: bytes) -> None:
+    if os.path.lexists(key_path):
+        if not is_private(key_path, stat.S_IFREG):
+            raise RuntimeError(f"{key_path} already exists and isn't ours, refusing to overwrite it")
+        # Left behind by a collector that didn't exit cleanly
+        os.unlink(key_path)
+
+    # O_EXCL|O_NOFOLLOW: never write the key through a symlink or into somebody else's file
+    fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(authkey)
+
+def run_private_collector(pipe: Connection,
+                          init_event: Event,
+                          ring_name: Optional[str] = None,
+                          control_pipe: Optional[Connection] = None,
+                          ring_lock: Optional[Lock] = None) -> None:
+    """
+    Entry point of the collector process spawned by a client, see EventProcessor.start
+    """
+    from agentwatch.event_processor import EventProcessor
+
+    EventProcessor().start(pipe, init_event, ring_name, control_pipe, ring_lock)
+
+def run_collector(address: Optional[str] = None,
+                  export_address: Optional[str] = None,
+                  process_pool_workers: int = 0,
+                  queue_size: int = DEFAULT_SHARD_QUEUE_SIZE,
+                  backlog_policy: BacklogPolicy = BacklogPolicy.BACKPRESSURE,
+                  drain_timeout: float = DEFAULT_DRAIN_TIMEOUT) -> None:
+    """
+    Serve every agentwatch client of this user (on this host) from a single collector, until interrupted.
+    With `export_address` ("host:port"), the graph updates are also exported to an aggregator.
+    With `process_pool_workers`, large payloads are parsed by that many worker processes.
+    `queue_size` and `backlog_policy` bound the events queued per shard, see EventShard.
+    Once interrupted, the queued events are processed for up to `drain_timeout` seconds.
+    """
+    from agentwatch.event_processor import EventProcessor
+
+    address = address or default_collector_address()
+    _prepare_collector_dir(address)
+    if os.path.lexists(address):
+        connections = connect_collector(address)
+        if connections is not None:
+            for connection in connections:
+                connection.close()
+            raise RuntimeError(f"A collector is already listening on {address}")
+        if not is_private(address, stat.S_IFSOCK):
+            raise RuntimeError(f"{address} already exists and isn't ours, refusing to replace it")
+        # Left behind by a collector that didn't exit cleanly
+        os.unlink(address)
+
+    authkey = os.urandom(32)
+    key_path = authkey_path(address)
+    _write_authkey(key_path, authkey)
+
+    # The socket is created private, there's no window before the chmod
+    umask = os.umask(0o177)
+    try:
+        listener = Listener(address, family="AF_UNIX", authkey=authkey)
+    finally:
+        os.umask(umask)
+    os.chmod(address, 0o600)
+    try:
+        processor = EventProcessor(process_pool_workers=process_pool_workers,
+                                   queue_size=queue_size,
+                                   backlog_policy=backlog_policy,
+                                   drain_timeout=drain_timeout)
+        processor.serve(listener, export_address)
+    finally:
+        listener.close()
+        try:
+            os.unlink(key_path)
+        except FileNotFoundError:
+            pass
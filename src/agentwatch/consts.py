@@ -1,3 +1,45 @@
 from typing import Final
 
 AGENTWATCH_INTERNAL: Final[str] = "AGENTWATCH_INTERNAL"
+
+DEFAULT_EVENT_BUFFER_SIZE: Final[int] = 10_000
+DEFAULT_BUFFER_SHUTDOWN_TIMEOUT: Final[float] = 2.0
+# On shutdown, the collector keeps processing what the client sent so far for up to this long
+DEFAULT_DRAIN_TIMEOUT: Final[float] = 3.0
+DRAIN_POLL_INTERVAL: Final[float] = 0.01
+# Events are held in the client's buffer while a private collector starts in the background, for up to this long
+COLLECTOR_STARTUP_TIMEOUT: Final[float] = 30.0
+# Events written to the collector in a single frame, and how long the flusher waits for a batch to fill up.
+# A batch also stops before the event that would take its captured bodies past the byte limit
+DEFAULT_EVENT_BATCH_SIZE: Final[int] = 256
+DEFAULT_EVENT_BATCH_BYTES: Final[int] = 4 * 1024 * 1024
+DEFAULT_EVENT_BATCH_LINGER: Final[float] = 0.005
+# The collector looks at the shared memory ring at least this often, a safety net should a wakeup get lost
+RING_WAKEUP_TIMEOUT: Final[float] = 0.1
+# How often the collector acknowledges the events it processed (only when there's progress)
+EVENT_ACK_INTERVAL: Final[float] = 0.5
+# How often the client's response dispatcher checks whether it was stopped
+RESPONSE_POLL_INTERVAL: Final[float] = 0.1
+# Collector workers yield to the event loop every this many commands, so control commands aren't starved
+COMMAND_YIELD_INTERVAL: Final[int] = 64
+# Collector workers, events are routed to them by execution and HTTP exchange so each exchange stays in order
+DEFAULT_EVENT_SHARDS: Final[int] = 4
+# Events queued per shard. When full, the collector either stops reading the client's pipe (the backpressure
+# reaches the client's buffer and its overflow policy) or sheds events
+DEFAULT_SHARD_QUEUE_SIZE: Final[int] = 10_000
+# Shard workers process up to this many queued events as a batch, waiting at most the linger for more after
+# the first one. The graph is updated and the webhooks are notified once per batch
+DEFAULT_PROCESS_BATCH_SIZE: Final[int] = 64
+DEFAULT_PROCESS_BATCH_LINGER: Final[float] = 0.01
+# When shedding, low priority events (streaming deltas) are shed once a shard is this full
+LOW_PRIORITY_SHED_RATIO: Final[float] = 0.8
+# With a process pool, HTTP bodies at least this large are parsed in its workers instead of on the collector's loop
+DEFAULT_OFFLOAD_THRESHOLD: Final[int] = 64 * 1024
+# Unix socket of the shared collector (`agentwatch collector`), in a private per-user directory by default
+AGENTWATCH_COLLECTOR: Final[str] = "AGENTWATCH_COLLECTOR"
+# host:port of a remote aggregator (`agentwatch aggregator`) the collector ships its graph updates to
+AGENTWATCH_EXPORT: Final[str] = "AGENTWATCH_EXPORT"
+# Shared secret of the exporters and the aggregator, required by an aggregator listening on a non-loopback address
+AGENTWATCH_EXPORT_TOKEN: Final[str] = "AGENTWATCH_EXPORT_TOKEN"
+# Export over TLS: "1" verifies the aggregator with the system CAs, otherwise the path of a CA bundle (or of its certificate)
+AGENTWATCH_EXPORT_TLS: Final[str] = "AGENTWATCH_EXPORT_TLS"
@@ -1,5 +1,9 @@
 
+from typing import Optional
+
 from agentwatch.client import AgentwatchClient
+from agentwatch.hooks.http.models import HostConnectionStats, HostTrafficStats, HttpInterceptRule, HttpSamplingRule
+from agentwatch.models import AgentwatchStats, DeliveryStats, DrainStats, StartupStats
 from agentwatch.singleton import Singleton
 
 _singleton = Singleton[AgentwatchClient]()
@@ -11,4 +15,31 @@ def get_instance() -> AgentwatchClient:
     return _singleton.get_instance()
 
 def set_verbose() -> None:
-    _singleton.get_instance().set_verbose()
\ No newline at end of file
+    _singleton.get_instance().set_verbose()
+
+def set_intercept_rules(rules: list[HttpInterceptRule]) -> None:
+    _singleton.get_instance().set_intercept_rules(rules)
+
+def get_connection_stats() -> dict[str, HostConnectionStats]:
+    return _singleton.get_instance().get_connection_stats()
+
+def get_stats() -> AgentwatchStats:
+    return _singleton.get_instance().get_stats()
+
+def set_sampling_rules(rules: list[HttpSamplingRule]) -> None:
+    _singleton.get_instance().set_sampling_rules(rules)
+
+def get_traffic_stats() -> dict[str, HostTrafficStats]:
+    return _singleton.get_instance().get_traffic_stats()
+
+def get_delivery_stats() -> DeliveryStats:
+    return _singleton.get_instance().get_delivery_stats()
+
+def get_startup_stats() -> StartupStats:
+    return _singleton.get_instance().get_startup_stats()
+
+def wait_until_ready(timeout: Optional[float] = None) -> bool:
+    return _singleton.get_instance().wait_until_ready(timeout)
+
+def get_drain_stats() -> Optional[DrainStats]:
+    return _singleton.get_instance().get_drain_stats()
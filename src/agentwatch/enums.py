@@ -7,7 +7,31 @@ class CommandAction(Enum):
     PING = "ping"
     ADD_WEBHOOK = "add_webhook"
     VERBOSE = "verbose"
+    STATS = "stats"
+    HELLO = "hello"
     
 class HookEventType(Enum):
     HTTP_REQUEST = "http_request"
     HTTP_RESPONSE = "http_response"
+    HTTP_RESPONSE_DELTA = "http_response_delta"
+
+class OverflowPolicy(Enum):
+    BLOCK = "block"
+    DROP_NEWEST = "drop_newest"
+    DROP_OLDEST = "drop_oldest"
+
+class BacklogPolicy(Enum):
+    BACKPRESSURE = "backpressure"
+    SHED = "shed"
+
+class OverheadStage(Enum):
+    NORMALIZE = "normalize"
+    MODEL_DUMP = "model_dump"
+    COMMAND = "command"
+    PIPE_WRITE = "pipe_write"
+    PROCESS = "process"
+
+class SamplingDecision(Enum):
+    SAMPLED = "sampled"
+    SAMPLED_OUT = "sampled_out"
+    RATE_LIMITED = "rate_limited"
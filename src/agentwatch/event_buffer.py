@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Generic, Optional, TypeVar
+
+from agentwatch.enums import OverflowPolicy
+from agentwatch.models import BufferStats
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+class EventBuffer(Generic[T]):
+    """
+    A bounded in-process buffer drained by a dedicated flusher thread.
+
+    Producers (hook callbacks) only pay for an append under a lock; serialization and
+    IPC happen on the flusher thread, which hands up to `max_batch_size` buffered items
+    to `sink` as a single batch, fewer once their `size_of` reaches `max_batch_bytes` (a batch always
+    holds at least one item). With a `linger` (seconds), the flusher waits that long
+    after the first item of a batch for more items to arrive, unless the batch fills up first.
+    When the buffer is full, `overflow_policy` decides whether the producer blocks, the new
+    item is dropped or the oldest buffered item is evicted.
+    A buffer started paused accepts items but only hands them to `sink` once resumed (or stopped).
+    """
+
+    def __init__(self,
+                 sink: Callable[[list[T]], None],
+                 max_size: int,
+                 overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                 name: str = "agentwatch-flusher",
+                 max_batch_size: Optional[int] = None,
+                 linger: float = 0,
+                 max_batch_bytes: Optional[int] = None,
+                 size_of: Optional[Callable[[T], int]] = None) -> None:
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+        if max_batch_size is not None and max_batch_size <= 0:
+            raise ValueError("max_batch_size must be positive")
+        if max_batch_bytes is not None and (max_batch_bytes <= 0 or size_of is None):
+            raise ValueError("max_batch_bytes must be positive and requires size_of")
+
+        self._sink = sink
+        self._max_size = max_size
+        self._overflow_policy = overflow_policy
+        self._name = name
+        self._max_batch_size = max_batch_size or max_size
+        self._linger = linger
+        self._max_batch_bytes = max_batch_bytes
+        self._size_of = size_of
+
+        self._items: deque[T] = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._drained = threading.Condition(self._lock)
+
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._paused = False
+        self._in_flight = 0
+
+        self._enqueued = 0
+        self._flushed = 0
+        self._dropped = 0
+        self._flush_errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    def start(self, paused: bool = False) -> None:
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._paused = paused
+
+        self._thread = threading.Thread(target=self._flush_loop, name=self._name, daemon=True)
+        self._thread.start()
+
+    def resume(self) -> None:
+        with self._lock:
+            self._paused = False
+            self._not_empty.notify()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop accepting items and wait (up to `timeout` seconds) for the flusher to drain the buffer
+        """
+        with self._lock:
+            self._running = False
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning(f"Event buffer didn't drain in time, {len(self._items)} events left behind")
+            self._thread = None
+
+    def put(self, item: T) -> bool:
+        """
+        Add an item to the buffer.
+
+        Returns:
+            False if the item was dropped
+        """
+        with self._lock:
+            if not self._running:
+                self._dropped += 1
+                return False
+
+            if len(self._items) >= self._max_size:
+                match self._overflow_policy:
+                    case OverflowPolicy.DROP_NEWEST:
+                        self._dropped += 1
+                        return False
+                    case OverflowPolicy.DROP_OLDEST:
+                        self._items.popleft()
+                        self._dropped += 1
+                    case OverflowPolicy.BLOCK:
+                        while len(self._items) >= self._max_size and self._running:
+                            self._not_full.wait()
+
+                        if not self._running:
+                            self._dropped += 1
+                            return False
+
+            self._items.append(item)
+            self._enqueued += 1
+            # The flusher only cares about the first item of a batch and about a full batch
+            if len(self._items) == 1 or len(self._items) >= self._max_batch_size:
+                self._not_empty.notify()
+            return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until everything buffered so far was handed to the sink.
+
+        Returns:
+            False if the timeout expired first
+        """
+        with self._lock:
+            return self._drained.wait_for(lambda: not self._items and self._in_flight == 0, timeout)
+
+    def stats(self) -> BufferStats:
+        with self._lock:
+            return BufferStats(
+                size=len(self._items),
+                max_size=self._max_size,
+                enqueued=self._enqueued,
+                flushed=self._flushed,
+                dropped=self._dropped,
+                flush_errors=self._flush_errors
+            )
+
+    def _flush_loop(self) -> None:
+        logger.debug(f"Flusher {self._name} started")
+        while True:
+            with self._lock:
+                while (not self._items or self._paused) and self._running:
+                    self._not_empty.wait()
+
+                if not self._items:
+                    # Stopped and fully drained
+                    self._drained.notify_all()
+                    break
+
+                if self._linger > 0:
+                    deadline = time.monotonic() + self._linger
+                    while self._running and len(self._items) < self._max_batch_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._not_empty.wait(remaining)
+
+                batch = self._take_batch()
+                self._in_flight = len(batch)
+                self._not_full.notify_all()
+
+            try:
+                self._sink(batch)
+                flushed, errors = len(batch), 0
+            except Exception as e:
+                logger.debug(f"Error flushing events: {e}")
+                flushed, errors = 0, len(batch)
+
+            with self._lock:
+                self._flushed += flushed
+                self._flush_errors += errors
+                self._in_flight = 0
+                if not self._items:
+                    self._drained.notify_all()
+
+        logger.debug(f"Flusher {self._name} stopped")
+
+    def _take_batch(self) -> list[T]:
+        batch_size = min(len(self._items), self._max_batch_size)
+        if self._max_batch_bytes is None or self._size_of is None:
+            return [self._items.popleft() for _ in range(batch_size)]
+
+        batch: list[T] = []
+        batch_bytes = 0
+        while self._items and len(batch) < batch_size and batch_bytes < self._max_batch_bytes:
+            item = self._items[0]
+            item_bytes = self._size_of(item)
+            if batch and batch_bytes + item_bytes > self._max_batch_bytes:
+                break
+            batch.append(self._items.popleft())
+            batch_bytes += item_bytes
+        return batch
@@ -1,18 +1,33 @@
 import asyncio
 import logging
-from multiprocessing.connection import Connection
-from multiprocessing.synchronize import Event
-from typing import Optional
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.connection import Connection, Listener
+from multiprocessing.synchronize import Event, Lock
+from typing import Callable, Optional
 
 from pydantic import ValidationError
 
-from agentwatch.enums import CommandAction
+from agentwatch.consts import (AGENTWATCH_EXPORT, AGENTWATCH_EXPORT_TLS, AGENTWATCH_EXPORT_TOKEN, COMMAND_YIELD_INTERVAL,
+                               DEFAULT_DRAIN_TIMEOUT, DEFAULT_EVENT_SHARDS,
+                               DEFAULT_PROCESS_BATCH_LINGER, DEFAULT_PROCESS_BATCH_SIZE, DEFAULT_SHARD_QUEUE_SIZE,
+                               DRAIN_POLL_INTERVAL, EVENT_ACK_INTERVAL, RING_WAKEUP_TIMEOUT)
+from agentwatch.enums import BacklogPolicy, CommandAction, OverheadStage
+from agentwatch.export.exporter import EventExporter, export_ssl_context, parse_export_address
 from agentwatch.graph.graph import GraphBuilder
+from agentwatch.graph.models import GraphStructure
 from agentwatch.hooks.models import HookEvent
-from agentwatch.models import Command, CommandResponse
-from agentwatch.pipes import Pipes
+from agentwatch.metrics import OverheadMetrics
+from agentwatch.models import CollectorStats, Command, CommandResponse, DrainStats, EventAck
+from agentwatch.pipes import FrameReader, Pipes
 from agentwatch.processing.base import BaseProcessor
 from agentwatch.processing.http_processing import HttpProcessor
+from agentwatch.sharding import DeliveryTracker, EventShard, shard_index, shard_key
+from agentwatch.shm_ring import ShmRing
 from agentwatch.visualization.consts import VISUALIZATION_SERVER_PORT
 from agentwatch.webhooks.handler import WebhookHandler
 from agentwatch.webhooks.models import Webhook
@@ -22,15 +37,65 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger(__name__)
     
 class EventProcessor:
-    NUM_WORKERS = 1
+    def __init__(self,
+                 num_shards: int = DEFAULT_EVENT_SHARDS,
+                 process_pool_workers: int = 0,
+                 queue_size: int = DEFAULT_SHARD_QUEUE_SIZE,
+                 backlog_policy: BacklogPolicy = BacklogPolicy.BACKPRESSURE,
+                 batch_size: int = DEFAULT_PROCESS_BATCH_SIZE,
+                 batch_linger: float = DEFAULT_PROCESS_BATCH_LINGER,
+                 drain_timeout: float = DEFAULT_DRAIN_TIMEOUT) -> None:
+        """
+        Args:
+            num_shards: Event workers, each with a queue of its own. Events are routed by execution (see
+                        sharding.shard_key), so every execution's events are processed in order
+            queue_size: Events queued per shard, 0 is unbounded
+            backlog_policy: What to do with events once a shard's queue is full, see EventShard
+            batch_size: Events a shard worker processes together, with a single graph update and notification
+            batch_linger: How long a shard worker waits for a batch to fill up
+            drain_timeout: How long the queued events are processed for on shutdown, unless the
+                           client's shutdown command says otherwise
+            process_pool_workers: Worker processes that parse large payloads, so the collector uses more than
+                                  one core. Only for a shared collector, a private one is a daemon process
+                                  and those can't have children.
+        """
+        if num_shards <= 0:
+            raise ValueError("num_shards must be positive")
 
-    def __init__(self) -> None:
+        self._num_shards = num_shards
+        self._queue_size = queue_size
+        self._backlog_policy = backlog_policy
+        self._batch_size = batch_size
+        self._batch_linger = batch_linger
+        self._drain_timeout = drain_timeout
+        self._process_pool_workers = process_pool_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
         self._init_event: Optional[Event] = None
         self._pipe: Optional[Connection] = None
+        self._control_pipe: Optional[Connection] = None
+        self._ring: Optional[ShmRing] = None
         self._processors: list[BaseProcessor] = []
-        self._command_queue: Optional[asyncio.Queue[Command]] = None
+        self._shards: list[EventShard] = []
+        # Everything but events, served by a worker of its own so it never waits behind the event backlog
+        self._control_queue: Optional[asyncio.Queue[Command]] = None
         self._workers: list[asyncio.Task[None]] = []
-        self._event_poller: Optional[asyncio.Task[None]] = None
+        self._pollers: list[asyncio.Task[None]] = []
+        self._stopping = False
+        # Events whose poller was cancelled (at the drain deadline) while they waited for room in a full shard
+        self._cancelled_puts = 0
+        self._ack_task: Optional[asyncio.Task[None]] = None
+        # The acknowledgement last sent to every client
+        self._sent_acks: dict[str, EventAck] = {}
+        # Per client (execution_id), a shared collector serves many of them
+        self._deliveries: dict[str, DeliveryTracker] = {}
+        self._response_pipes: dict[str, Connection] = {}
+        # Clients whose connection was dropped, their delivery is forgotten once their queued events are dealt with
+        self._disconnected: set[str] = set()
+        self._shared = False
+        self._metrics = OverheadMetrics()
+        # Graph updates are also shipped to a remote aggregator when an address is given
+        self._export_address: Optional[str] = os.environ.get(AGENTWATCH_EXPORT)
+        self._exporter: Optional[EventExporter] = None
 
         self._graph_builder = GraphBuilder()
         self._webhook_handler: Optional[WebhookHandler] = None
@@ -38,39 +103,177 @@ class EventProcessor:
             HttpProcessor
             ]
     
-    def start(self, pipe: Connection, init_event: Event) -> None: 
+    def start(self,
+              pipe: Connection,
+              init_event: Event,
+              ring_name: Optional[str] = None,
+              control_pipe: Optional[Connection] = None,
+              ring_lock: Optional[Lock] = None) -> None:
+        """
+        Args:
+            pipe: Events (and, without a control pipe, commands and their responses)
+            ring_name: ShmRing the events also come through, along with its `ring_lock`
+            control_pipe: Commands other than events, their responses and the event acknowledgements
+        """
         self._pipe = pipe
+        self._control_pipe = control_pipe
         self._init_event = init_event
+        if ring_name is not None:
+            self._ring = ShmRing(name=ring_name, lock=ring_lock)
 
         try:
             asyncio.run(self._start())
         except Exception as e:
             pass
+        finally:
+            if self._ring is not None:
+                self._ring.close()
+            for connection in (self._pipe, self._control_pipe):
+                if connection is not None:
+                    connection.close()
 
         logger.info("agentwatch shutdown successfully")
 
-    async def _start(self) -> None:
-        self._command_queue = asyncio.Queue()
-        self._webhook_handler = WebhookHandler()
+    def serve(self, listener: Listener, export_address: Optional[str] = None) -> None:
+        """
+        Run as a standalone collector shared by every client connecting to `listener`, until SIGINT/SIGTERM.
+        Clients open an event and a control connection each and say HELLO on the latter, a client's
+        shutdown command only ends its own session.
 
-        await self._register_processors()
+        Args:
+            export_address: "host:port" of an aggregator to export the graph updates to
+        """
+        self._shared = True
+        if export_address is not None:
+            self._export_address = export_address
+        try:
+            asyncio.run(self._serve(listener))
+        except KeyboardInterrupt:
+            pass
 
-        for task_num in range(self.NUM_WORKERS):
-            self._workers.append(asyncio.create_task(self._consume_events(), name=f"task-{task_num}"))
-        
-        self._register_visualization_webhook()
+        logger.info("agentwatch collector shutdown successfully")
+
+    async def _serve(self, listener: Listener) -> None:
+        await self._setup()
+
+        loop = asyncio.get_running_loop()
+        stopped = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stopped.set)
+
+        # accept() blocks (and authenticates), it gets a thread of its own for the collector's lifetime
+        threading.Thread(target=self._accept_connections, args=(listener, loop), name="agentwatch-accept", daemon=True).start()
+        logger.info(f"agentwatch collector listening on {listener.address}")
+
+        await stopped.wait()
+        await self._shutdown()
+        await asyncio.gather(*self._workers)
+
+    def _accept_connections(self, listener: Listener, loop: asyncio.AbstractEventLoop) -> None:
+        while True:
+            try:
+                connection = listener.accept()
+            except OSError as e:
+                logger.debug(f"Stopped accepting connections: {e}")
+                return
+            except Exception as e:
+                logger.warning(f"Rejected connection: {e}")
+                continue
+
+            try:
+                loop.call_soon_threadsafe(self._add_connection, connection)
+            except RuntimeError:
+                # The loop is closed
+                connection.close()
+                return
+
+    def _add_connection(self, connection: Connection) -> None:
+        if self._stopping:
+            connection.close()
+            return
+
+        self._pollers = [poller for poller in self._pollers if not poller.done()]
+        self._pollers.append(asyncio.create_task(self._poll_events(connection), name=f"poller-{connection.fileno()}"))
+
+    def _drop_connection(self, connection: Connection) -> None:
+        for execution_id, pipe in list(self._response_pipes.items()):
+            if pipe is connection:
+                del self._response_pipes[execution_id]
+                self._disconnected.add(execution_id)
+                self._forget_if_settled(execution_id)
+                logger.info(f"Client {execution_id} disconnected")
+        connection.close()
+
+    def _delivery(self, execution_id: str) -> Optional[DeliveryTracker]:
+        """None once the client disconnected, nobody's left to acknowledge its events to"""
+        if execution_id in self._disconnected:
+            return self._deliveries.get(execution_id)
+        return self._deliveries.setdefault(execution_id, DeliveryTracker())
+
+    def _complete(self, cmd: Command, processed: bool) -> None:
+        delivery = self._delivery(cmd.execution_id)
+        if delivery is not None:
+            delivery.complete(cmd.seq, processed)
+            self._forget_if_settled(cmd.execution_id)
+
+    def _forget_if_settled(self, execution_id: str) -> None:
+        delivery = self._deliveries.get(execution_id)
+        if execution_id in self._disconnected and (delivery is None or delivery.settled):
+            self._disconnected.discard(execution_id)
+            self._deliveries.pop(execution_id, None)
+            self._sent_acks.pop(execution_id, None)
+
+    async def _start(self) -> None:
+        await self._setup()
 
         logger.debug(f"agentwatch started")
         if self._init_event:
             self._init_event.set()
 
-        self._event_poller = asyncio.create_task(self._poll_events(), name="event-poller")
-        await self._event_poller
+        if not self._pipe:
+            raise RuntimeError("agentwatch not initialized")
+
+        self._pollers.append(asyncio.create_task(self._poll_events(self._pipe, self._ring), name="event-poller"))
+        if self._control_pipe is not None:
+            self._pollers.append(asyncio.create_task(self._poll_events(self._control_pipe), name="control-poller"))
+        await asyncio.gather(*self._pollers)
         logger.debug("Stopped polling for events")
+
+        # The client went away without asking us to shut down
+        if not self._stopping:
+            await self._shutdown()
         await asyncio.gather(*self._workers)
         
         logger.info("agentwatch stopped")
 
+    async def _setup(self) -> None:
+        if self._process_pool_workers > 0:
+            if multiprocessing.current_process().daemon:
+                logger.warning("Daemon processes can't have children, payloads are parsed without a process pool")
+            else:
+                # Spawned, forking a process with running threads isn't safe
+                self._executor = ProcessPoolExecutor(self._process_pool_workers, mp_context=multiprocessing.get_context("spawn"))
+                logger.info(f"Parsing large payloads with {self._process_pool_workers} worker processes")
+
+        self._shards = [EventShard(index, self._queue_size, self._backlog_policy) for index in range(self._num_shards)]
+        self._control_queue = asyncio.Queue()
+        self._webhook_handler = WebhookHandler()
+
+        await self._register_processors()
+
+        for shard in self._shards:
+            self._workers.append(asyncio.create_task(self._consume_event_batches(shard), name=f"shard-{shard.index}"))
+        self._workers.append(asyncio.create_task(self._consume_events(self._control_queue), name="control"))
+        
+        self._register_visualization_webhook()
+        if self._export_address:
+            host, port = parse_export_address(self._export_address)
+            self._exporter = EventExporter(host, port,
+                                           token=os.environ.get(AGENTWATCH_EXPORT_TOKEN),
+                                           ssl_context=export_ssl_context(os.environ.get(AGENTWATCH_EXPORT_TLS)))
+            self._exporter.start()
+        self._ack_task = asyncio.create_task(self._ack_events(), name="event-ack")
+
     def _register_visualization_webhook(self) -> None:
         if self._webhook_handler is None:
             return
@@ -83,27 +286,68 @@ class EventProcessor:
 
     async def _register_processors(self) -> None:
         for processor in self._supported_processors:
-            self._processors.append(processor())
+            self._processors.append(processor(executor=self._executor))
             logger.debug(f"Processor registered: {processor.__name__}")
 
-    async def _consume_events(self) -> None:
+    def _response_pipe(self, execution_id: str) -> Optional[Connection]:
+        return self._response_pipes.get(execution_id) or self._control_pipe or self._pipe
+
+    async def _route_event(self, cmd: Command) -> None:
+        """Waits while the event's shard is full, unless it sheds events"""
+        delivery = self._delivery(cmd.execution_id)
+        if delivery is not None:
+            delivery.receive(cmd.seq)
+        try:
+            queued = await self._shards[shard_index(shard_key(cmd), len(self._shards))].put(cmd)
+        except asyncio.CancelledError:
+            self._cancelled_puts += 1
+            self._complete(cmd, processed=False)
+            raise
+        if not queued:
+            self._complete(cmd, processed=False)
+
+    async def _consume_event_batches(self, shard: EventShard) -> None:
+        logger.debug(f"Worker started: {asyncio.current_task().get_name()}, consuming event batches")  # type: ignore
+
+        try:
+            while True:
+                batch = await shard.get_batch(self._batch_size, self._batch_linger)
+                logger.debug(f"Consuming {len(batch)} events")
+                try:
+                    await self._handle_events(batch)
+                finally:
+                    shard.done(len(batch))
+
+                # get_batch() doesn't suspend while the queue has items, give the pollers and the other workers a turn
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            logger.debug(f"Worker {asyncio.current_task().get_name()} cancelled")  # type: ignore
+
+    async def _consume_events(self, queue: asyncio.Queue[Command]) -> None:
         logger.debug(f"Worker started: {asyncio.current_task().get_name()}, consuming events")  # type: ignore
-        if not self._command_queue or not self._pipe:
-            raise RuntimeError("agentwatch not initialized")
         
+        consumed = 0
         try:
             while True:
                 logger.debug("Waiting for command...")
-                cmd = await self._command_queue.get()
+                cmd = await queue.get()
                 logger.debug(f"Consuming command {cmd.callback_id}")
                 response = await self._on_command(cmd)
                 logger.debug(f"Command {cmd.callback_id} processed!")
 
-                if response:
-                    await Pipes.write_payload(self._pipe, response)
+                pipe = self._response_pipe(cmd.execution_id)
+                if response and pipe:
+                    await Pipes.write_payload(pipe, response)
                     logger.debug(f"Response sent: {response}")
 
-                self._command_queue.task_done()
+                queue.task_done()
+                if cmd.action == CommandAction.SHUTDOWN and not self._shared:
+                    break
+
+                # get() doesn't suspend while the queue has items, give the pollers and the control worker a turn
+                consumed += 1
+                if consumed % COMMAND_YIELD_INTERVAL == 0:
+                    await asyncio.sleep(0)
                 
         except asyncio.CancelledError as e:
             logger.debug(f"Worker {asyncio.current_task().get_name()} cancelled")  # type: ignore
@@ -111,84 +355,246 @@ class EventProcessor:
             logger.error(f"Error consuming events: {e}", exc_info=True)
             raise
 
-    async def _poll_events(self) -> None:
-        if not self._pipe or not self._command_queue:
+    async def _ack_events(self) -> None:
+        """
+        Events don't get a response of their own, the client is periodically told how far the
+        collector got instead. Nothing is sent while there's no progress.
+        """
+        try:
+            while True:
+                await asyncio.sleep(EVENT_ACK_INTERVAL)
+                await self._send_acks()
+        except asyncio.CancelledError:
+            logger.debug("Event acknowledgements cancelled")
+
+    async def _send_acks(self) -> None:
+        for execution_id in self._sent_acks.keys() - self._deliveries.keys():
+            del self._sent_acks[execution_id]
+
+        for execution_id, delivery in list(self._deliveries.items()):
+            pipe = self._response_pipe(execution_id)
+            if pipe is None or self._sent_acks.get(execution_id) == delivery.ack:
+                continue
+            self._sent_acks[execution_id] = delivery.ack.model_copy()
+            await Pipes.write_payload(pipe, CommandResponse(success=True, ack=self._sent_acks[execution_id]))
+
+    async def _poll_events(self, pipe: Connection, ring: Optional[ShmRing] = None) -> None:
+        if not self._shards or not self._control_queue:
             raise RuntimeError("agentwatch not initialized")
         
-        logger.debug(f"Polling for events @ fd {self._pipe.fileno()}")
+        logger.debug(f"Polling for events @ fd {pipe.fileno()}")
+
+        # The loop wakes us up when the pipe is readable, every wakeup drains all available frames
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        fd = pipe.fileno()
+        reader = FrameReader(pipe)
+        loop.add_reader(fd, readable.set)
 
         try:
             while True:
+                # Also look at the ring every now and then, should a wakeup get lost
+                timer = loop.call_later(RING_WAKEUP_TIMEOUT, readable.set) if ring is not None else None
                 try:
-                    payload = await Pipes.read_payload(self._pipe)
-                    if payload is None:
-                        logger.debug("No payload received")
+                    await readable.wait()
+                finally:
+                    if timer is not None:
+                        timer.cancel()
+                readable.clear()
+
+                for payload in Pipes.read_available(reader, ring):
+                    try:
+                        cmd = Command.model_validate(payload)
+                    except ValidationError as e:
+                        logger.error(f"Error decoding payload: {e}")
                         continue
 
-                    cmd = Command.model_validate_json(payload)
-                    self._command_queue.put_nowait(cmd)
-                except ValidationError as e:
-                    logger.error(f"Error decoding payload: {e}")
+                    if cmd.action == CommandAction.HELLO:
+                        # Responses and acknowledgements of this client go back through this connection
+                        self._response_pipes[cmd.execution_id] = pipe
+                        self._disconnected.discard(cmd.execution_id)
+                        logger.info(f"Client {cmd.execution_id} connected")
+                    elif cmd.action == CommandAction.EVENT:
+                        # With backpressure, a full shard stops this poller until there's room. The pipe fills
+                        # up in the meantime and the client's buffer applies its overflow policy.
+                        await self._route_event(cmd)
+                    else:
+                        self._control_queue.put_nowait(cmd)
         except asyncio.CancelledError:
             logger.debug("Event poller cancelled")
+        except EOFError:
+            logger.debug(f"Pipe @ fd {fd} closed")
+        finally:
+            loop.remove_reader(fd)
+            reader.close()
+            if self._shared:
+                self._drop_connection(pipe)
 
     async def _on_command(self, cmd: Command) -> Optional[CommandResponse]:
         logger.debug(f"Event received: {cmd.model_dump_json()}")
         try:
             match (cmd.action):
                 case CommandAction.EVENT:
-                    event = HookEvent.model_validate(cmd.params)
-                    return await self._handle_event(cmd.callback_id, event)
+                    # Fire and forget, acknowledged in bulk by _ack_events
+                    await self._handle_events([cmd])
+                    return None
                 case CommandAction.ADD_WEBHOOK:
                     webhook = Webhook.model_validate(cmd.params)
                     if self._webhook_handler is not None:
                         self._webhook_handler.register_webhook(webhook)
                     return CommandResponse(success=True, callback_id=cmd.callback_id)
                 case CommandAction.SHUTDOWN:
-                    await self._shutdown()
-                    return CommandResponse(success=True, callback_id=cmd.callback_id)
+                    # A shared collector outlives its clients, they just disconnect (their queued events are still processed)
+                    if self._shared:
+                        return CommandResponse(success=True, callback_id=cmd.callback_id)
+
+                    last_seq = cmd.params.get("last_seq")
+                    drain = await self._shutdown({cmd.execution_id: last_seq} if last_seq is not None else None,
+                                                 cmd.params.get("timeout"))
+                    return CommandResponse(success=True, data=drain.model_dump() if drain else None, callback_id=cmd.callback_id)
                 case CommandAction.PING:
                     return CommandResponse(success=True, callback_id=cmd.callback_id)
                 case CommandAction.VERBOSE:
                     self._set_verbose()
                     return CommandResponse(success=True, callback_id=cmd.callback_id)
+                case CommandAction.STATS:
+                    stats = CollectorStats(overhead=self._metrics.snapshot(), shards=[shard.stats() for shard in self._shards])
+                    return CommandResponse(success=True, data=stats.model_dump(), callback_id=cmd.callback_id)
         except ValidationError as e:
             logger.error(f"Error decoding event: {e}")
         
         return None
     
-    async def _handle_event(self, callback_id: str, event: HookEvent) -> Optional[CommandResponse]:
+    async def _handle_events(self, cmds: list[Command]) -> None:
+        """
+        Process a batch of events in order, then update the graph and notify the webhooks once for all of them
+        """
+        structures: list[tuple[str, GraphStructure]] = []
+        for cmd in cmds:
+            try:
+                structure = await self._handle_event(cmd)
+            except ValidationError as e:
+                logger.error(f"Error decoding event: {e}")
+                continue
+            except Exception as e:
+                logger.error(f"Error processing event: {e}", exc_info=True)
+                continue
+
+            if structure:
+                structures.append((cmd.execution_id, structure))
+
+        if structures:
+            await self._commit(structures)
+
+    async def _handle_event(self, cmd: Command) -> Optional[GraphStructure]:
+        try:
+            event = HookEvent.model_validate(cmd.params)
+            start = time.perf_counter_ns()
+            try:
+                structure = await self._process_event(event)
+            finally:
+                self._metrics.record(OverheadStage.PROCESS, start)
+        except Exception:
+            # Acknowledged once it's been dealt with, one way or another
+            self._complete(cmd, processed=False)
+            raise
+        self._complete(cmd, processed=True)
+        return structure
+
+    async def _process_event(self, event: HookEvent) -> Optional[GraphStructure]:
         for processor in self._processors:
             if processor.can_handle(event.event_type):
-                structure = await processor.process(event.event_type, event.data)
-                if structure:
-                    self._graph_builder.append_structure(structure)
-                    if self._webhook_handler is not None:
-                        await self._webhook_handler.notify_webhooks(self._graph_builder.get_structure())
-
                 # TODO: Should we break here? The answer is a mystery to be revealed...
-                break
+                return await processor.process(event.event_type, event.data)
+        return None
+
+    async def _commit(self, structures: list[tuple[str, GraphStructure]]) -> None:
+        """Add the structures of a batch (execution_id, structure) to the graph"""
+        for execution_id, structure in structures:
+            self._graph_builder.append_structure(structure)
+            if self._exporter is not None:
+                self._exporter.add(execution_id, structure)
 
-        return CommandResponse(success=True, callback_id=callback_id)
+        if self._webhook_handler is not None:
+            await self._webhook_handler.notify_webhooks(self._graph_builder.get_structure())
+
+    async def _shutdown(self,
+                        last_seqs: Optional[dict[str, int]] = None,
+                        timeout: Optional[float] = None) -> Optional[DrainStats]:
+        """
+        Drain, then stop. Until the deadline, the pollers keep reading until every client's `last_seqs`
+        (the last event it sent) was received, then the queued events are processed. Whatever's left
+        after that is abandoned.
+        """
+        if self._stopping:
+            return None
+        self._stopping = True
 
-    async def _shutdown(self) -> None:
         logger.info("Shutting down agentwatch")
-        if self._webhook_handler:
-            await self._webhook_handler.close()
-        
-        if self._event_poller:
-            self._event_poller.cancel()
-            await self._event_poller
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + (timeout if timeout is not None else self._drain_timeout)
+        processed = sum(shard.processed for shard in self._shards)
+
+        def unread() -> int:
+            return sum(max(last_seq - (self._deliveries[execution_id].received if execution_id in self._deliveries else 0), 0)
+                       for execution_id, last_seq in (last_seqs or {}).items())
+
+        timed_out = not await self._wait_until(lambda: unread() == 0 or all(poller.done() for poller in self._pollers), deadline)
+
+        # No more input
+        for poller in self._pollers:
+            poller.cancel()
+            await poller
+
+        timed_out = not await self._wait_until(lambda: all(shard.pending == 0 for shard in self._shards), deadline) or timed_out
+        drain = DrainStats(flushed=sum(shard.processed for shard in self._shards) - processed,
+                           abandoned=sum(shard.pending for shard in self._shards) + self._cancelled_puts + unread(),
+                           timed_out=timed_out,
+                           duration_ms=(loop.time() - started) * 1000)
 
         # TODO: Do we gather or do we cancel? The answer is a mystery to be revealed...
+        # The worker running this one still has to send the response, it stops on its own
         for task in self._workers:
+            if task is asyncio.current_task():
+                continue
             task.cancel()
             await task
-        
-        if self._pipe:
-            self._pipe.close()
 
+        if self._ack_task:
+            self._ack_task.cancel()
+            await self._ack_task
+        # The final word on every client's events
+        try:
+            await self._send_acks()
+        except Exception as e:
+            logger.debug(f"Couldn't send the final acknowledgements: {e}")
+
+        if self._webhook_handler:
+            await self._webhook_handler.close()
+
+        if self._exporter is not None:
+            await self._exporter.close()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+        log = logger.warning if drain.abandoned else logger.info
+        log(f"agentwatch drained {drain.flushed} events in {drain.duration_ms:.0f}ms, {drain.abandoned} abandoned")
         logger.debug("agentwatch shutdown complete")
+        return drain
+
+    async def _wait_until(self, condition: Callable[[], bool], deadline: float) -> bool:
+        """
+        Returns:
+            False if the deadline (of the loop's clock) expired first
+        """
+        loop = asyncio.get_running_loop()
+        while not condition():
+            if loop.time() >= deadline:
+                return False
+            await asyncio.sleep(DRAIN_POLL_INTERVAL)
+        return True
 
     def _set_verbose(self) -> None:
         logging.basicConfig(level=logging.DEBUG)
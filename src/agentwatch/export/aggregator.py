@@ -0,0 +1,234 @@
+import asyncio
+import ipaddress
+import logging
+import os
+import signal
+import ssl
+from collections import OrderedDict
+from typing import Optional
+
+from pydantic import ValidationError
+
+from agentwatch.export.consts import (AUTH_NONCE_SIZE, DEFAULT_AGGREGATOR_HOST, DEFAULT_AGGREGATOR_PORT,
+                                      DEFAULT_MAX_AGGREGATED_GRAPHS, EXPORT_AUTH_TIMEOUT)
+from agentwatch.export.models import AggregatorStats, ExportBatch
+from agentwatch.export.protocol import AUTH_DIGEST_SIZE, AUTH_OK, FRAME_ACK, read_batch, verify_digest
+from agentwatch.graph.graph import GraphBuilder
+from agentwatch.graph.models import Edge, GraphStructure, Node, edge_from_data, node_from_data
+from agentwatch.pipes import FrameError
+from agentwatch.webhooks.handler import WebhookHandler
+from agentwatch.webhooks.models import Webhook
+
+logger = logging.getLogger(__name__)
+
+class _AggregatedGraph:
+    def __init__(self) -> None:
+        self.builder = GraphBuilder()
+        # The last record merged from every exporter, records sent again are skipped
+        self.last_seqs: dict[str, int] = {}
+
+    def is_merged(self, exporter_id: Optional[str], seq: Optional[int]) -> bool:
+        if exporter_id is None or seq is None:
+            return False
+        return seq <= self.last_seqs.get(exporter_id, 0)
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def aggregator_ssl_context(cert: Optional[str], key: Optional[str] = None) -> Optional[ssl.SSLContext]:
+    if cert is None:
+        return None
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    return context
+
+class Aggregator:
+    """
+    Receives the graph updates exported by the collectors of many hosts (see EventExporter)
+    and merges them into a graph per (host, execution_id), once: exporters send again what wasn't
+    acknowledged, the records they number are only merged the first time. Every merged batch is forwarded
+    to `webhooks` (i.e. the visualization server), the same way a collector notifies them.
+
+    Exporters authenticate with `token`, over TLS when given an `ssl_context`. Without a token,
+    only loopback addresses can be listened on. At most `max_graphs` graphs are kept, the least
+    recently updated ones are evicted first.
+    """
+
+    def __init__(self,
+                 token: Optional[str] = None,
+                 ssl_context: Optional[ssl.SSLContext] = None,
+                 max_graphs: int = DEFAULT_MAX_AGGREGATED_GRAPHS,
+                 webhooks: Optional[list[Webhook]] = None) -> None:
+        self._token = token
+        self._ssl_context = ssl_context
+        self._max_graphs = max_graphs
+        self._webhooks = webhooks or []
+        self._webhook_handler: Optional[WebhookHandler] = None
+        self._graphs: OrderedDict[tuple[str, str], _AggregatedGraph] = OrderedDict()
+        self._stats = AggregatorStats()
+        self._server: Optional[asyncio.Server] = None
+
+    async def start(self, host: str = DEFAULT_AGGREGATOR_HOST, port: int = DEFAULT_AGGREGATOR_PORT) -> int:
+        """
+        Returns:
+            The port the aggregator listens on (useful with port 0)
+        """
+        if not self._token and not is_loopback(host):
+            raise RuntimeError(f"Listening on {host} requires a token, the exported graphs carry prompts and payloads")
+        if self._ssl_context is None and not is_loopback(host):
+            logger.warning(f"Exporters connect to {host} in the clear, consider TLS")
+
+        if self._webhooks and self._webhook_handler is None:
+            self._webhook_handler = WebhookHandler()
+            for webhook in self._webhooks:
+                self._webhook_handler.register_webhook(webhook)
+
+        self._server = await asyncio.start_server(self._handle_connection, host, port, ssl=self._ssl_context)
+        bound_port: int = self._server.sockets[0].getsockname()[1]
+        logger.info(f"agentwatch aggregator listening on {host}:{bound_port}")
+        return bound_port
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._webhook_handler is not None:
+            await self._webhook_handler.close()
+            self._webhook_handler = None
+
+    def merge(self, batch: ExportBatch) -> GraphStructure:
+        """
+        Returns:
+            The nodes and edges of the batch
+        """
+        merged: tuple[list[Node], list[Edge]] = ([], [])
+        for record in batch.records:
+            graph = self._graphs.get((batch.host, record.execution_id))
+            if graph is not None and graph.is_merged(batch.exporter_id, record.seq):
+                self._stats.duplicates += 1
+                continue
+
+            try:
+                structure = ([node_from_data(node) for node in record.nodes],
+                             [edge_from_data(edge) for edge in record.edges])
+            except (ValidationError, ValueError) as e:
+                logger.warning(f"Skipping invalid graph update from {batch.host}: {e}")
+                continue
+
+            graph = self._graph(batch.host, record.execution_id)
+            graph.builder.append_structure(structure)
+            if batch.exporter_id is not None and record.seq is not None:
+                graph.last_seqs[batch.exporter_id] = record.seq
+            merged[0].extend(structure[0])
+            merged[1].extend(structure[1])
+
+        self._stats.batches += 1
+        self._stats.records += len(batch.records)
+        self._stats.graphs = len(self._graphs)
+        return merged
+
+    def get_structure(self, host: str, execution_id: str) -> Optional[GraphStructure]:
+        graph = self._graphs.get((host, execution_id))
+        return graph.builder.get_structure() if graph is not None else None
+
+    def graphs(self) -> list[tuple[str, str]]:
+        """(host, execution_id) of every graph"""
+        return list(self._graphs)
+
+    def stats(self) -> AggregatorStats:
+        return self._stats.model_copy()
+
+    def _graph(self, host: str, execution_id: str) -> _AggregatedGraph:
+        key = (host, execution_id)
+        graph = self._graphs.get(key)
+        if graph is not None:
+            self._graphs.move_to_end(key)
+            return graph
+
+        graph = self._graphs[key] = _AggregatedGraph()
+        while len(self._graphs) > self._max_graphs:
+            evicted, _ = self._graphs.popitem(last=False)
+            self._stats.evicted += 1
+            logger.debug(f"Evicted the graph of {evicted}")
+        return graph
+
+    async def _authenticate(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        nonce = os.urandom(AUTH_NONCE_SIZE)
+        writer.write(nonce)
+        await writer.drain()
+        digest = await asyncio.wait_for(reader.readexactly(AUTH_DIGEST_SIZE), EXPORT_AUTH_TIMEOUT)
+        if self._token and not verify_digest(self._token, nonce, digest):
+            return False
+
+        writer.write(AUTH_OK)
+        await writer.drain()
+        return True
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername")
+        try:
+            if not await self._authenticate(reader, writer):
+                logger.warning(f"Rejected the exporter at {peer}: invalid token")
+                self._stats.rejected_connections += 1
+                writer.close()
+                return
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, OSError) as e:
+            logger.debug(f"Handshake with {peer} failed: {e!r}")
+            writer.close()
+            return
+
+        logger.info(f"Exporter connected from {peer}")
+        self._stats.connections += 1
+        try:
+            while True:
+                batch = await read_batch(reader)
+                structure = self.merge(batch)
+                writer.write(FRAME_ACK.pack(len(batch.records)))
+                await writer.drain()
+                if self._webhook_handler is not None:
+                    await self._webhook_handler.notify_webhooks(structure)
+        except asyncio.IncompleteReadError:
+            pass
+        except FrameError as e:
+            # The stream can't be trusted past a bad frame, the exporter reconnects and sends it again
+            logger.warning(f"Closing the connection from {peer}: {e}")
+            self._stats.rejected_frames += 1
+        except OSError as e:
+            logger.debug(f"Connection from {peer} failed: {e}")
+        finally:
+            self._stats.connections -= 1
+            writer.close()
+            logger.info(f"Exporter {peer} disconnected")
+
+async def _serve(aggregator: Aggregator, host: str, port: int) -> None:
+    await aggregator.start(host, port)
+
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopped.set)
+
+    await stopped.wait()
+    await aggregator.close()
+
+def run_aggregator(host: str = DEFAULT_AGGREGATOR_HOST,
+                   port: int = DEFAULT_AGGREGATOR_PORT,
+                   token: Optional[str] = None,
+                   tls_cert: Optional[str] = None,
+                   tls_key: Optional[str] = None,
+                   max_graphs: int = DEFAULT_MAX_AGGREGATED_GRAPHS,
+                   webhook_urls: Optional[list[str]] = None) -> None:
+    """
+    Aggregate the graphs exported by remote collectors and forward them to `webhook_urls`, until interrupted
+    """
+    aggregator = Aggregator(token=token,
+                            ssl_context=aggregator_ssl_context(tls_cert, tls_key),
+                            max_graphs=max_graphs,
+                            webhooks=[Webhook(url=url) for url in webhook_urls or []])
+    asyncio.run(_serve(aggregator, host, port))
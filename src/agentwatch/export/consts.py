@@ -0,0 +1,23 @@
+from typing import Final
+
+DEFAULT_AGGREGATOR_PORT: Final[int] = 7878
+# Only local exporters by default, listening on other addresses requires a token (see AGENTWATCH_EXPORT_TOKEN)
+DEFAULT_AGGREGATOR_HOST: Final[str] = "127.0.0.1"
+# Graphs kept by the aggregator, the least recently updated ones are evicted first
+DEFAULT_MAX_AGGREGATED_GRAPHS: Final[int] = 1000
+
+# Graph updates buffered by the exporter while the aggregator is unreachable (the oldest are dropped first)
+DEFAULT_EXPORT_BUFFER_SIZE: Final[int] = 10_000
+DEFAULT_EXPORT_BATCH_SIZE: Final[int] = 256
+# How long the exporter waits for a batch to fill up
+DEFAULT_EXPORT_LINGER: Final[float] = 0.5
+EXPORT_COMPRESSION_LEVEL: Final[int] = 6
+EXPORT_ACK_TIMEOUT: Final[float] = 10.0
+EXPORT_RECONNECT_MIN_DELAY: Final[float] = 0.5
+EXPORT_RECONNECT_MAX_DELAY: Final[float] = 30.0
+EXPORT_CLOSE_TIMEOUT: Final[float] = 2.0
+EXPORT_AUTH_TIMEOUT: Final[float] = 10.0
+AUTH_NONCE_SIZE: Final[int] = 32
+# Limits of a single frame, compressed and decompressed
+MAX_EXPORT_FRAME_SIZE: Final[int] = 64 * 1024 * 1024
+MAX_EXPORT_PAYLOAD_SIZE: Final[int] = 256 * 1024 * 1024
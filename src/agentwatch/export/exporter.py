@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import socket
+import ssl
+import uuid
+from collections import deque
+from typing import Optional
+
+from agentwatch.export.consts import (AUTH_NONCE_SIZE, DEFAULT_AGGREGATOR_PORT, DEFAULT_EXPORT_BATCH_SIZE,
+                                      DEFAULT_EXPORT_BUFFER_SIZE, DEFAULT_EXPORT_LINGER, EXPORT_ACK_TIMEOUT,
+                                      EXPORT_AUTH_TIMEOUT, EXPORT_CLOSE_TIMEOUT, EXPORT_RECONNECT_MAX_DELAY,
+                                      EXPORT_RECONNECT_MIN_DELAY)
+from agentwatch.export.models import ExportBatch, ExporterStats, ExportRecord
+from agentwatch.export.protocol import AUTH_OK, FRAME_ACK, auth_digest, encode_batch
+from agentwatch.graph.models import GraphStructure
+from agentwatch.pipes import FrameError
+
+logger = logging.getLogger(__name__)
+
+def parse_export_address(address: str) -> tuple[str, int]:
+    """"host:port" (or just "host") of an aggregator"""
+    host, _, port = address.rpartition(":")
+    if not host:
+        return port, DEFAULT_AGGREGATOR_PORT
+    return host.strip("[]"), int(port)
+
+def export_ssl_context(tls: Optional[str]) -> Optional[ssl.SSLContext]:
+    """
+    The context verifying the aggregator, see AGENTWATCH_EXPORT_TLS. None (or "0") exports in the clear.
+    """
+    if not tls or tls == "0":
+        return None
+    if tls == "1":
+        return ssl.create_default_context()
+    return ssl.create_default_context(cafile=tls)
+
+class ExportAuthError(Exception):
+    pass
+
+class EventExporter:
+    """
+    Ships the collector's graph updates to a remote aggregator over a persistent TCP connection.
+
+    Updates are buffered locally (the oldest are dropped once `buffer_size` is reached) and sent in
+    compressed batches of up to `batch_size`, every batch is acknowledged by the aggregator.
+    A batch that wasn't acknowledged is sent again after reconnecting (with an exponential backoff),
+    so delivery is at-least-once. Records are numbered, the aggregator skips the ones it already merged.
+
+    The aggregator is authenticated to with `token` (see protocol.py), over TLS when given an `ssl_context`.
+    """
+
+    def __init__(self,
+                 host: str,
+                 port: int = DEFAULT_AGGREGATOR_PORT,
+                 buffer_size: int = DEFAULT_EXPORT_BUFFER_SIZE,
+                 batch_size: int = DEFAULT_EXPORT_BATCH_SIZE,
+                 linger: float = DEFAULT_EXPORT_LINGER,
+                 hostname: Optional[str] = None,
+                 token: Optional[str] = None,
+                 ssl_context: Optional[ssl.SSLContext] = None) -> None:
+        self._host = host
+        self._port = port
+        self._buffer_size = buffer_size
+        self._batch_size = batch_size
+        self._linger = linger
+        self._hostname = hostname or socket.gethostname()
+        self._token = token
+        self._ssl_context = ssl_context
+
+        self._id = uuid.uuid4().hex
+        self._seq = 0
+        self._buffer: deque[ExportRecord] = deque()
+        self._stats = ExporterStats()
+        self._wakeup = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    @property
+    def address(self) -> str:
+        return f"{self._host}:{self._port}"
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="event-exporter")
+
+    def add(self, execution_id: str, structure: GraphStructure) -> None:
+        nodes, edges = structure
+        self._seq += 1
+        record = ExportRecord(execution_id=execution_id,
+                              nodes=[node.model_dump(mode="json") for node in nodes],
+                              edges=[edge.model_dump(mode="json") for edge in edges],
+                              seq=self._seq)
+        self._buffer.append(record)
+        self._trim()
+        self._wakeup.set()
+
+    def stats(self) -> ExporterStats:
+        return self._stats.model_copy(update={"buffered": len(self._buffer)})
+
+    async def close(self, timeout: float = EXPORT_CLOSE_TIMEOUT) -> None:
+        """
+        Send what's left in the buffer if the aggregator is reachable, for up to `timeout` seconds
+        """
+        self._closing.set()
+        self._wakeup.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except asyncio.TimeoutError:
+                pass
+            except Exception as e:
+                logger.warning(f"Exporter failed: {e}")
+
+        if self._buffer:
+            logger.warning(f"Dropping {len(self._buffer)} graph updates that weren't exported to {self.address}")
+            self._stats.dropped += len(self._buffer)
+            self._buffer.clear()
+
+    async def _run(self) -> None:
+        delay = EXPORT_RECONNECT_MIN_DELAY
+        while not self._closing.is_set():
+            try:
+                reader, writer = await self._connect()
+            except (ExportAuthError, OSError, EOFError, asyncio.TimeoutError) as e:
+                if isinstance(e, ExportAuthError):
+                    logger.error(f"The aggregator at {self.address} rejected the exporter: {e}")
+                else:
+                    logger.debug(f"Couldn't connect to the aggregator at {self.address}: {e!r}")
+                await self._backoff(delay)
+                delay = min(delay * 2, EXPORT_RECONNECT_MAX_DELAY)
+                continue
+
+            logger.info(f"Exporting graph updates to {self.address}")
+            self._stats.connected = True
+            delay = EXPORT_RECONNECT_MIN_DELAY
+            try:
+                await self._send_batches(reader, writer)
+                return
+            except (OSError, EOFError, asyncio.TimeoutError) as e:
+                logger.warning(f"Lost the connection to the aggregator at {self.address}: {e!r}")
+                self._stats.reconnects += 1
+            finally:
+                self._stats.connected = False
+                writer.close()
+
+    async def _connect(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self._host, self._port, ssl=self._ssl_context),
+                                                EXPORT_AUTH_TIMEOUT)
+        try:
+            nonce = await asyncio.wait_for(reader.readexactly(AUTH_NONCE_SIZE), EXPORT_AUTH_TIMEOUT)
+            writer.write(auth_digest(self._token, nonce))
+            await writer.drain()
+            try:
+                result = await asyncio.wait_for(reader.readexactly(len(AUTH_OK)), EXPORT_AUTH_TIMEOUT)
+            except asyncio.IncompleteReadError:
+                raise ExportAuthError("invalid token")
+            if result != AUTH_OK:
+                raise ExportAuthError("unexpected handshake answer")
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def _backoff(self, delay: float) -> None:
+        try:
+            await asyncio.wait_for(self._closing.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _send_batches(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Returns once closing and the buffer is empty
+        """
+        while True:
+            if not self._buffer:
+                if self._closing.is_set():
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            if len(self._buffer) < self._batch_size and not self._closing.is_set():
+                # Let the batch fill up
+                await asyncio.sleep(self._linger)
+
+            records = [self._buffer.popleft() for _ in range(min(self._batch_size, len(self._buffer)))]
+            try:
+                frame = encode_batch(ExportBatch(host=self._hostname, exporter_id=self._id, records=records))
+            except FrameError as e:
+                logger.warning(f"Dropping {len(records)} graph updates: {e}")
+                self._stats.dropped += len(records)
+                continue
+
+            try:
+                writer.write(frame)
+                await writer.drain()
+                (acked,) = FRAME_ACK.unpack(await asyncio.wait_for(reader.readexactly(FRAME_ACK.size), EXPORT_ACK_TIMEOUT))
+            except BaseException:
+                # Sent again on the next connection, records that arrived meanwhile come after them
+                self._buffer.extendleft(reversed(records))
+                self._trim()
+                raise
+
+            self._stats.sent_records += acked
+            self._stats.sent_batches += 1
+            self._stats.sent_bytes += len(frame)
+
+    def _trim(self) -> None:
+        while len(self._buffer) > self._buffer_size:
+            self._buffer.popleft()
+            self._stats.dropped += 1
@@ -0,0 +1,43 @@
+import time
+from typing import Any, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ExportRecord(BaseModel):
+    """The graph update (serialized nodes and edges) produced by a single event of a client"""
+    execution_id: str
+    nodes: list[dict[str, Any]] = []
+    edges: list[dict[str, Any]] = []
+    created_at: float = Field(default_factory=time.time)
+    # Numbered by the exporter, a record that's sent again keeps its number
+    seq: Optional[int] = None
+
+class ExportBatch(BaseModel):
+    """
+    A frame sent by a node's exporter, `host` identifies the node and `exporter_id` the exporter
+    (its record numbers start over with every exporter)
+    """
+    host: str
+    records: list[ExportRecord]
+    exporter_id: Optional[str] = None
+    sent_at: float = Field(default_factory=time.time)
+
+class ExporterStats(BaseModel):
+    connected: bool = False
+    buffered: int = 0
+    sent_records: int = 0
+    sent_batches: int = 0
+    sent_bytes: int = 0
+    dropped: int = 0
+    reconnects: int = 0
+
+class AggregatorStats(BaseModel):
+    connections: int = 0
+    batches: int = 0
+    records: int = 0
+    graphs: int = 0
+    evicted: int = 0
+    duplicates: int = 0
+    rejected_frames: int = 0
+    rejected_connections: int = 0
@@ -0,0 +1,60 @@
+import asyncio
+import hashlib
+import hmac
+import struct
+import zlib
+from typing import Final, Optional
+
+from pydantic import ValidationError
+
+from agentwatch.export.consts import EXPORT_COMPRESSION_LEVEL, MAX_EXPORT_FRAME_SIZE, MAX_EXPORT_PAYLOAD_SIZE
+from agentwatch.export.models import ExportBatch
+from agentwatch.pipes import FrameError
+
+# Handshake: the aggregator sends a random nonce, the exporter answers with its HMAC keyed by the shared
+# token (so the token never travels, even without TLS) and the aggregator answers with AUTH_OK or closes.
+# Exporter -> aggregator: length prefixed, zlib compressed ExportBatch JSON.
+# Aggregator -> exporter: the number of records of every frame, once they're merged.
+FRAME_LENGTH: Final[struct.Struct] = struct.Struct("!I")
+FRAME_ACK: Final[struct.Struct] = struct.Struct("!I")
+AUTH_DIGEST_SIZE: Final[int] = hashlib.sha256().digest_size
+AUTH_OK: Final[bytes] = b"\x01"
+
+
+def auth_digest(token: Optional[str], nonce: bytes) -> bytes:
+    return hmac.new((token or "").encode(), nonce, hashlib.sha256).digest()
+
+def verify_digest(token: str, nonce: bytes, digest: bytes) -> bool:
+    return hmac.compare_digest(auth_digest(token, nonce), digest)
+
+
+def encode_batch(batch: ExportBatch, level: int = EXPORT_COMPRESSION_LEVEL) -> bytes:
+    payload = zlib.compress(batch.model_dump_json().encode(), level)
+    if len(payload) > MAX_EXPORT_FRAME_SIZE:
+        raise FrameError(f"Frame too large ({len(payload)} bytes)")
+    return FRAME_LENGTH.pack(len(payload)) + payload
+
+def decode_batch(payload: bytes) -> ExportBatch:
+    decompressor = zlib.decompressobj()
+    try:
+        data = decompressor.decompress(payload, MAX_EXPORT_PAYLOAD_SIZE)
+    except zlib.error as e:
+        raise FrameError(f"Invalid frame: {e}")
+    if decompressor.unconsumed_tail:
+        raise FrameError("Decompressed frame too large")
+
+    try:
+        return ExportBatch.model_validate_json(data)
+    except ValidationError as e:
+        raise FrameError(f"Invalid batch: {e}")
+
+async def read_batch(reader: asyncio.StreamReader) -> ExportBatch:
+    """
+    Raises:
+        asyncio.IncompleteReadError: When the connection was closed
+        FrameError: When the frame is corrupted
+    """
+    (length,) = FRAME_LENGTH.unpack(await reader.readexactly(FRAME_LENGTH.size))
+    if length > MAX_EXPORT_FRAME_SIZE:
+        raise FrameError(f"Frame too large ({length} bytes)")
+    return decode_batch(await reader.readexactly(length))
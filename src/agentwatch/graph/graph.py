@@ -14,8 +14,15 @@ class GraphBuilder:
         
     def append_nodes(self, nodes: list[Node]) -> None:
         for node in nodes:
-            if node.node_id not in [n.node_id for n in self._nodes]:
+            existing = next((n for n in self._nodes if n.node_id == node.node_id), None)
+            if existing is None:
                 self._nodes.append(node)
+            elif node.latency is not None:
+                # Same node seen again with a latency sample (i.e. another call to the same model/server)
+                if existing.latency is None:
+                    existing.latency = node.latency.model_copy()
+                else:
+                    existing.latency.merge(node.latency)
 
     def append_edges(self, edges: list[Edge]) -> None:
         self._edges.extend(edges)
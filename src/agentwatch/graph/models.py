@@ -16,10 +16,53 @@ class GraphExtractor(BaseModel):
     def extract_graph_structure(self, *args: Any, **kwargs: Any) -> "GraphStructure":
         ...
 
+    def request_context(self) -> Optional[BaseModel]:
+        """
+        Called on request models, what the response of the same exchange needs of the request (see attach_request).
+        Only this is kept until the response arrives, not the request itself.
+        """
+        return None
+
+    def attach_request(self, request: Any) -> None:
+        """
+        Called on response models with the request context of the same exchange (if the request was seen)
+        """
+        pass
+
+class LatencyStats(BaseModel):
+    count: int = 0
+    total_ms: float = 0
+    min_ms: Optional[float] = None
+    max_ms: Optional[float] = None
+    last_ms: Optional[float] = None
+
+    @property
+    def avg_ms(self) -> Optional[float]:
+        if self.count == 0:
+            return None
+        return self.total_ms / self.count
+
+    def add(self, latency_ms: float) -> None:
+        self.count += 1
+        self.total_ms += latency_ms
+        self.min_ms = latency_ms if self.min_ms is None else min(self.min_ms, latency_ms)
+        self.max_ms = latency_ms if self.max_ms is None else max(self.max_ms, latency_ms)
+        self.last_ms = latency_ms
+
+    def merge(self, other: "LatencyStats") -> None:
+        if other.count == 0:
+            return
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.min_ms = other.min_ms if self.min_ms is None or other.min_ms is None else min(self.min_ms, other.min_ms)
+        self.max_ms = other.max_ms if self.max_ms is None or other.max_ms is None else max(self.max_ms, other.max_ms)
+        self.last_ms = other.last_ms
+
 class Node(BaseModel):
     node_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     node_type: NodeType
     created_at: float = Field(default_factory=lambda: time.time())
+    latency: Optional[LatencyStats] = None
 
 class LLMNode(Node):
     node_type: NodeType = NodeType.LLM
@@ -41,6 +84,8 @@ class Edge(BaseModel):
     source_node_id: str
     target_node_id: str
     created_at: float = Field(default_factory=lambda: time.time())
+    exchange_id: Optional[str] = None
+    latency_ms: Optional[float] = None
 
 class ModelGenerateEdge(Edge):
     edge_type: EdgeType = EdgeType.MODEL_GENERATE
@@ -65,5 +110,26 @@ class McpCallEdge(Edge):
 
 GraphStructure: TypeAlias = tuple[list[Node], list[Edge]]
 
+NODE_CLASSES: dict[NodeType, Type[Node]] = {
+    NodeType.LLM: LLMNode,
+    NodeType.TOOL: ToolNode,
+    NodeType.MCP_SERVER: MCPServerNode,
+    NodeType.APPLICATION: AppNode
+}
+
+EDGE_CLASSES: dict[EdgeType, Type[Edge]] = {
+    EdgeType.TOOL_CALL: ToolCallEdge,
+    EdgeType.MCP_CALL: McpCallEdge,
+    EdgeType.MODEL_GENERATE: ModelGenerateEdge
+}
+
+def node_from_data(data: dict[str, Any]) -> Node:
+    """Rebuild a serialized node as its own Node subclass"""
+    return NODE_CLASSES.get(NodeType(data.get("node_type")), Node).model_validate(data)
+
+def edge_from_data(data: dict[str, Any]) -> Edge:
+    """Rebuild a serialized edge as its own Edge subclass"""
+    return EDGE_CLASSES.get(EdgeType(data.get("edge_type")), Edge).model_validate(data)
+
 graph_extractor_fm: FlavorManager[str, Type[GraphExtractor]] = FlavorManager()
 
@@ -0,0 +1,118 @@
+import codecs
+import zlib
+from typing import Callable, Optional
+
+DEFAULT_CHARSET = "utf-8"
+DEFAULT_TRUNCATION_MARKER = "\n...[agentwatch: {dropped} bytes truncated]...\n"
+
+
+class BodyCapture:
+    """
+    Records an HTTP body as raw bytes while keeping memory bounded.
+
+    Up to `head_bytes` bytes are kept from the beginning of the body and up to `tail_bytes`
+    from its end. Anything in between is dropped and replaced by `truncation_marker` when the
+    captured content is requested. When `head_bytes` is None the whole body is kept.
+    """
+
+    def __init__(self,
+                 head_bytes: Optional[int] = None,
+                 tail_bytes: int = 0,
+                 truncation_marker: str = DEFAULT_TRUNCATION_MARKER) -> None:
+        self._head_limit = head_bytes
+        self._tail_limit = tail_bytes
+        self._marker = truncation_marker
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._size = 0
+
+    @property
+    def size(self) -> int:
+        """Total number of bytes seen, including dropped ones"""
+        return self._size
+
+    @property
+    def truncated(self) -> bool:
+        return self._size > len(self._head) + len(self._tail)
+
+    def feed(self, chunk: bytes) -> None:
+        self._size += len(chunk)
+
+        if self._head_limit is None:
+            self._head += chunk
+            return
+
+        if len(self._head) < self._head_limit:
+            room = self._head_limit - len(self._head)
+            self._head += chunk[:room]
+            chunk = chunk[room:]
+
+        if chunk and self._tail_limit:
+            self._tail += chunk[-self._tail_limit:]
+            if len(self._tail) > self._tail_limit:
+                del self._tail[:len(self._tail) - self._tail_limit]
+
+    def getvalue(self) -> bytes:
+        if not self.truncated:
+            return bytes(self._head + self._tail)
+
+        dropped = self._size - len(self._head) - len(self._tail)
+        return bytes(self._head) + self._marker.format(dropped=dropped).encode() + bytes(self._tail)
+
+
+def _decompress(content: bytes, decompressor: Callable[[bytes], bytes]) -> bytes:
+    try:
+        return decompressor(content)
+    except Exception:
+        # Truncated or otherwise broken bodies - keep the raw bytes
+        return content
+
+def _zlib_decompressor(wbits: int) -> Callable[[bytes], bytes]:
+    def decompress(content: bytes) -> bytes:
+        # A decompressobj returns whatever it could decode, even if the stream was cut (i.e. truncated capture)
+        return zlib.decompressobj(wbits).decompress(content)
+    return decompress
+
+def _content_decoders() -> dict[str, Callable[[bytes], bytes]]:
+    decoders = {
+        "gzip": _zlib_decompressor(zlib.MAX_WBITS | 16),
+        "deflate": _zlib_decompressor(zlib.MAX_WBITS | 32),
+        "identity": lambda content: content,
+    }
+
+    try:
+        import brotli
+        decoders["br"] = brotli.decompress
+    except ImportError:
+        pass
+
+    return decoders
+
+CONTENT_DECODERS = _content_decoders()
+
+
+def get_charset(content_type: Optional[str]) -> str:
+    if content_type:
+        for param in content_type.split(";")[1:]:
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "charset" and value:
+                charset = value.strip().strip('"\'')
+                try:
+                    return codecs.lookup(charset).name
+                except LookupError:
+                    break
+
+    return DEFAULT_CHARSET
+
+def decode_body(content: bytes, headers: dict[str, str]) -> str:
+    """
+    Decode a raw HTTP body to text according to its Content-Encoding and charset.
+    Never raises - undecodable bytes are replaced.
+    """
+    content_encoding = headers.get("content-encoding", "")
+    for encoding in reversed([e.strip().lower() for e in content_encoding.split(",") if e.strip()]):
+        if (decoder := CONTENT_DECODERS.get(encoding)) is None:
+            break
+        content = _decompress(content, decoder)
+
+    return content.decode(get_charset(headers.get("content-type")), errors="replace")
@@ -0,0 +1,57 @@
+import time
+from typing import Any, Awaitable, Callable, Final, Optional, Union
+
+from agentwatch.hooks.http.models import ConnectionInfo
+
+# Phases that only happen when a new connection is established
+CONNECT_PHASES: Final[tuple[str, ...]] = ("connection.connect_tcp", "connection.connect_unix_socket")
+
+TraceCallback = Callable[[str, dict[str, Any]], Union[None, Awaitable[None]]]
+
+
+class ConnectionTracer:
+    """
+    A callback for httpcore's `trace` request extension (sync interface).
+
+    httpcore reports "<phase>.started" / "<phase>.complete" / "<phase>.failed" pairs; the duration
+    of every phase is recorded on `info`. An existing trace callback of the request is chained, so
+    user tracing keeps working while a request is intercepted.
+    """
+
+    def __init__(self, chained: Optional[TraceCallback] = None) -> None:
+        # Don't chain ourselves when httpcore retries the same request on another connection
+        if isinstance(chained, ConnectionTracer):
+            chained = chained.get_chained()
+
+        self.chained: Optional[TraceCallback] = chained
+        self.info = ConnectionInfo()
+        self._started: dict[str, float] = {}
+
+    def get_chained(self) -> Optional[TraceCallback]:
+        return self.chained
+
+    def __call__(self, event_name: str, info: dict[str, Any]) -> None:
+        self._record(event_name)
+        if self.chained is not None:
+            self.chained(event_name, info)
+
+    def _record(self, event_name: str) -> None:
+        phase, _, state = event_name.rpartition(".")
+        if state == "started":
+            self._started[phase] = time.monotonic()
+            if phase in CONNECT_PHASES:
+                self.info.reused = False
+        elif (start := self._started.pop(phase, None)) is not None:
+            duration_ms = (time.monotonic() - start) * 1000
+            self.info.phases_ms[phase] = self.info.phases_ms.get(phase, 0) + duration_ms
+
+
+class AsyncConnectionTracer(ConnectionTracer):
+    """
+    Same as ConnectionTracer for httpcore's async interface, which expects a coroutine function
+    """
+
+    async def __call__(self, event_name: str, info: dict[str, Any]) -> None:  # type: ignore[override]
+        self._record(event_name)
+        if self.chained is not None:
+            await self.chained(event_name, info)  # type: ignore[misc]
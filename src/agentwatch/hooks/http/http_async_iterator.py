@@ -1,78 +1,88 @@
+import time
 from collections.abc import AsyncIterator
 from typing import AsyncIterator as AsyncIterType
 from typing import Awaitable, Callable, Generic, Optional, TypeVar, cast
 
 import httpcore
-import httpx
 
-from agentwatch.enums import HookEventType
-from agentwatch.hooks.http.models import HTTPResponseData
+from agentwatch.enums import HookEventType, OverheadStage
+from agentwatch.hooks.http.body import BodyCapture
+from agentwatch.hooks.http.models import HttpExchange, SSEFrame
+from agentwatch.hooks.http.normalization import response_data, response_delta_data, to_hook_event
+from agentwatch.hooks.http.sse_accumulator import SSEAccumulator
 from agentwatch.hooks.models import HookEvent
+from agentwatch.metrics import overhead_metrics
 
 T = TypeVar('T')
 
 class HttpAsyncIterator(Generic[T]):
     """
     A wrapper class that handles iteration over an AsyncIterable object.
-    
+
     This class receives a typing.AsyncIterable object during initialization
     and provides an interface to iterate over it, yielding the results.
+
+    Chunks are recorded as they pass through and a single consolidated response event
+    is reported once the stream ends. Event streams can be given an SSEAccumulator, in
+    which case the messages (frames) received so far are reported in throttled deltas while
+    the stream is still being consumed, and the response event carries the remaining ones.
     """
-    
-    def __init__(self, response: httpcore.Response, callback: Callable[[HookEvent], Awaitable[None]]) -> None:
+
+    def __init__(self,
+                 response: httpcore.Response,
+                 callback: Callable[[HookEvent], Awaitable[None]],
+                 capture: Optional[BodyCapture] = None,
+                 accumulator: Optional[SSEAccumulator] = None,
+                 exchange: Optional[HttpExchange] = None,
+                 on_complete: Optional[Callable[[HttpExchange], None]] = None) -> None:
         super().__init__()
         self._async_iterable = response.aiter_stream()
         self._response = response
         self._callback = callback
         self._iterator: Optional[AsyncIterType[T]] = None
-    
+        self._accumulator = accumulator
+        self._capture = capture or BodyCapture()
+        self._exchange = exchange
+        self._on_complete = on_complete
+        self._emitted = False
+        self._deltas_emitted = False
+
     def __aiter__(self) -> 'AsyncIterator[T]':
         """
         Return self as an AsyncIterator.
         """
         return self
-    
+
     async def __anext__(self) -> T:
         """
         Get the next item from the async iterator.
-        
+
         Raises:
             StopAsyncIteration: When there are no more items
         """
         if self._iterator is None:
             self._iterator = cast(AsyncIterator[T], self._async_iterable.__aiter__())
-        
+
         try:
             original = await self._iterator.__anext__()
 
-            try:
-                httpx_response = httpx.Response(
-                    status_code=self._response.status,
-                    headers=self._response.headers,
-                    content=cast(bytes, original),
-                    extensions=self._response.extensions
-                )
-            except Exception as ex:
-                return original
-
-            response_data = HTTPResponseData(
-                status_code=httpx_response.status_code,
-                headers=dict(httpx_response.headers),
-                body=httpx_response.text
-            )
-
-            hook_event = HookEvent(
-                event_type=HookEventType.HTTP_RESPONSE,
-                data=response_data.model_dump()
-            )
-
-            await self._callback(hook_event)
+            chunk = cast(bytes, original)
+            self._capture.feed(chunk)
+            if self._exchange is not None:
+                self._exchange.mark_first_byte()
+
+            if self._accumulator is not None:
+                self._accumulator.feed(chunk)
+                if self._accumulator.should_emit_delta():
+                    await self._emit_delta()
+
             return original
-                
+
         except StopAsyncIteration:
             self._iterator = None
+            await self._emit()
             raise
-    
+
     async def aclose(self) -> None:
         """
         Close the async iterator if it has an aclose method.
@@ -84,3 +94,49 @@ class HttpAsyncIterator(Generic[T]):
                 pass
 
             self._iterator = None
+
+        try:
+            await self._response.aclose()
+        finally:
+            await self._emit()
+
+    async def _emit_delta(self) -> None:
+        if self._accumulator is None:
+            return
+
+        start = time.perf_counter_ns()
+        delta_data = response_delta_data(self._response,
+                                         self._accumulator.take_delta(),
+                                         self._accumulator.size,
+                                         self._exchange)
+        overhead_metrics.record(OverheadStage.NORMALIZE, start)
+
+        self._deltas_emitted = True
+        await self._callback(to_hook_event(HookEventType.HTTP_RESPONSE_DELTA, delta_data))
+
+    async def _emit(self) -> None:
+        if self._emitted:
+            return
+        self._emitted = True
+
+        if self._exchange is not None:
+            self._exchange.mark_last_byte()
+            if self._on_complete is not None:
+                self._on_complete(self._exchange)
+
+        # The messages that weren't reported in a delta yet, one frame each
+        frames: Optional[list[SSEFrame]] = None
+        if self._accumulator is not None:
+            self._accumulator.finish()
+            frames = self._accumulator.take_delta()
+
+        try:
+            start = time.perf_counter_ns()
+            # Once deltas carried part of the stream, shipping its whole body again would only duplicate it
+            data = response_data(self._response, self._capture, self._exchange, frames,
+                                 keep_content=not self._deltas_emitted)
+            overhead_metrics.record(OverheadStage.NORMALIZE, start)
+        except Exception:
+            return
+
+        await self._callback(to_hook_event(HookEventType.HTTP_RESPONSE, data))
@@ -1,23 +1,30 @@
 import abc
 from typing import Any, Optional
 
-from pydantic import BaseModel
-
 from agentwatch.hooks.base import BaseHook, HookCallbackProto
+from agentwatch.hooks.http.intercept_matcher import InterceptMatcher
+from agentwatch.hooks.http.models import HttpInterceptRule
 
 
-class HttpInterceptRule(BaseModel):
-    host: str
-    port: Optional[int] = None
-
 class HttpInterceptHook(BaseHook):
     def __init__(self, callback_handler: HookCallbackProto) -> None:
         super().__init__(callback_handler)
-        self._rules: list[HttpInterceptRule] = []
+        self._matcher = InterceptMatcher([])
     
-    def add_intercept_rule(self, host: str, port: Optional[int] = None) -> None:
-        rule = HttpInterceptRule(host=host, port=port)
-        self._rules.append(rule)
+    @property
+    def intercept_rules(self) -> list[HttpInterceptRule]:
+        return self._matcher.rules
+
+    def add_intercept_rule(self, host: str, port: Optional[int] = None, path_prefix: Optional[str] = None) -> None:
+        rule = HttpInterceptRule(host=host, port=port, path_prefix=path_prefix)
+        self.set_intercept_rules(self._matcher.rules + [rule])
+
+    def set_intercept_rules(self, rules: list[HttpInterceptRule]) -> None:
+        """
+        Replace all intercept rules. The matcher is compiled up front and swapped in a single
+        assignment, so requests in flight on other threads see either the old or the new rules.
+        """
+        self._matcher = InterceptMatcher(rules)
 
     def should_intercept(self, 
                          host: str, 
@@ -25,15 +32,8 @@ class HttpInterceptHook(BaseHook):
                          path: str = "/", 
                          scheme: str = "https", 
                          **kwargs: Any) -> bool:
-        for rule in self._rules:
-            if rule.host == host and (rule.port is None or rule.port == port):
-                return True
-        return False
+        return self._matcher.matches(host.encode(), port, path.encode(), scheme.encode())
     
     @abc.abstractmethod
     def _normalize_request(self, *args: Any, **kwargs: Any) -> Any:
         ...
-    
-    @abc.abstractmethod
-    def _normalize_response_sync(self, *args: Any, **kwargs: Any) -> Any:
-        ...
\ No newline at end of file
@@ -0,0 +1,114 @@
+import time
+from collections.abc import Iterator
+from typing import Callable, Optional
+
+import httpcore
+
+from agentwatch.enums import HookEventType, OverheadStage
+from agentwatch.hooks.http.body import BodyCapture
+from agentwatch.hooks.http.models import HttpExchange, SSEFrame
+from agentwatch.hooks.http.normalization import response_data, response_delta_data, to_hook_event
+from agentwatch.hooks.http.sse_accumulator import SSEAccumulator
+from agentwatch.hooks.models import HookEvent
+from agentwatch.metrics import overhead_metrics
+
+
+class HttpSyncIterator:
+    """
+    A tee-style wrapper around a synchronous httpcore response stream.
+
+    Chunks are handed to the caller as soon as they arrive from the network and are recorded
+    on the side. Once the stream is exhausted or closed, a single response event is built from
+    the recorded chunks and passed to the callback.
+
+    Event streams can be given an SSEAccumulator, in which case the messages (frames) received
+    so far are reported in throttled deltas while the stream is still being consumed, and the
+    response event carries the remaining ones.
+    """
+
+    def __init__(self,
+                 response: httpcore.Response,
+                 callback: Callable[[HookEvent], None],
+                 capture: Optional[BodyCapture] = None,
+                 accumulator: Optional[SSEAccumulator] = None,
+                 exchange: Optional[HttpExchange] = None,
+                 on_complete: Optional[Callable[[HttpExchange], None]] = None) -> None:
+        self._response = response
+        self._callback = callback
+        self._accumulator = accumulator
+        self._capture = capture or BodyCapture()
+        self._exchange = exchange
+        self._on_complete = on_complete
+        self._iterator: Optional[Iterator[bytes]] = None
+        self._emitted = False
+        self._deltas_emitted = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        """
+        Yield the chunks of the wrapped response while recording them.
+        """
+        self._iterator = self._response.iter_stream()
+
+        for chunk in self._iterator:
+            self._capture.feed(chunk)
+            if self._exchange is not None:
+                self._exchange.mark_first_byte()
+
+            if self._accumulator is not None:
+                self._accumulator.feed(chunk)
+                if self._accumulator.should_emit_delta():
+                    self._emit_delta()
+
+            yield chunk
+
+        self._emit()
+
+    def close(self) -> None:
+        """
+        Close the wrapped response (releasing the connection) and emit the response event.
+        """
+        try:
+            self._response.close()
+        finally:
+            self._emit()
+
+    def _emit_delta(self) -> None:
+        if self._accumulator is None:
+            return
+
+        start = time.perf_counter_ns()
+        delta_data = response_delta_data(self._response,
+                                         self._accumulator.take_delta(),
+                                         self._accumulator.size,
+                                         self._exchange)
+        overhead_metrics.record(OverheadStage.NORMALIZE, start)
+
+        self._deltas_emitted = True
+        self._callback(to_hook_event(HookEventType.HTTP_RESPONSE_DELTA, delta_data))
+
+    def _emit(self) -> None:
+        if self._emitted:
+            return
+        self._emitted = True
+
+        if self._exchange is not None:
+            self._exchange.mark_last_byte()
+            if self._on_complete is not None:
+                self._on_complete(self._exchange)
+
+        # The messages that weren't reported in a delta yet, one frame each
+        frames: Optional[list[SSEFrame]] = None
+        if self._accumulator is not None:
+            self._accumulator.finish()
+            frames = self._accumulator.take_delta()
+
+        try:
+            start = time.perf_counter_ns()
+            # Once deltas carried part of the stream, shipping its whole body again would only duplicate it
+            data = response_data(self._response, self._capture, self._exchange, frames,
+                                 keep_content=not self._deltas_emitted)
+            overhead_metrics.record(OverheadStage.NORMALIZE, start)
+        except Exception:
+            return
+
+        self._callback(to_hook_event(HookEventType.HTTP_RESPONSE, data))
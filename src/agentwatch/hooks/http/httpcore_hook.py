@@ -1,15 +1,26 @@
 import logging
+import threading
+import time
+from functools import partial
 from typing import Any, Optional
 
-from agentwatch.enums import HookEventType
+from agentwatch.enums import HookEventType, OverheadStage, SamplingDecision
 from agentwatch.hooks.http.http_async_iterator import HttpAsyncIterator
 from agentwatch.hooks.http.http_base_hook import HttpInterceptHook
-from agentwatch.hooks.http.models import HTTPRequestData, HTTPResponseData
+from agentwatch.hooks.http.http_sync_iterator import HttpSyncIterator
+from agentwatch.hooks.http.body import BodyCapture
+from agentwatch.hooks.http.connection_trace import AsyncConnectionTracer, ConnectionTracer
+from agentwatch.hooks.http.models import (DEFAULT_STREAM_DELTA_INTERVAL_MS, HostConnectionStats, HostTrafficStats,
+                                         HttpCapturePolicy, HttpExchange, HttpSamplingRule)
+from agentwatch.hooks.http.normalization import format_host, get_header, is_event_stream, request_data, to_hook_event
+from agentwatch.hooks.http.sampling import Sampler
+from agentwatch.hooks.http.sse_accumulator import SSEAccumulator
+from agentwatch.hooks.http.timed_stream import TimedAsyncStream, TimedSyncStream
 from agentwatch.hooks.models import HookEvent
+from agentwatch.metrics import overhead_metrics
 
 try:
     import httpcore
-    import httpx
 except ImportError:
     pass
 
@@ -20,7 +31,51 @@ class HttpcoreHook(HttpInterceptHook):
         super().__init__(callback_handler)
         self._original_handle_request: Optional[Any] = None
         self._original_handle_async_request: Optional[Any] = None
+        self._stream_delta_interval_ms: Optional[float] = DEFAULT_STREAM_DELTA_INTERVAL_MS
+        self._stream_delta_bytes: Optional[int] = None
+        self._capture_policy = HttpCapturePolicy()
+        self._sampler = Sampler([])
+        self._connection_stats: dict[str, HostConnectionStats] = {}
+        self._traffic_stats: dict[str, HostTrafficStats] = {}
+        self._stats_lock = threading.Lock()
+
+    def set_capture_policy(self, policy: HttpCapturePolicy) -> None:
+        """
+        Limit how much of every request/response body is captured (see HttpCapturePolicy)
+        """
+        self._capture_policy = policy
+
+    def set_stream_deltas(self, interval_ms: Optional[float] = None, size_bytes: Optional[int] = None) -> None:
+        """
+        Report the messages of event streams in deltas every `interval_ms` milliseconds (by default
+        DEFAULT_STREAM_DELTA_INTERVAL_MS) or every `size_bytes` bytes. With neither, event streams aren't
+        parsed while they're consumed, a single response is reported once a stream ends.
+        """
+        self._stream_delta_interval_ms = interval_ms
+        self._stream_delta_bytes = size_bytes
     
+    def set_sampling_rules(self, rules: list[HttpSamplingRule]) -> None:
+        """
+        Capture only a sample of the intercepted exchanges (see HttpSamplingRule).
+        Sampled-out exchanges are still counted and timed, see traffic_stats().
+        """
+        self._sampler = Sampler(rules)
+
+    def connection_stats(self) -> dict[str, HostConnectionStats]:
+        """
+        Per-host connection metrics (new vs. reused connections, connect/TLS/send phase durations)
+        of the intercepted requests
+        """
+        with self._stats_lock:
+            return {host: stats.model_copy(deep=True) for host, stats in self._connection_stats.items()}
+
+    def traffic_stats(self) -> dict[str, HostTrafficStats]:
+        """
+        Per-host count and latency of all intercepted exchanges, including the sampled-out ones
+        """
+        with self._stats_lock:
+            return {host: stats.model_copy(deep=True) for host, stats in self._traffic_stats.items()}
+
     def apply_hook(self) -> None:
         try:
             import httpcore
@@ -46,146 +101,190 @@ class HttpcoreHook(HttpInterceptHook):
         
         logger.debug("httpcore hook applied")
     
-    def _normalize_request(self, request: httpcore.Request) -> HookEvent:
-        # Convert to httpx.Request
-        httpx_request = httpx.Request(
-            method=request.method.decode('ascii'),
-            url=str(request.url),
-            headers=[(k.decode('ascii'), v.decode('ascii')) for k, v in request.headers],
-            content=b"".join(request.stream).decode()  # type: ignore
-        )
-                
-        request_data = HTTPRequestData(
-            method=httpx_request.method,
-            url=str(httpx_request.url),
-            headers=dict(httpx_request.headers),
-            body=httpx_request.content.decode()
-        )
-        
-        return HookEvent(
-            event_type=HookEventType.HTTP_REQUEST,
-            data=request_data.model_dump()
-        )
+    def _normalize_request(self, request: httpcore.Request, exchange: Optional[HttpExchange] = None) -> HookEvent:
+        start = time.perf_counter_ns()
+        capture = self._create_body_capture()
+        for chunk in request.stream:  # type: ignore
+            capture.feed(chunk)
 
-    async def _normalize_response(self, response: httpcore.Response) -> HookEvent:
-        httpx_response = httpx.Response(
-            status_code=response.status,
-            headers=response.headers,
-            content=await response.aread(),
-            extensions=response.extensions,
-        )
+        if exchange is not None:
+            exchange.request_bytes = capture.size
 
-        response_data = HTTPResponseData(
-            status_code=httpx_response.status_code,
-            headers=dict(httpx_response.headers),
-            body=httpx_response.text
-        )
-        
-        return HookEvent(
-            event_type=HookEventType.HTTP_RESPONSE,
-            data=response_data.model_dump()
-        )
-    
-    def _normalize_response_sync(self, response: httpcore.Response) -> HookEvent:
-        httpx_response = httpx.Response(
-            status_code=response.status,
-            headers=response.headers,
-            content=response.read(),
-            extensions=response.extensions,
-        )
+        data = request_data(request, capture, exchange)
+        overhead_metrics.record(OverheadStage.NORMALIZE, start)
 
-        response_data = HTTPResponseData(
-            status_code=httpx_response.status_code,
-            headers=dict(httpx_response.headers),
-            body=httpx_response.text
-        )
-        
-        return HookEvent(
-            event_type=HookEventType.HTTP_RESPONSE,
-            data=response_data.model_dump()
-        )
-    
-    def _request_callback_sync(self, request: httpcore.Request) -> None:
-        normalized = self._normalize_request(request)
-        self._callback_handler.on_hook_callback_sync(self, normalized)
-    
-    def _response_callback_sync(self, response: httpcore.Response) -> None:
-        normalized = self._normalize_response_sync(response) 
+        return to_hook_event(HookEventType.HTTP_REQUEST, data)
+
+    def _request_callback_sync(self, request: httpcore.Request, exchange: Optional[HttpExchange] = None) -> None:
+        normalized = self._normalize_request(request, exchange)
         self._callback_handler.on_hook_callback_sync(self, normalized)
     
-    async def _request_callback(self, request: httpcore.Request) -> None:
-        normalized = self._normalize_request(request)
+    async def _request_callback(self, request: httpcore.Request, exchange: Optional[HttpExchange] = None) -> None:
+        normalized = self._normalize_request(request, exchange)
         await self._callback_handler.on_hook_callback(self, normalized)
     
-    async def _response_callback(self, response: httpcore.Response) -> None:
-        normalized = await self._normalize_response(response) 
-        await self._callback_handler.on_hook_callback(self, normalized)
+    def _should_intercept_request(self, request: httpcore.Request) -> bool:
+        url = request.url
+        return self._matcher.matches(url.host, url.port, url.target, url.scheme)
 
     def _intercepted_handle_request(self, conn_self: httpcore.HTTPConnection, request: httpcore.Request) -> httpcore.Response:
-        self._request_callback_sync(request)
-        response: httpcore.Response = self._original_handle_request(conn_self, request)  # type: ignore
+        if not self._should_intercept_request(request):
+            return self._original_handle_request(conn_self, request)  # type: ignore
+
+        exchange, host = self._sample(request)
+        if exchange.sampled:
+            self._request_callback_sync(request, exchange)
+
+        tracer = self._install_tracer(request, exchange, ConnectionTracer)
         try:
-            self._response_callback_sync(response)
-        except Exception as e:
-            logger.debug(f"Error in response callback: {e}")
-            return response
+            response: httpcore.Response = self._original_handle_request(conn_self, request)  # type: ignore
+        finally:
+            self._record_connection(request, tracer)
+        exchange.mark_headers_received()
 
-        # Since we messed up the response, we'll need to create a new one
-        new_response = httpcore.Response(
+        if not exchange.sampled:
+            return httpcore.Response(
+                status=response.status,
+                headers=response.headers,
+                content=TimedSyncStream(response, exchange, partial(self._record_latency, host)),
+                extensions=response.extensions.copy() if response.extensions else {},  # type: ignore
+            )
+
+        accumulator = self._create_sse_accumulator() if self._is_event_stream(response) else None
+
+        # Hand the body to the caller as it arrives and report the response once the stream is closed
+        return httpcore.Response(
             status=response.status,
             headers=response.headers,
-            content=response.read(),
+            content=HttpSyncIterator(response,
+                                     self._handle_streamed_hook_sync,
+                                     self._create_body_capture(),
+                                     accumulator,
+                                     exchange,
+                                     partial(self._record_latency, host)),
             extensions=response.extensions.copy() if response.extensions else {},  # type: ignore
         )
-
-        return new_response
     
+    def _install_tracer(self,
+                        request: httpcore.Request,
+                        exchange: HttpExchange,
+                        tracer_type: type[ConnectionTracer]) -> ConnectionTracer:
+        tracer = tracer_type(request.extensions.get("trace"))
+        exchange.connection = tracer.info
+        # Copy the extensions, httpx hands its own request's dict to httpcore
+        request.extensions = {**request.extensions, "trace": tracer}
+        return tracer
+
+    def _record_connection(self, request: httpcore.Request, tracer: ConnectionTracer) -> None:
+        # Only the phases up to the response headers are aggregated, body time is part of the exchange's timings
+        host = format_host(request.url)
+        with self._stats_lock:
+            stats = self._connection_stats.get(host)
+            if stats is None:
+                stats = self._connection_stats[host] = HostConnectionStats(host=host)
+            stats.add(tracer.info)
+
+    def _sample(self, request: httpcore.Request) -> tuple[HttpExchange, str]:
+        decision = self._sampler.sample(request.url.host)
+        host = format_host(request.url)
+
+        with self._stats_lock:
+            stats = self._traffic_stats.get(host)
+            if stats is None:
+                stats = self._traffic_stats[host] = HostTrafficStats(host=host)
+            stats.requests += 1
+            match decision:
+                case SamplingDecision.SAMPLED:
+                    stats.sampled += 1
+                case SamplingDecision.SAMPLED_OUT:
+                    stats.sampled_out += 1
+                case SamplingDecision.RATE_LIMITED:
+                    stats.rate_limited += 1
+
+        return HttpExchange(sampled=decision == SamplingDecision.SAMPLED), host
+
+    def _record_latency(self, host: str, exchange: HttpExchange) -> None:
+        latency_ms = exchange.timings.latency_ms
+        if latency_ms is None:
+            return
+
+        with self._stats_lock:
+            if (stats := self._traffic_stats.get(host)) is not None:
+                stats.latency.add(latency_ms)
+
     def _is_event_stream(self, response: httpcore.Response) -> bool:
-        for kvp in response.headers:
-            header, value = kvp
-            if header.decode().lower() == 'content-type':
-                if 'text/event-stream' in value.decode().lower():
-                    return True
-        return False
+        return is_event_stream(response.headers)
     
+    def _create_body_capture(self) -> BodyCapture:
+        policy = self._capture_policy
+        return BodyCapture(head_bytes=policy.head_bytes,
+                           tail_bytes=policy.tail_bytes,
+                           truncation_marker=policy.truncation_marker)
+
+    def _create_sse_accumulator(self) -> Optional[SSEAccumulator]:
+        # Without deltas the collector splits the body into messages, nothing to parse here
+        if self._stream_delta_interval_ms is None and self._stream_delta_bytes is None:
+            return None
+        return SSEAccumulator(delta_interval_ms=self._stream_delta_interval_ms,
+                              delta_bytes=self._stream_delta_bytes)
+
+    def _handle_streamed_hook_sync(self, event: HookEvent) -> None:
+        try:
+            self._callback_handler.on_hook_callback_sync(self, event)
+        except Exception as e:
+            logger.debug(f"Error in response callback: {e}")
+
     async def _handle_streamed_hook(self, event: HookEvent) -> None:
-       await self._callback_handler.on_hook_callback(self, event)
+        try:
+            await self._callback_handler.on_hook_callback(self, event)
+        except Exception as e:
+            logger.debug(f"Error in response callback: {e}")
         
     async def _intercepted_handle_async_request(self, conn_self: httpcore.AsyncHTTPConnection, request: httpcore.Request) -> httpcore.Response:
-        await self._request_callback(request)
-        response: httpcore.Response = await self._original_handle_async_request(conn_self, request)  # type: ignore
-        if self._is_event_stream(response):
-            # Get the 'host' header from the original request and put it in the response headers
-            # This is a workaround for the fact that httpcore doesn't pass the host header to the response
-            # when using streamed responses
-            for kvp in request.headers:
-                header, value = kvp
-                if header.decode().lower() == 'host':
-                    response.headers.append((header, value))
-                    break
+        if not self._should_intercept_request(request):
+            return await self._original_handle_async_request(conn_self, request)  # type: ignore
 
-            new_response = httpcore.Response(
+        exchange, host = self._sample(request)
+        if exchange.sampled:
+            await self._request_callback(request, exchange)
+
+        tracer = self._install_tracer(request, exchange, AsyncConnectionTracer)
+        try:
+            response: httpcore.Response = await self._original_handle_async_request(conn_self, request)  # type: ignore
+        finally:
+            self._record_connection(request, tracer)
+        exchange.mark_headers_received()
+
+        if not exchange.sampled:
+            return httpcore.Response(
                 status=response.status,
                 headers=response.headers,
-                content=HttpAsyncIterator(response, self._handle_streamed_hook),
+                content=TimedAsyncStream(response, exchange, partial(self._record_latency, host)),
                 extensions=response.extensions.copy() if response.extensions else {},  # type: ignore
             )
-            return new_response
-        try:
-            await self._response_callback(response)
-        except Exception as e:
-            logger.debug(f"Error in response callback: {e}")
-            return response
-        
-        # Since we messed up the response, we'll need to create a new one
-        new_response = httpcore.Response(
+
+        accumulator = None
+        if self._is_event_stream(response):
+            # Get the 'host' header from the original request and put it in the response headers
+            # This is a workaround for the fact that httpcore doesn't pass the host header to the response
+            # when using streamed responses
+            if (host_header := get_header(request.headers, b"host")) is not None:
+                response.headers.append((b"Host", host_header))
+            accumulator = self._create_sse_accumulator()
+
+        # Hand the body to the caller as it arrives and report the response once the stream is closed,
+        # so the exchange's last byte is taken when the caller actually finished reading it
+        return httpcore.Response(
             status=response.status,
             headers=response.headers,
-            content=await response.aread(),
+            content=HttpAsyncIterator(response,
+                                      self._handle_streamed_hook,
+                                      self._create_body_capture(),
+                                      accumulator,
+                                      exchange,
+                                      partial(self._record_latency, host)),
             extensions=response.extensions.copy() if response.extensions else {},  # type: ignore
         )
-
-        return new_response
     
     def remove_hook(self) -> None:
         """Remove the hook and restore original functions"""
@@ -0,0 +1,102 @@
+from typing import Final, Iterator, Optional
+
+from agentwatch.hooks.http.models import HttpInterceptRule
+from agentwatch.hooks.http.normalization import DEFAULT_PORTS
+
+WILDCARD_PREFIX: Final[str] = "*."
+MATCH_ALL_HOST: Final[str] = "*"
+
+# (port, path prefix) - None means "any"
+_Constraint = tuple[Optional[int], Optional[bytes]]
+
+
+def parse_host_pattern(pattern: str) -> tuple[Optional[bytes], bool]:
+    """
+    The lookup key of a rule's host, and whether it's a wildcard ("*.example.com" -> b"example.com").
+    The key is None for "*", which matches every host.
+    """
+    host = pattern.strip().lower()
+    if host == MATCH_ALL_HOST:
+        return None, False
+    if host.startswith(WILDCARD_PREFIX):
+        return host[len(WILDCARD_PREFIX):].encode(), True
+    return host.encode(), False
+
+def parent_domains(host: bytes) -> Iterator[bytes]:
+    """The keys of the wildcards that match a (lowercase) host, closest first"""
+    # "api.eu.example.com" -> "eu.example.com" -> "example.com" -> "com"
+    dot = host.find(b".")
+    while dot != -1:
+        yield host[dot + 1:]
+        dot = host.find(b".", dot + 1)
+
+
+
+class InterceptMatcher:
+    """
+    A compiled, immutable form of a list of HttpInterceptRule.
+
+    Exact hosts are looked up in a dict, wildcard rules ("*.example.com") are looked up by walking
+    the parent domains of the requested host, so the cost of a lookup doesn't depend on the number
+    of rules. A host without port/path constraints is stored as unconstrained and short-circuits.
+    Matching works on raw bytes, as found on httpcore.URL, to avoid decoding on the hot path.
+    """
+
+    def __init__(self, rules: list[HttpInterceptRule]) -> None:
+        self._rules = list(rules)
+        self._exact: dict[bytes, Optional[list[_Constraint]]] = {}
+        self._wildcards: dict[bytes, Optional[list[_Constraint]]] = {}
+        self._match_all: Optional[list[_Constraint]] = []
+
+        for rule in self._rules:
+            key, wildcard = parse_host_pattern(rule.host)
+            constraint: _Constraint = (rule.port, rule.path_prefix.encode() if rule.path_prefix else None)
+
+            if key is None:
+                self._match_all = self._merge(self._match_all, constraint)
+            elif wildcard:
+                self._wildcards[key] = self._merge(self._wildcards.get(key, []), constraint)
+            else:
+                self._exact[key] = self._merge(self._exact.get(key, []), constraint)
+
+    @property
+    def rules(self) -> list[HttpInterceptRule]:
+        return list(self._rules)
+
+    def matches(self, host: bytes, port: Optional[int] = None, target: bytes = b"/", scheme: bytes = b"https") -> bool:
+        if port is None:
+            port = DEFAULT_PORTS.get(scheme)
+
+        if self._check(self._match_all, port, target):
+            return True
+
+        host = host.lower()
+        if host in self._exact and self._check(self._exact[host], port, target):
+            return True
+
+        if self._wildcards:
+            for suffix in parent_domains(host):
+                if suffix in self._wildcards and self._check(self._wildcards[suffix], port, target):
+                    return True
+
+        return False
+
+    @staticmethod
+    def _merge(constraints: Optional[list[_Constraint]], constraint: _Constraint) -> Optional[list[_Constraint]]:
+        if constraints is None or constraint == (None, None):
+            return None
+        return constraints + [constraint]
+
+    @staticmethod
+    def _check(constraints: Optional[list[_Constraint]], port: Optional[int], target: bytes) -> bool:
+        if constraints is None:
+            return True
+
+        for rule_port, path_prefix in constraints:
+            if rule_port is not None and rule_port != port:
+                continue
+            if path_prefix is not None and not target.startswith(path_prefix):
+                continue
+            return True
+
+        return False
@@ -1,17 +1,230 @@
+import base64
+import time
+import uuid
+from functools import cached_property
+from typing import Annotated, Any, Optional
 
-from typing import Any, Optional
+from pydantic import BaseModel, BeforeValidator, Field, PlainSerializer
 
-from pydantic import BaseModel
+from agentwatch.hooks.http.body import DEFAULT_TRUNCATION_MARKER, decode_body
 
+DEFAULT_MAX_BODY_BYTES = 4 * 1024 * 1024
+# Event streams report the messages received so far at most this often, so long-lived streams don't wait until they close
+DEFAULT_STREAM_DELTA_INTERVAL_MS = 1000
 
-class HTTPRequestData(BaseModel):
-    method: str
-    url: str
+
+def _from_base64(value: Any) -> Any:
+    # Raw bytes travel as (url-safe, like pydantic's ser_json_bytes) base64 strings once serialized to JSON
+    if isinstance(value, str):
+        return base64.urlsafe_b64decode(value)
+    return value
+
+RawBytes = Annotated[
+    bytes,
+    BeforeValidator(_from_base64),
+    PlainSerializer(lambda value: base64.urlsafe_b64encode(value).decode("ascii"), return_type=str, when_used="json")
+]
+
+class HttpInterceptRule(BaseModel):
+    host: str
+    port: Optional[int] = None
+    path_prefix: Optional[str] = None
+
+class HttpSamplingRule(BaseModel):
+    """
+    Head-based sampling of the exchanges with `host` (same syntax as HttpInterceptRule.host).
+    `rate` is the fraction of exchanges that are captured, `max_per_second` caps the captured
+    exchanges with a token bucket of `burst` tokens (defaults to max_per_second).
+    """
+    host: str
+    rate: float = Field(default=1.0, ge=0, le=1)
+    max_per_second: Optional[float] = Field(default=None, gt=0)
+    burst: Optional[int] = Field(default=None, gt=0)
+
+class HttpCapturePolicy(BaseModel):
+    """
+    Limits how much of every request/response body is captured.
+    Bodies larger than `max_body_bytes` keep their head and tail (`tail_ratio` of the budget)
+    with a truncation marker in between. `None` captures bodies in full.
+    """
+    max_body_bytes: Optional[int] = Field(default=DEFAULT_MAX_BODY_BYTES, gt=0)
+    tail_ratio: float = Field(default=0.25, ge=0, le=1)
+    truncation_marker: str = DEFAULT_TRUNCATION_MARKER
+
+    @property
+    def head_bytes(self) -> Optional[int]:
+        if self.max_body_bytes is None:
+            return None
+        return self.max_body_bytes - self.tail_bytes
+
+    @property
+    def tail_bytes(self) -> int:
+        if self.max_body_bytes is None:
+            return 0
+        return int(self.max_body_bytes * self.tail_ratio)
+
+class ExchangeTimings(BaseModel):
+    """
+    Monotonic timestamps (seconds, time.monotonic() of the intercepting process) of a single exchange
+    """
+    request_start: float
+    headers_received: Optional[float] = None
+    first_byte: Optional[float] = None
+    last_byte: Optional[float] = None
+
+    @property
+    def latency_ms(self) -> Optional[float]:
+        if self.last_byte is None:
+            return None
+        return (self.last_byte - self.request_start) * 1000
+
+    @property
+    def time_to_first_byte_ms(self) -> Optional[float]:
+        if self.first_byte is None:
+            return None
+        return (self.first_byte - self.request_start) * 1000
+
+class ConnectionInfo(BaseModel):
+    """
+    How the connection of a single exchange was obtained, from httpcore's `trace` extension.
+    `phases_ms` maps phase names (i.e. "connection.connect_tcp", which includes DNS resolution,
+    "connection.start_tls", "http11.send_request_headers") to their duration.
+    """
+    reused: bool = True
+    phases_ms: dict[str, float] = {}
+
+class PhaseStats(BaseModel):
+    count: int = 0
+    total_ms: float = 0
+    max_ms: float = 0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0
+
+    def add(self, duration_ms: float) -> None:
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def merge(self, other: "PhaseStats") -> None:
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+class HostConnectionStats(BaseModel):
+    """
+    Per-host aggregate of ConnectionInfo. A high `new_connections` ratio together with
+    a significant "connection.start_tls" time usually means a new client is created per call.
+    """
+    host: str
+    requests: int = 0
+    new_connections: int = 0
+    reused_connections: int = 0
+    phases: dict[str, PhaseStats] = {}
+
+    @property
+    def reuse_ratio(self) -> float:
+        return self.reused_connections / self.requests if self.requests else 0
+
+    def add(self, connection: ConnectionInfo) -> None:
+        self.requests += 1
+        if connection.reused:
+            self.reused_connections += 1
+        else:
+            self.new_connections += 1
+
+        for phase, duration_ms in connection.phases_ms.items():
+            self.phases.setdefault(phase, PhaseStats()).add(duration_ms)
+
+    def merge(self, other: "HostConnectionStats") -> None:
+        self.requests += other.requests
+        self.new_connections += other.new_connections
+        self.reused_connections += other.reused_connections
+        for phase, phase_stats in other.phases.items():
+            self.phases.setdefault(phase, PhaseStats()).merge(phase_stats)
+
+class HostTrafficStats(BaseModel):
+    """
+    Lightweight per-host counters of every intercepted exchange, captured or sampled out
+    """
+    host: str
+    requests: int = 0
+    sampled: int = 0
+    sampled_out: int = 0
+    rate_limited: int = 0
+    latency: PhaseStats = Field(default_factory=PhaseStats)
+
+    def merge(self, other: "HostTrafficStats") -> None:
+        self.requests += other.requests
+        self.sampled += other.sampled
+        self.sampled_out += other.sampled_out
+        self.rate_limited += other.rate_limited
+        self.latency.merge(other.latency)
+
+class HttpExchange(BaseModel):
+    """
+    Correlates an intercepted request with its response and tracks the exchange's timings
+    """
+    exchange_id: str = Field(default_factory=lambda: uuid.uuid4().hex)
+    timings: ExchangeTimings = Field(default_factory=lambda: ExchangeTimings(request_start=time.monotonic()))
+    request_bytes: int = 0
+    connection: Optional[ConnectionInfo] = None
+    sampled: bool = True
+
+    def mark_headers_received(self) -> None:
+        self.timings.headers_received = time.monotonic()
+
+    def mark_first_byte(self) -> None:
+        if self.timings.first_byte is None:
+            self.timings.first_byte = time.monotonic()
+
+    def mark_last_byte(self) -> None:
+        now = time.monotonic()
+        if self.timings.first_byte is None:
+            self.timings.first_byte = now
+        self.timings.last_byte = now
+
+class SSEFrame(BaseModel):
+    data: str
+    event: Optional[str] = None
+    id: Optional[str] = None
+
+class HTTPMessageData(BaseModel):
     headers: dict[str, str]
+    exchange_id: Optional[str] = None
     body: Optional[str] = None
+    content: Optional[RawBytes] = None
+    content_size: Optional[int] = None
+    truncated: bool = False
 
-class HTTPResponseData(BaseModel):
+    @cached_property
+    def text(self) -> Optional[str]:
+        """
+        The body as text. Raw captured content is only decoded (Content-Encoding, charset) on first access.
+        """
+        if self.body is not None:
+            return self.body
+        if self.content is None:
+            return None
+        return decode_body(self.content, self.headers)
+
+class HTTPRequestData(HTTPMessageData):
+    method: str
+    url: str
+
+class HTTPResponseData(HTTPMessageData):
     status_code: int
-    headers: dict[str, str]
-    body: Optional[str] = None
     request: dict[str, Any] = {}
+    timings: Optional[ExchangeTimings] = None
+    request_bytes: Optional[int] = None
+    connection: Optional[ConnectionInfo] = None
+    # The messages of an event stream that weren't reported in a delta, processed instead of the body when set
+    frames: Optional[list[SSEFrame]] = None
+
+class HTTPResponseDeltaData(BaseModel):
+    status_code: int
+    headers: dict[str, str]
+    exchange_id: Optional[str] = None
+    frames: list[SSEFrame]
+    offset: int = 0
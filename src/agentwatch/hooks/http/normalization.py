@@ -0,0 +1,113 @@
+import time
+from typing import Final, Optional
+
+import httpcore
+from pydantic import BaseModel
+
+from agentwatch.enums import HookEventType, OverheadStage
+from agentwatch.hooks.http.body import BodyCapture
+from agentwatch.hooks.http.models import (HttpExchange, HTTPRequestData, HTTPResponseData, HTTPResponseDeltaData,
+                                         SSEFrame)
+from agentwatch.hooks.models import HookEvent
+from agentwatch.metrics import overhead_metrics
+
+# Builds hook event data straight from httpcore's raw headers and captured content, without
+# intermediate httpx objects. Bodies stay raw and are decoded lazily by the processor (see body.py).
+
+RawHeaders = list[tuple[bytes, bytes]]
+
+EVENT_STREAM_CONTENT_TYPE: Final[bytes] = b"text/event-stream"
+DEFAULT_PORTS: Final[dict[bytes, int]] = {b"http": 80, b"https": 443}
+
+
+def _decode_header_value(value: bytes) -> str:
+    try:
+        return value.decode("ascii")
+    except UnicodeDecodeError:
+        return value.decode("utf-8", errors="replace")
+
+def normalize_headers(raw_headers: RawHeaders) -> dict[str, str]:
+    """
+    Header names are lowercased and repeated headers are joined with ", " (same as dict(httpx.Headers))
+    """
+    headers: dict[str, str] = {}
+    for key, value in raw_headers:
+        name = key.decode("latin-1").lower()
+        if name in headers:
+            headers[name] = f"{headers[name]}, {_decode_header_value(value)}"
+        else:
+            headers[name] = _decode_header_value(value)
+    return headers
+
+def get_header(raw_headers: RawHeaders, name: bytes) -> Optional[bytes]:
+    """
+    Case-insensitive lookup of the first value of `name` (lowercase), without decoding any header
+    """
+    for key, value in raw_headers:
+        if len(key) == len(name) and key.lower() == name:
+            return value
+    return None
+
+def is_event_stream(raw_headers: RawHeaders) -> bool:
+    content_type = get_header(raw_headers, b"content-type")
+    return content_type is not None and EVENT_STREAM_CONTENT_TYPE in content_type.lower()
+
+def format_host(url: httpcore.URL) -> str:
+    """
+    The host, with the port only when it isn't the scheme's default one
+    """
+    host = url.host.decode("ascii")
+    if url.port is not None and url.port != DEFAULT_PORTS.get(url.scheme):
+        host = f"{host}:{url.port}"
+    return host
+
+def format_url(url: httpcore.URL) -> str:
+    return f"{url.scheme.decode('ascii')}://{format_host(url)}{url.target.decode('ascii')}"
+
+def request_data(request: httpcore.Request, capture: BodyCapture, exchange: Optional[HttpExchange] = None) -> HTTPRequestData:
+    return HTTPRequestData(
+        method=request.method.decode("ascii"),
+        url=format_url(request.url),
+        headers=normalize_headers(request.headers),
+        exchange_id=exchange.exchange_id if exchange else None,
+        content=capture.getvalue(),
+        content_size=capture.size,
+        truncated=capture.truncated
+    )
+
+def response_data(response: httpcore.Response,
+                  capture: BodyCapture,
+                  exchange: Optional[HttpExchange] = None,
+                  frames: Optional[list[SSEFrame]] = None,
+                  keep_content: bool = True) -> HTTPResponseData:
+    return HTTPResponseData(
+        status_code=response.status,
+        headers=normalize_headers(response.headers),
+        exchange_id=exchange.exchange_id if exchange else None,
+        timings=exchange.timings if exchange else None,
+        request_bytes=exchange.request_bytes if exchange else None,
+        connection=exchange.connection if exchange else None,
+        # Deltas that reported part of a stream make its frames stand in for the body
+        content=capture.getvalue() if keep_content else None,
+        content_size=capture.size,
+        truncated=capture.truncated,
+        frames=frames
+    )
+
+def response_delta_data(response: httpcore.Response,
+                        frames: list[SSEFrame],
+                        offset: int,
+                        exchange: Optional[HttpExchange] = None) -> HTTPResponseDeltaData:
+    return HTTPResponseDeltaData(
+        status_code=response.status,
+        headers=normalize_headers(response.headers),
+        exchange_id=exchange.exchange_id if exchange else None,
+        frames=frames,
+        offset=offset
+    )
+
+def to_hook_event(event_type: HookEventType, data: BaseModel) -> HookEvent:
+    start = time.perf_counter_ns()
+    dumped = data.model_dump()
+    overhead_metrics.record(OverheadStage.MODEL_DUMP, start)
+    return HookEvent(event_type=event_type, data=dumped)
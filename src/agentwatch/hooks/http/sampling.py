@@ -0,0 +1,91 @@
+import random
+import threading
+import time
+from typing import Optional
+
+from agentwatch.enums import SamplingDecision
+from agentwatch.hooks.http.intercept_matcher import parent_domains, parse_host_pattern
+from agentwatch.hooks.http.models import HttpSamplingRule
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average, with bursts of up to `burst`
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None) -> None:
+        self._rate = rate
+        self._capacity = float(burst if burst is not None else max(1, int(rate)))
+        self._tokens = self._capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+            self._updated_at = now
+
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _CompiledRule:
+    def __init__(self, rule: HttpSamplingRule) -> None:
+        self.rate = rule.rate
+        self.bucket = TokenBucket(rule.max_per_second, rule.burst) if rule.max_per_second is not None else None
+
+
+class Sampler:
+    """
+    Head-based sampling of HTTP exchanges: the decision is taken once, when the request starts,
+    so a request is always captured together with its response or stream.
+
+    The most specific rule wins - an exact host, then the closest wildcard ("*.example.com"),
+    then "*". Hosts without any rule are always sampled. Every rule has its own token bucket.
+    """
+
+    def __init__(self, rules: list[HttpSamplingRule]) -> None:
+        self._rules = list(rules)
+        self._exact: dict[bytes, _CompiledRule] = {}
+        self._wildcards: dict[bytes, _CompiledRule] = {}
+        self._default: Optional[_CompiledRule] = None
+
+        for rule in self._rules:
+            key, wildcard = parse_host_pattern(rule.host)
+            if key is None:
+                self._default = _CompiledRule(rule)
+            elif wildcard:
+                self._wildcards[key] = _CompiledRule(rule)
+            else:
+                self._exact[key] = _CompiledRule(rule)
+
+    @property
+    def rules(self) -> list[HttpSamplingRule]:
+        return list(self._rules)
+
+    def sample(self, host: bytes) -> SamplingDecision:
+        rule = self._find_rule(host.lower())
+        if rule is None:
+            return SamplingDecision.SAMPLED
+
+        if rule.rate < 1 and random.random() >= rule.rate:
+            return SamplingDecision.SAMPLED_OUT
+
+        if rule.bucket is not None and not rule.bucket.try_acquire():
+            return SamplingDecision.RATE_LIMITED
+
+        return SamplingDecision.SAMPLED
+
+    def _find_rule(self, host: bytes) -> Optional[_CompiledRule]:
+        if (rule := self._exact.get(host)) is not None:
+            return rule
+
+        if self._wildcards:
+            for suffix in parent_domains(host):
+                if (rule := self._wildcards.get(suffix)) is not None:
+                    return rule
+
+        return self._default
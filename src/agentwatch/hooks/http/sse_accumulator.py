@@ -0,0 +1,139 @@
+import time
+from typing import Optional
+
+from agentwatch.hooks.http.models import SSEFrame
+
+
+def parse_frames(content: str) -> list[SSEFrame]:
+    """
+    Split a complete text/event-stream body into its frames
+    """
+    frames: list[SSEFrame] = []
+    for raw_frame in content.replace("\r\n", "\n").split("\n\n"):
+        if raw_frame.strip() and (frame := _parse_lines(raw_frame.splitlines())) is not None:
+            frames.append(frame)
+    return frames
+
+def _parse_lines(lines: list[str]) -> Optional[SSEFrame]:
+    event: Optional[str] = None
+    event_id: Optional[str] = None
+    data: list[str] = []
+
+    for line in lines:
+        if not line or line.startswith(":"):
+            continue
+
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+
+        match field:
+            case "data":
+                data.append(value)
+            case "event":
+                event = value
+            case "id":
+                event_id = value
+
+    if not data and event is None:
+        return None
+
+    return SSEFrame(event=event, id=event_id, data="\n".join(data))
+
+class SSEAccumulator:
+    """
+    Incrementally parses a text/event-stream body as bytes arrive.
+
+    Every chunk is split into complete SSE frames as soon as it arrives. Frames are additionally collected
+    into a "delta" which can be drained periodically - either every `delta_interval_ms` milliseconds or
+    every `delta_bytes` bytes. When neither threshold is set, no deltas are produced.
+    """
+
+    def __init__(self, delta_interval_ms: Optional[float] = None, delta_bytes: Optional[int] = None) -> None:
+        self._delta_interval = delta_interval_ms / 1000 if delta_interval_ms is not None else None
+        self._delta_bytes = delta_bytes
+        self._collect_deltas = delta_interval_ms is not None or delta_bytes is not None
+
+        self._pending = bytearray()
+        self._frames_count = 0
+        self._size = 0
+
+        self._delta_frames: list[SSEFrame] = []
+        self._delta_size = 0
+        self._last_delta = time.monotonic()
+
+    @property
+    def frames_count(self) -> int:
+        return self._frames_count
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def feed(self, chunk: bytes) -> list[SSEFrame]:
+        """
+        Consume a chunk and return the frames completed by it
+        """
+        self._size += len(chunk)
+        self._delta_size += len(chunk)
+        self._pending += chunk
+
+        frames: list[SSEFrame] = []
+        while (boundary := self._find_boundary()) is not None:
+            end, separator_length = boundary
+            raw_frame = bytes(self._pending[:end])
+            del self._pending[:end + separator_length]
+
+            if (frame := self._parse_frame(raw_frame)) is not None:
+                frames.append(frame)
+
+        self._frames_count += len(frames)
+        if self._collect_deltas:
+            self._delta_frames.extend(frames)
+        return frames
+
+    def finish(self) -> list[SSEFrame]:
+        """
+        Flush a trailing frame which wasn't terminated by an empty line
+        """
+        frames: list[SSEFrame] = []
+        if self._pending.strip():
+            if (frame := self._parse_frame(bytes(self._pending))) is not None:
+                frames.append(frame)
+
+        self._pending.clear()
+        self._frames_count += len(frames)
+        if self._collect_deltas:
+            self._delta_frames.extend(frames)
+        return frames
+
+    def should_emit_delta(self) -> bool:
+        if not self._delta_frames:
+            return False
+
+        if self._delta_bytes is not None and self._delta_size >= self._delta_bytes:
+            return True
+
+        if self._delta_interval is not None and time.monotonic() - self._last_delta >= self._delta_interval:
+            return True
+
+        return False
+
+    def take_delta(self) -> list[SSEFrame]:
+        """
+        Return the frames collected since the last delta and reset the delta thresholds
+        """
+        frames = self._delta_frames
+        self._delta_frames = []
+        self._delta_size = 0
+        self._last_delta = time.monotonic()
+        return frames
+
+    def _find_boundary(self) -> Optional[tuple[int, int]]:
+        # Frames are separated by an empty line, which may use either LF or CRLF line endings
+        positions = [(self._pending.find(separator), len(separator)) for separator in (b"\n\n", b"\r\n\r\n")]
+        found = [(position, length) for position, length in positions if position != -1]
+        return min(found) if found else None
+
+    def _parse_frame(self, raw_frame: bytes) -> Optional[SSEFrame]:
+        return _parse_lines(raw_frame.decode("utf-8", errors="replace").splitlines())
@@ -0,0 +1,78 @@
+from collections.abc import AsyncIterator, Iterator
+from typing import Callable, Optional
+
+import httpcore
+
+from agentwatch.hooks.http.models import HttpExchange
+
+
+class TimedSyncStream:
+    """
+    A pass-through wrapper around a synchronous httpcore response stream of a sampled-out exchange.
+    Nothing is recorded except the exchange's first and last byte, `on_complete` is called once the
+    stream is exhausted or closed.
+    """
+
+    def __init__(self,
+                 response: httpcore.Response,
+                 exchange: HttpExchange,
+                 on_complete: Callable[[HttpExchange], None]) -> None:
+        self._response = response
+        self._exchange = exchange
+        self._on_complete: Optional[Callable[[HttpExchange], None]] = on_complete
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._response.iter_stream():
+            self._exchange.mark_first_byte()
+            yield chunk
+
+        self._complete()
+
+    def close(self) -> None:
+        try:
+            self._response.close()
+        finally:
+            self._complete()
+
+    def _complete(self) -> None:
+        if self._on_complete is None:
+            return
+        on_complete, self._on_complete = self._on_complete, None
+
+        self._exchange.mark_last_byte()
+        on_complete(self._exchange)
+
+
+class TimedAsyncStream:
+    """
+    Same as TimedSyncStream for asynchronous httpcore response streams
+    """
+
+    def __init__(self,
+                 response: httpcore.Response,
+                 exchange: HttpExchange,
+                 on_complete: Callable[[HttpExchange], None]) -> None:
+        self._response = response
+        self._exchange = exchange
+        self._on_complete: Optional[Callable[[HttpExchange], None]] = on_complete
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._response.aiter_stream():
+            self._exchange.mark_first_byte()
+            yield chunk
+
+        self._complete()
+
+    async def aclose(self) -> None:
+        try:
+            await self._response.aclose()
+        finally:
+            self._complete()
+
+    def _complete(self) -> None:
+        if self._on_complete is None:
+            return
+        on_complete, self._on_complete = self._on_complete, None
+
+        self._exchange.mark_last_byte()
+        on_complete(self._exchange)
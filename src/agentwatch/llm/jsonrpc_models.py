@@ -42,6 +42,9 @@ class JSONRPCRequest(GraphExtractor):
     jsonrpc: str
     id: int | str 
 
+    def request_context(self) -> Optional[BaseModel]:
+        return self
+
     def extract_graph_structure(self, reqres: HTTPRequestData | HTTPResponseData, **kwargs: Any) -> GraphStructure:
         if self.method == MCPMethodType.TOOL_CALL:
             return self._extract_tool_call_graph_structure(reqres)
@@ -98,6 +101,10 @@ class JSONRPCResponse(GraphExtractor):
     result: ToolCallResult | ToolListResult
     request: Optional[JSONRPCRequest] = None
 
+    def attach_request(self, request: Any) -> None:
+        if isinstance(request, JSONRPCRequest):
+            self.request = request
+
     def extract_graph_structure(self, reqres: HTTPRequestData | HTTPResponseData, **kwargs: Any) -> GraphStructure:
         if isinstance(self.result, ToolCallResult):
             if self.result.isError:
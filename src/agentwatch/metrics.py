@@ -0,0 +1,75 @@
+import threading
+import time
+from typing import Final
+
+from agentwatch.enums import OverheadStage
+from agentwatch.models import HistogramSnapshot
+
+DEFAULT_BUCKET_BOUNDS_US: Final[tuple[float, ...]] = (
+    1, 2, 5, 10, 25, 50, 100, 250, 500, 1_000, 2_500, 5_000, 10_000, 25_000, 100_000
+)
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram of durations. Recording is a bucket lookup and a few
+    additions under a lock, cheap enough to stay enabled on the hook path.
+    """
+
+    def __init__(self, bounds_us: tuple[float, ...] = DEFAULT_BUCKET_BOUNDS_US) -> None:
+        self._bounds_ns = [int(bound * 1000) for bound in bounds_us]
+        self._bounds_us = list(bounds_us)
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(bounds_us) + 1)
+        self._count = 0
+        self._total_ns = 0
+        self._max_ns = 0
+
+    def record_ns(self, duration_ns: int) -> None:
+        index = 0
+        bounds = self._bounds_ns
+        while index < len(bounds) and duration_ns > bounds[index]:
+            index += 1
+
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._total_ns += duration_ns
+            if duration_ns > self._max_ns:
+                self._max_ns = duration_ns
+
+    def snapshot(self) -> HistogramSnapshot:
+        with self._lock:
+            return HistogramSnapshot(
+                bounds_us=self._bounds_us,
+                counts=list(self._counts),
+                count=self._count,
+                total_us=self._total_ns / 1000,
+                max_us=self._max_ns / 1000
+            )
+
+
+class OverheadMetrics:
+    """
+    Per-stage histograms of the time agentwatch spends on its own work.
+
+    Usage:
+        start = time.perf_counter_ns()
+        ...
+        metrics.record(OverheadStage.NORMALIZE, start)
+    """
+
+    def __init__(self) -> None:
+        self._histograms = {stage: Histogram() for stage in OverheadStage}
+
+    def record(self, stage: OverheadStage, start_ns: int) -> None:
+        self._histograms[stage].record_ns(time.perf_counter_ns() - start_ns)
+
+    def snapshot(self) -> dict[str, HistogramSnapshot]:
+        """Stages without samples are left out"""
+        snapshots = {stage.value: histogram.snapshot() for stage, histogram in self._histograms.items()}
+        return {stage: snapshot for stage, snapshot in snapshots.items() if snapshot.count}
+
+
+# Shared by the hooks and the client of this process
+overhead_metrics = OverheadMetrics()
@@ -2,7 +2,7 @@ import time
 import uuid
 from typing import Any, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 from agentwatch.enums import CommandAction
 
@@ -16,11 +16,16 @@ class RemoveNoneBaseModel(BaseModel):
 
 class Command(RemoveNoneBaseModel):
     """Command class for IPC communication"""
+    # Events may carry raw captured bodies
+    model_config = ConfigDict(ser_json_bytes="base64")
+
     action: CommandAction
     params: dict[str, Any] = Field(default_factory=dict)
     callback_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     execution_id: str
     timestamp: float = Field(default_factory=time.time)
+    # Events are numbered by the client and acknowledged cumulatively (see EventAck)
+    seq: Optional[int] = None
 
     def to_dict(self) -> dict[str, Any]:
         return self.model_dump()
@@ -37,6 +42,18 @@ class Command(RemoveNoneBaseModel):
         return f"Command({self.action}, params={self.params}, callback_id={self.callback_id})"
 
 
+class EventAck(BaseModel):
+    """
+    Cumulative acknowledgement of the events processed by the collector, sent periodically
+    instead of a response per event. `lost` counts the sequence numbers that never arrived,
+    `dropped` the events that arrived but failed to decode or process.
+    """
+    seq: int = 0
+    processed: int = 0
+    dropped: int = 0
+    lost: int = 0
+
+
 class CommandResponse(RemoveNoneBaseModel):
     """Response class for IPC communication"""
     success: bool
@@ -44,6 +61,7 @@ class CommandResponse(RemoveNoneBaseModel):
     error: Optional[str] = None
     callback_id: Optional[str] = None
     timestamp: float = Field(default_factory=time.time)
+    ack: Optional[EventAck] = None
 
     def to_dict(self) -> dict[str, Any]:
         return self.model_dump()
@@ -54,4 +72,127 @@ class CommandResponse(RemoveNoneBaseModel):
 
     def __str__(self) -> str:
         return f"Response({self.model_dump()})"
-    
\ No newline at end of file
+
+
+class BufferStats(BaseModel):
+    """Counters of the client side event buffer"""
+    size: int
+    max_size: int
+    enqueued: int
+    flushed: int
+    dropped: int
+    flush_errors: int
+
+
+class RingStats(BaseModel):
+    """Counters of the shared memory ring transport, pipe_frames went through the pipe instead"""
+    capacity: int
+    used: int
+    ring_frames: int
+    ring_full: int
+    pipe_frames: int
+
+
+class DeliveryStats(BaseModel):
+    """
+    Event delivery to the collector as seen by the client. `lag` is the number of events sent
+    but not acknowledged yet, `buffer_dropped` the ones that never left the client's buffer.
+    """
+    sent: int
+    acked: int
+    lag: int
+    processed: int
+    buffer_dropped: int
+    collector_dropped: int
+    lost: int
+    last_ack: Optional[float] = None
+
+
+class DrainStats(BaseModel):
+    """
+    The collector's shutdown. `flushed` events were processed while draining, `abandoned` ones were
+    still queued (waiting for room in a full queue, or not even read) when the deadline expired.
+    """
+    flushed: int = 0
+    abandoned: int = 0
+    timed_out: bool = False
+    duration_ms: float = 0
+
+
+class StartupStats(BaseModel):
+    """
+    How long the client took to start, from its creation (on `import agentwatch`). `hooks_ms` is what the
+    importing code waits for, `ready_ms` when the collector was ready to take events (None until then)
+    and `buffered` how many events were held in memory meanwhile.
+    """
+    hooks_ms: float
+    ready_ms: Optional[float] = None
+    buffered: int = 0
+    timed_out: bool = False
+
+
+class HistogramSnapshot(BaseModel):
+    """
+    Fixed-bucket latency histogram. counts[i] is the number of samples <= bounds_us[i],
+    the last count holds the samples above the highest bound.
+    """
+    bounds_us: list[float]
+    counts: list[int]
+    count: int = 0
+    total_us: float = 0
+    max_us: float = 0
+
+    @property
+    def avg_us(self) -> float:
+        return self.total_us / self.count if self.count else 0
+
+    def percentile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-th (0-100) percentile, `max_us` for the overflow bucket
+        """
+        if self.count == 0:
+            return 0
+
+        rank = q / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.bounds_us, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_us)
+        return self.max_us
+
+
+class ShardStats(BaseModel):
+    """
+    An event worker of the collector. `depth` is the number of events waiting in its queue (up to
+    `max_size`, 0 is unbounded), `oldest_age_ms` how long the oldest of them has been waiting and
+    `rate` the events processed per second, measured between stats requests, in `batches`.
+    Once full, events are `shed` or the collector stops reading until there's room, `blocked` times.
+    """
+    shard: int
+    depth: int
+    max_depth: int
+    processed: int
+    batches: int = 0
+    max_size: int = 0
+    rate: float = 0
+    oldest_age_ms: float = 0
+    shed: int = 0
+    blocked: int = 0
+
+
+class CollectorStats(BaseModel):
+    """The collector's answer to a stats command"""
+    overhead: dict[str, HistogramSnapshot]
+    shards: list[ShardStats] = Field(default_factory=list)
+
+
+class AgentwatchStats(BaseModel):
+    """Self-overhead of agentwatch per stage, on the client and (if reachable) the collector side"""
+    overhead: dict[str, HistogramSnapshot]
+    buffer: BufferStats
+    collector: dict[str, HistogramSnapshot] = Field(default_factory=dict)
+    ring: Optional[RingStats] = None
+    delivery: Optional[DeliveryStats] = None
+    startup: Optional[StartupStats] = None
+    shards: list[ShardStats] = Field(default_factory=list)
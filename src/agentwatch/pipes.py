@@ -1,71 +1,364 @@
 import asyncio
 import logging
+import os
+import pickle
+import socket
+import struct
 import time
 from multiprocessing.connection import Connection
-from typing import Optional
+from typing import Any, Final, Optional, Sequence
 
 from pydantic import BaseModel, ValidationError
 
 from agentwatch.models import CommandResponse
+from agentwatch.shm_ring import ShmRing
 
 logger = logging.getLogger(__name__)
 
+FRAME_VERSION: Final[int] = 1
+# version, number of payloads
+FRAME_HEADER: Final[struct.Struct] = struct.Struct("!BI")
+
+# Length prefix written by Connection.send_bytes, -1 announces a 64 bit length
+_MESSAGE_SIZE: Final[struct.Struct] = struct.Struct("!i")
+_LARGE_MESSAGE_SIZE: Final[struct.Struct] = struct.Struct("!Q")
+_RECV_CHUNK_SIZE: Final[int] = 256 * 1024
+
+
+class FrameError(ValueError):
+    pass
+
+
+class FrameReader:
+    """
+    Reads the messages Connection.send_bytes writes to a socket connection (from Pipe() or a Listener)
+    without ever blocking on one that's still being written: the available bytes are buffered until the
+    message is complete. The reader must be the only one reading the connection.
+    """
+
+    def __init__(self, connection: Connection) -> None:
+        self._connection = connection
+        # Our own descriptor, so MSG_DONTWAIT can be used without making the connection non-blocking
+        self._socket = socket.socket(fileno=os.dup(connection.fileno()))
+        self._buffer = bytearray()
+        self._start = 0
+        self._eof = False
+
+    def fileno(self) -> int:
+        return self._connection.fileno()
+
+    def poll(self, timeout: float = 0) -> bool:
+        """Whether a message is complete or more bytes can be read, waiting up to `timeout` seconds"""
+        return self._next_message() is not None or self._connection.poll(timeout)
+
+    def recv_bytes(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """
+        Return the next message, waiting up to `timeout` seconds (forever if None) for it to be complete.
+
+        Returns:
+            None if the message isn't complete in time
+
+        Raises:
+            EOFError: When the writer closed the connection
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            message = self._recv_available()
+            if message is not None:
+                return message
+
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                return None
+            self._connection.poll(remaining)
+
+    def close(self) -> None:
+        self._socket.close()
+
+    def _recv_available(self) -> Optional[bytes]:
+        while True:
+            bounds = self._next_message()
+            if bounds is not None:
+                start, end = bounds
+                self._start = end
+                return bytes(self._buffer[start:end])
+            if self._eof:
+                raise EOFError
+
+            # Drop the messages already handed out before buffering more
+            del self._buffer[:self._start]
+            self._start = 0
+            try:
+                chunk = self._socket.recv(_RECV_CHUNK_SIZE, socket.MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                return None
+            if not chunk:
+                self._eof = True
+            self._buffer += chunk
+
+    def _next_message(self) -> Optional[tuple[int, int]]:
+        """Start and end offsets of the next message in the buffer, if it's complete"""
+        available = len(self._buffer) - self._start
+        if available < _MESSAGE_SIZE.size:
+            return None
+
+        (size,) = _MESSAGE_SIZE.unpack_from(self._buffer, self._start)
+        header = _MESSAGE_SIZE.size
+        if size == -1:
+            if available < header + _LARGE_MESSAGE_SIZE.size:
+                return None
+            (size,) = _LARGE_MESSAGE_SIZE.unpack_from(self._buffer, self._start + header)
+            header += _LARGE_MESSAGE_SIZE.size
+
+        if available < header + size:
+            return None
+        return self._start + header, self._start + header + size
+
+
 class Pipes:
-    """Manages pipes for IPC"""
+    """
+    Manages pipes for IPC.
+
+    Commands (client -> library process) travel as binary frames, each holding a batch of payloads
+    as pickled python dicts behind a small header. Connection.send_bytes length-prefixes every frame,
+    so a batch costs a single write, and the reader (see FrameReader) only hands it out once complete. The pipe connects the client either to the
+    process it spawned, or to the user's shared collector over a Unix socket that only this user
+    can reach and that authenticates (see collector.py) before a single frame is unpickled.
+    Responses (library process -> client) are single JSON messages.
+
+    With a ShmRing, frames go through shared memory and the pipe only carries empty wakeup
+    messages (when the reader is about to sleep) and the frames that didn't fit in the ring.
+    Once a frame went through the pipe, the writer keeps using the pipe until the reader
+    consumed it, and the reader drains the ring before handling a pipe frame, so frames
+    are always read in the order they were written.
+    """
+    # The tasks waiting on a fd, per loop and direction. A loop keeps a single reader/writer callback per
+    # fd, so the first waiter registers one that wakes up all of them (i.e. a response and an ack written
+    # to the same pipe). Registering one per waiter would replace the previous one, which never woke up.
+    _fd_waiters: dict[tuple[asyncio.AbstractEventLoop, int, bool], set[asyncio.Future[None]]] = {}
+
     def __init__(self) -> None:
         pass
 
+    @classmethod
+    def encode_frame(cls, payloads: Sequence[BaseModel]) -> bytes:
+        body = pickle.dumps([payload.model_dump() for payload in payloads], protocol=pickle.HIGHEST_PROTOCOL)
+        return FRAME_HEADER.pack(FRAME_VERSION, len(payloads)) + body
+
+    @classmethod
+    def decode_frame(cls, frame: bytes) -> list[dict[str, Any]]:
+        if len(frame) < FRAME_HEADER.size:
+            raise FrameError(f"Frame too short ({len(frame)} bytes)")
+
+        version, count = FRAME_HEADER.unpack_from(frame)
+        if version != FRAME_VERSION:
+            raise FrameError(f"Unsupported frame version {version}")
+
+        try:
+            payloads = pickle.loads(memoryview(frame)[FRAME_HEADER.size:])
+        except Exception as e:
+            raise FrameError(f"Invalid frame body: {e}") from e
+
+        if not isinstance(payloads, list) or len(payloads) != count:
+            raise FrameError("Frame doesn't match its header")
+        return payloads
+
+    @classmethod
+    def read_available(cls, reader: FrameReader, ring: Optional[ShmRing] = None) -> list[dict[str, Any]]:
+        """
+        Return the payloads of every complete frame that's available right now, without waiting
+        (a frame that's still being written stays buffered in the reader until the next call).
+        This is used by the library process once the loop reports the pipe readable.
+
+        Raises:
+            EOFError: When the writer closed the pipe
+        """
+        payloads: list[dict[str, Any]] = []
+        while True:
+            try:
+                frames = cls.read_frames_sync(reader, ring, timeout=0)
+            except FrameError as e:
+                logger.error(f"Error decoding frame: {e}")
+                continue
+            except EOFError:
+                # Hand out what was read before the writer closed, the next call raises
+                if payloads:
+                    return payloads
+                raise
+
+            payloads.extend(frames)
+            if not frames and not reader.poll(0):
+                return payloads
+
+    @classmethod
+    async def wait_readable(cls, reader_fd: Connection, timeout: Optional[float] = None) -> bool:
+        """
+        Wait on the event loop (no executor thread) until the pipe has data.
+
+        Returns:
+            False if the timeout expired first
+        """
+        if reader_fd.poll(0):
+            return True
+        return await cls._wait_fd(reader_fd.fileno(), readable=True, timeout=timeout)
+
+    @classmethod
+    async def _wait_fd(cls, fd: int, readable: bool, timeout: Optional[float] = None) -> bool:
+        loop = asyncio.get_running_loop()
+        ready: asyncio.Future[None] = loop.create_future()
+        key = (loop, fd, readable)
+
+        waiters = cls._fd_waiters.get(key)
+        if waiters is None:
+            waiters = cls._fd_waiters[key] = set()
+
+            def on_ready() -> None:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
+
+            if readable:
+                loop.add_reader(fd, on_ready)
+            else:
+                loop.add_writer(fd, on_ready)
+
+        waiters.add(ready)
+        try:
+            await asyncio.wait({ready}, timeout=timeout)
+            return ready.done()
+        finally:
+            waiters.discard(ready)
+            if not waiters:
+                del cls._fd_waiters[key]
+                if readable:
+                    loop.remove_reader(fd)
+                else:
+                    loop.remove_writer(fd)
+
+    @classmethod
+    def read_frames_sync(cls,
+                         reader: FrameReader,
+                         ring: Optional[ShmRing] = None,
+                         timeout: Optional[float] = None) -> list[dict[str, Any]]:
+        """
+        Wait (up to `timeout` seconds, if given) for frames and return their payloads.
+        This is used by the library process, the caller must be the only reader of both the pipe and the ring.
+
+        Raises:
+            EOFError: When the writer closed the pipe
+        """
+        if ring is None:
+            frame = reader.recv_bytes(timeout)
+            return cls.decode_frame(frame) if frame is not None else []
+
+        # Announce we're about to sleep before the last look at the ring, the writer checks it after publishing
+        ring.consumer_waiting = True
+        payloads = cls._read_ring(ring)
+        if payloads:
+            ring.consumer_waiting = False
+            return payloads
+
+        frame = reader.recv_bytes(timeout)
+        if frame is None:
+            return []
+        ring.consumer_waiting = False
+
+        # Whatever is in the ring was written before this frame
+        payloads = cls._read_ring(ring)
+        if frame:
+            payloads.extend(cls.decode_frame(frame))
+            ring.pipe_frames_consumed += 1
+        return payloads
+
+    @classmethod
+    def _read_ring(cls, ring: ShmRing) -> list[dict[str, Any]]:
+        payloads: list[dict[str, Any]] = []
+        for frame in ring.read_all():
+            try:
+                payloads.extend(cls.decode_frame(frame))
+            except FrameError as e:
+                # The record is already consumed, don't lose the ones after it
+                logger.error(f"Error decoding frame: {e}")
+        return payloads
+
+    @classmethod
+    def write_frame_sync(cls,
+                         writer_fd: Connection,
+                         payloads: Sequence[BaseModel],
+                         ring: Optional[ShmRing] = None) -> None:
+        """
+        Write a batch of commands to the command pipe (or ring) as a single frame synchronously.
+        This is used by the client process, the caller must be the only writer of both the pipe and the ring.
+
+        Raises:
+            OSError: When the frame couldn't be written, none of its payloads were sent then
+        """
+        if not payloads:
+            return
+
+        frame = cls.encode_frame(payloads)
+        if ring is None:
+            writer_fd.send_bytes(frame)
+            return
+
+        # Use the ring only when no pipe frame is pending, otherwise frames could be read out of order
+        if ring.pipe_frames_sent == ring.pipe_frames_consumed and ring.write(frame):
+            if ring.take_consumer_waiting():
+                try:
+                    writer_fd.send_bytes(b"")
+                except OSError as e:
+                    # The frame is in the ring already, the reader looks at it periodically anyway
+                    logger.warning(f"Error waking up the reader: {e}")
+            return
+
+        writer_fd.send_bytes(frame)
+        ring.pipe_frames_sent += 1
+
     @classmethod
     async def read_payload(cls, reader_fd: Connection) -> Optional[str]:
         """
         Read a payload from pipe asynchronously.
         This is used by the library process.
         """
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, reader_fd.recv)
+        await cls.wait_readable(reader_fd)
+        return reader_fd.recv()  # type: ignore[no-any-return]
 
     @classmethod
-    def write_payload_sync(cls, writer_fd: Connection, payload: BaseModel) -> None:
+    def write_payload_sync(cls, writer_fd: Connection, payload: BaseModel, ring: Optional[ShmRing] = None) -> None:
         """
-        Write a command to the command pipe synchronously.
+        Write a command to the command pipe synchronously (as a frame of its own).
         This is used by the client process.
         """
-        try:
-            writer_fd.send(payload.model_dump_json())
-        except Exception as e:
-            logger.error(f"Error writing payload: {e}")
+        cls.write_frame_sync(writer_fd, [payload], ring)
 
     @classmethod
     async def write_payload(cls, writer_fd: Connection, payload: BaseModel) -> None:
         """
-        Write a command to the command pipe synchronously.
-        This is used by the client process.
+        Write a response to the pipe asynchronously, waiting on the event loop until it's writable.
+        This is used by the library process.
         """
         try:
-            loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, writer_fd.send, payload.model_dump_json())
+            await cls._wait_fd(writer_fd.fileno(), readable=False)
+            writer_fd.send(payload.model_dump_json())
         except Exception as e:
             logger.error(f"Error writing payload: {e}")
 
     @classmethod
-    def read_response(cls, reader_fd: Connection, timeout: float = 5.0) -> Optional[CommandResponse]:
+    def read_response(cls, reader_fd: Connection, timeout: Optional[float] = 5.0) -> Optional[CommandResponse]:
         """
-        Read a response from the response pipe synchronously with timeout.
+        Read a response from the response pipe synchronously, waiting up to `timeout` seconds (forever if None).
         This is used by the client process.
+
+        Raises:
+            TimeoutError: When no response arrived in time
+            EOFError: When the writer closed the pipe
         """
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            try:
-                data = reader_fd.recv()
-                return CommandResponse.model_validate_json(data)
-            except BlockingIOError:
-                # No data available yet
-                time.sleep(0.01)
-                continue
-            except ValidationError as e:
-                logger.error(f"Error decoding response: {e}")
-                return None
-            
-        # Timeout reached
-        raise TimeoutError(f"Timeout waiting for response")
+        if timeout is not None and not reader_fd.poll(timeout):
+            raise TimeoutError("Timeout waiting for response")
 
+        data = reader_fd.recv()
+        try:
+            return CommandResponse.model_validate_json(data)
+        except ValidationError as e:
+            logger.error(f"Error decoding response: {e}")
+            return None
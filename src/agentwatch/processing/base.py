@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import Executor
 from typing import Any, Optional
 
 from agentwatch.enums import HookEventType
@@ -6,8 +7,10 @@ from agentwatch.graph.graph import GraphStructure
 
 
 class BaseProcessor(ABC):
-    def __init__(self) -> None:
+    def __init__(self, executor: Optional[Executor] = None) -> None:
         self._supported_events: list[HookEventType] = []
+        # Optional pool for CPU bound work, processors that have none run it on the event loop
+        self._executor = executor
 
     @property
     def supported_events(self) -> list[HookEventType]:
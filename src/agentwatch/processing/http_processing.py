@@ -1,12 +1,16 @@
+import asyncio
 import logging
-from typing import Any, Optional
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Any, NamedTuple, Optional, Sequence
 
-from pydantic import ValidationError
+from pydantic import BaseModel, ValidationError
 
+from agentwatch.consts import DEFAULT_OFFLOAD_THRESHOLD
 from agentwatch.enums import HookEventType
-from agentwatch.graph.enums import HttpModel
-from agentwatch.graph.models import GraphExtractor
-from agentwatch.hooks.http.models import HTTPRequestData, HTTPResponseData
+from agentwatch.graph.enums import HttpModel, NodeType
+from agentwatch.graph.models import Edge, GraphExtractor, LatencyStats, Node
+from agentwatch.hooks.http.models import HTTPRequestData, HTTPResponseData, HTTPResponseDeltaData
 from agentwatch.llm.ollama_models import graph_extractor_fm
 from agentwatch.processing.base import BaseProcessor, GraphStructure
 from agentwatch.processing.normalizer.base import BaseHTTPContentNormalizer
@@ -15,50 +19,201 @@ from agentwatch.processing.normalizer.ndjson_normalizer import NdjsonContentNorm
 
 logger = logging.getLogger(__name__)
 
+# Stateless, shared by the processor and its process pool workers
+_CONTENT_NORMALIZERS: list[BaseHTTPContentNormalizer] = [
+    NdjsonContentNormalizer(),
+    EventStreamNormalizer(),
+]
+
+def split_messages(reqres: HTTPRequestData | HTTPResponseData) -> list[str]:
+    """
+    The messages of a request/response: the frames of an event stream, otherwise the normalized body
+    """
+    if isinstance(reqres, HTTPResponseData) and reqres.frames is not None:
+        return [frame.data for frame in reqres.frames if frame.data]
+
+    body: Optional[str] = reqres.text
+    if body is None or body == "":
+        return []
+
+    for normalizer in _CONTENT_NORMALIZERS:
+        if any(sct in reqres.headers.get("content-type", 'text/plain') for sct in normalizer.supported_content_types):
+            return normalizer.split(body)
+    return [body]
+
+class Extraction(NamedTuple):
+    structure: Optional[GraphStructure]
+    # What the response of the exchange needs of a request (see GraphExtractor.request_context)
+    request_context: list[BaseModel]
+
+def extract_structure(reqres: HTTPRequestData | HTTPResponseData,
+                      request_context: Sequence[BaseModel] = ()) -> Extraction:
+    """
+    Extract the graph structure of every message of a request/response with the first model that fits it.
+    CPU bound, runs in a process pool worker for large bodies (see HttpProcessor).
+    """
+    messages = split_messages(reqres)
+    if not messages:
+        return Extraction(None, [])
+
+    nodes: list[Node] = []
+    edges: list[Edge] = []
+    context: list[BaseModel] = []
+    found = False
+    for message in messages:
+        model = _parse_message(message)
+        if model is None:
+            continue
+
+        found = True
+        for request in request_context:
+            model.attach_request(request)
+        message_nodes, message_edges = model.extract_graph_structure(reqres=reqres)
+        logger.debug(f"Extracted nodes: {message_nodes}, edges: {message_edges}")
+        nodes.extend(message_nodes)
+        edges.extend(message_edges)
+        if (message_context := model.request_context()) is not None:
+            context.append(message_context)
+
+    if not found:
+        logger.warning(f"Did not find a suitable model for: {messages[0] if len(messages) == 1 else messages}")
+        return Extraction(None, [])
+    return Extraction((nodes, edges), context)
+
+def _parse_message(message: str) -> Optional[GraphExtractor]:
+    # TODO: Replace this brute force approach with something more targeted, i.e per-provider processor
+    for model in HttpModel:
+        try:
+            return graph_extractor_fm[model].model_validate_json(message)
+        except ValidationError:
+            continue
+    return None
+
+def body_size(reqres: HTTPRequestData | HTTPResponseData) -> int:
+    if isinstance(reqres, HTTPResponseData) and reqres.frames is not None:
+        return sum(len(frame.data) for frame in reqres.frames)
+    if reqres.content is not None:
+        return len(reqres.content)
+    return len(reqres.body or "")
+
+class _PendingExchange:
+    """
+    A request waiting for its response. Its body isn't kept, only its line and headers and the
+    context its parsed messages left for the response
+    """
+    def __init__(self, request: HTTPRequestData, context: list[BaseModel], peer: Optional[Node]) -> None:
+        self.request = request.model_dump(include={"method", "url", "headers", "exchange_id"})
+        self.context = context
+        self.peer = peer
+
 class HttpProcessor(BaseProcessor):
-    def __init__(self) -> None:
-        super().__init__()
+    # Requests whose response wasn't seen (yet), kept to pair them with their response
+    MAX_PENDING_EXCHANGES = 1024
+    PEER_NODE_TYPES = (NodeType.LLM, NodeType.MCP_SERVER)
+
+    def __init__(self, executor: Optional[Executor] = None, offload_threshold: int = DEFAULT_OFFLOAD_THRESHOLD) -> None:
+        """
+        Args:
+            executor: A process pool that parses bodies of at least `offload_threshold` bytes, so
+                      large message histories don't stall the collector's event loop
+        """
+        super().__init__(executor)
+        self._offload_threshold = offload_threshold
         self._supported_events = [
             HookEventType.HTTP_REQUEST,
-            HookEventType.HTTP_RESPONSE
+            HookEventType.HTTP_RESPONSE,
+            HookEventType.HTTP_RESPONSE_DELTA
         ]
 
-        self._content_normalizers: list[BaseHTTPContentNormalizer] = [
-            NdjsonContentNormalizer(),
-            EventStreamNormalizer(),
-        ]
+        self._pending_exchanges: OrderedDict[str, _PendingExchange] = OrderedDict()
 
     async def process(self, event_type: HookEventType, data: dict[str, Any]) -> Optional[GraphStructure]:
+        if event_type == HookEventType.HTTP_RESPONSE_DELTA:
+            return await self._handle_delta(HTTPResponseDeltaData.model_validate(data))
+
         model_mapping: dict[HookEventType, type[HTTPRequestData | HTTPResponseData]] = {
             HookEventType.HTTP_REQUEST: HTTPRequestData,
             HookEventType.HTTP_RESPONSE: HTTPResponseData
         }
 
         payload: HTTPRequestData | HTTPResponseData = model_mapping[event_type].model_validate(data)
-        return await self._handle_payload(payload)
+        if isinstance(payload, HTTPResponseData):
+            return await self._handle_response(payload)
+
+        structure, context = await self._handle_payload(payload)
+        if payload.exchange_id is not None:
+            self._track_request(payload, structure, context)
+        return structure
+
+    async def _handle_delta(self, delta: HTTPResponseDeltaData) -> Optional[GraphStructure]:
+        # The messages an event stream received so far, its response only carries the rest. The exchange
+        # stays pending until the response arrives, which pairs it and records its latency
+        pending = self._pending_exchanges.get(delta.exchange_id) if delta.exchange_id else None
+        stream = HTTPResponseData(status_code=delta.status_code,
+                                  headers=delta.headers,
+                                  exchange_id=delta.exchange_id,
+                                  request=pending.request if pending else {},
+                                  frames=delta.frames)
+
+        structure, _ = await self._handle_payload(stream, pending.context if pending else ())
+        if structure is not None and delta.exchange_id is not None:
+            for edge in structure[1]:
+                edge.exchange_id = delta.exchange_id
+        return structure
+
+    async def _handle_response(self, response: HTTPResponseData) -> Optional[GraphStructure]:
+        pending = self._pending_exchanges.pop(response.exchange_id, None) if response.exchange_id else None
+        if pending is not None:
+            response.request = pending.request
+
+        structure, _ = await self._handle_payload(response, pending.context if pending else ())
+        if response.exchange_id is None:
+            return structure
+
+        # Treat the exchange as a single unit - the edges and the peer (model/MCP server) carry its latency.
+        # A stream whose messages were all reported in deltas has none left, its peer still gets the latency
+        nodes, edges = structure if structure is not None else ([], [])
+        latency_ms = response.timings.latency_ms if response.timings else None
+        for edge in edges:
+            edge.exchange_id = response.exchange_id
+            edge.latency_ms = latency_ms
 
-    async def _handle_payload(self, reqres: HTTPRequestData | HTTPResponseData) -> Optional[GraphStructure]:
-        # TODO: Replace this brute force approach with something more targeted, i.e per-provider processor
-        models: list[type[GraphExtractor]] = [graph_extractor_fm[model] for model in HttpModel]
+        peer = self._find_peer(nodes) or (pending.peer if pending else None)
+        if latency_ms is not None and peer is not None:
+            latency = LatencyStats()
+            latency.add(latency_ms)
+            nodes = [node for node in nodes if node.node_id != peer.node_id]
+            nodes.append(peer.model_copy(update={"latency": latency}))
 
-        body: Optional[str] = reqres.body
+        if not nodes and not edges:
+            return None
+        return nodes, edges
 
-        if body is not None and body != "":
-            for normalizer in self._content_normalizers:
-                if any(sct in reqres.headers.get("content-type", 'text/plain') for sct in normalizer.supported_content_types):
-                    body = normalizer.normalize(body)
-                    break
+    def _track_request(self,
+                       request: HTTPRequestData,
+                       structure: Optional[GraphStructure],
+                       context: list[BaseModel]) -> None:
+        assert request.exchange_id is not None
+        peer = self._find_peer(structure[0]) if structure else None
+        self._pending_exchanges[request.exchange_id] = _PendingExchange(request, context, peer)
+        while len(self._pending_exchanges) > self.MAX_PENDING_EXCHANGES:
+            self._pending_exchanges.popitem(last=False)
 
-            for model_type in models:
-                try:
-                    req_model = model_type.model_validate_json(body)
-                    return self._parse_nodes_and_edges(req_model, reqres=reqres)
-                except ValidationError as e:
-                    continue
+    def _find_peer(self, nodes: list[Node]) -> Optional[Node]:
+        return next((node for node in nodes if node.node_type in self.PEER_NODE_TYPES), None)
 
-        logger.warning(f"Did not find a suitable model for: {body}")
+    async def _handle_payload(self,
+                              reqres: HTTPRequestData | HTTPResponseData,
+                              request_context: Sequence[BaseModel] = ()) -> Extraction:
+        if self._executor is None or body_size(reqres) < self._offload_threshold:
+            return extract_structure(reqres, request_context)
 
-        return None
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, extract_structure, reqres, request_context)
+        except Exception as e:
+            # i.e. a broken pool, the event is still worth processing
+            logger.warning(f"Couldn't offload payload parsing, parsing inline: {e!r}")
+            return extract_structure(reqres, request_context)
     
     def _parse_nodes_and_edges(self, payload: GraphExtractor, **kwargs: Any) -> Optional[GraphStructure]:
        nodes, edges = payload.extract_graph_structure(**kwargs)
@@ -14,3 +14,7 @@ class BaseHTTPContentNormalizer:
     def normalize(self, content: str) -> str:
         """Normalize the content"""
         ...
+
+    def split(self, content: str) -> list[str]:
+        """The (normalized) messages of the content, most content types hold a single one"""
+        return [self.normalize(content)]
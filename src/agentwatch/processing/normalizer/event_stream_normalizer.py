@@ -1,21 +1,19 @@
+from agentwatch.hooks.http.sse_accumulator import parse_frames
 from agentwatch.processing.normalizer.base import BaseHTTPContentNormalizer
 
 
 class EventStreamNormalizer(BaseHTTPContentNormalizer):
-    def __init__(self, event_data_tag: str = "data: ") -> None:
+    def __init__(self) -> None:
         super().__init__()
-        self._event_data_tag = event_data_tag
         self._supported_content_types = ["text/event-stream"]
 
     def normalize(self, content: str) -> str:
-        if self._event_data_tag not in content:
-            return content
-        
-        data_raw = str()
+        messages = self.split(content)
+        return messages[0] if messages else content
 
-        for line in content.splitlines():
-            if line.startswith(self._event_data_tag):
-                data_raw = line[len(self._event_data_tag):]
-                break
-        
-        return data_raw.strip()
\ No newline at end of file
+    def split(self, content: str) -> list[str]:
+        """
+        Every frame's data is a message of its own (i.e. the JSON-RPC results of an MCP SSE stream)
+        """
+        messages = [frame.data.strip() for frame in parse_frames(content) if frame.data.strip()]
+        return messages or [content]
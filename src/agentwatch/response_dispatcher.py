@@ -0,0 +1,101 @@
+import logging
+import threading
+from concurrent.futures import Future
+from multiprocessing.connection import Connection
+from typing import Callable, Optional
+
+from agentwatch.consts import RESPONSE_POLL_INTERVAL
+from agentwatch.models import CommandResponse, EventAck
+from agentwatch.pipes import Pipes
+
+logger = logging.getLogger(__name__)
+
+class ResponseDispatcher:
+    """
+    Owns the read side of the collector's pipe. A dedicated thread reads every response and
+    completes the future registered for its callback_id, so any number of threads (or event
+    loops, see asyncio.wrap_future) can wait for their own responses concurrently.
+    Event acknowledgements are handed to `on_ack`, responses nobody waits for are discarded.
+    """
+
+    def __init__(self,
+                 reader_fd: Connection,
+                 on_ack: Optional[Callable[[EventAck], None]] = None,
+                 name: str = "agentwatch-responses") -> None:
+        self._reader_fd = reader_fd
+        self._on_ack = on_ack
+        self._name = name
+
+        self._pending: dict[str, Future[CommandResponse]] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._read_loop, name=self._name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop reading (the reader notices within RESPONSE_POLL_INTERVAL) and fail the pending futures
+        """
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._fail_pending(ConnectionError("agentwatch response dispatcher stopped"))
+
+    def register(self, callback_id: str) -> Future[CommandResponse]:
+        """
+        Must be called before the command is written, otherwise the response may arrive first
+        """
+        future: Future[CommandResponse] = Future()
+        with self._lock:
+            if self._stopped.is_set():
+                raise RuntimeError("Response dispatcher is not running")
+            self._pending[callback_id] = future
+        return future
+
+    def discard(self, callback_id: str) -> None:
+        with self._lock:
+            self._pending.pop(callback_id, None)
+
+    def dispatch(self, response: CommandResponse) -> None:
+        if response.ack is not None:
+            if self._on_ack is not None:
+                self._on_ack(response.ack)
+            return
+
+        with self._lock:
+            future = self._pending.pop(response.callback_id, None) if response.callback_id else None
+
+        if future is None:
+            logger.debug(f"Discarding response with id {response.callback_id}")
+        elif not future.done():
+            future.set_result(response)
+
+    def _read_loop(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                response = Pipes.read_response(self._reader_fd, RESPONSE_POLL_INTERVAL)
+            except TimeoutError:
+                continue
+            except (EOFError, OSError) as e:
+                logger.debug(f"Response pipe closed: {e}")
+                break
+
+            if response is not None:
+                self.dispatch(response)
+
+        self._fail_pending(ConnectionError("agentwatch response pipe closed"))
+
+    def _fail_pending(self, error: Exception) -> None:
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+
+        for future in pending:
+            if not future.done():
+                future.set_exception(error)
@@ -0,0 +1,169 @@
+import asyncio
+import heapq
+import time
+import zlib
+from collections import deque
+from typing import Optional
+
+from agentwatch.consts import LOW_PRIORITY_SHED_RATIO
+from agentwatch.enums import BacklogPolicy, HookEventType
+from agentwatch.models import Command, EventAck, ShardStats
+
+# Events are spread across the collector's workers by a stable key. Every event of an execution shares a
+# key, so an agent's calls are processed in the order they were sent (and the request and response of an
+# HTTP exchange get paired), while separate executions of a shared collector are processed concurrently.
+
+def shard_key(cmd: Command) -> str:
+    return cmd.execution_id
+
+def shard_index(key: str, num_shards: int) -> int:
+    return zlib.crc32(key.encode()) % num_shards
+
+def is_low_priority(cmd: Command) -> bool:
+    """Streaming deltas are superseded by the complete response, nothing builds the graph from them"""
+    # A member when the params came through pickle, its value when they came through JSON
+    return cmd.params.get("event_type") in (HookEventType.HTTP_RESPONSE_DELTA, HookEventType.HTTP_RESPONSE_DELTA.value)
+
+class EventShard:
+    """
+    The bounded queue of an event worker and its counters. When the queue is full, `policy` decides
+    whether put() waits for room (and with it whoever feeds the shard) or sheds the event. Low
+    priority events are shed before the queue is full, leaving room for the rest.
+    """
+
+    def __init__(self, index: int, max_size: int = 0, policy: BacklogPolicy = BacklogPolicy.BACKPRESSURE) -> None:
+        self.index = index
+        self.queue: asyncio.Queue[Command] = asyncio.Queue(max_size)
+        self._max_size = max_size
+        self._policy = policy
+        # When every queued event was put, oldest first (the worker takes them in order)
+        self._enqueued_at: deque[float] = deque()
+        self._processed = 0
+        self._batches = 0
+        self._shed = 0
+        self._blocked = 0
+        self._max_depth = 0
+        self._rate = 0.0
+        self._sampled_at = time.monotonic()
+        self._sampled_processed = 0
+
+    async def put(self, cmd: Command) -> bool:
+        """
+        Returns:
+            False if the event was shed
+        """
+        if self._policy == BacklogPolicy.SHED and self._max_size:
+            limit = int(self._max_size * LOW_PRIORITY_SHED_RATIO) if is_low_priority(cmd) else self._max_size
+            if self.queue.qsize() >= limit:
+                self._shed += 1
+                return False
+
+        if self.queue.full():
+            self._blocked += 1
+        await self.queue.put(cmd)
+        self._enqueued_at.append(time.monotonic())
+        self._max_depth = max(self._max_depth, self.queue.qsize())
+        return True
+
+    async def get_batch(self, max_size: int, linger: float = 0) -> list[Command]:
+        """
+        Wait for an event, then take up to `max_size` events, waiting up to `linger` seconds for more
+        """
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + linger
+        while len(batch) < max_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def done(self, count: int = 1) -> None:
+        """`count` events (a batch) were processed"""
+        self._processed += count
+        self._batches += 1
+        for _ in range(count):
+            self.queue.task_done()
+            if self._enqueued_at:
+                self._enqueued_at.popleft()
+
+    @property
+    def processed(self) -> int:
+        return self._processed
+
+    @property
+    def pending(self) -> int:
+        """Events queued or being processed"""
+        return len(self._enqueued_at)
+
+    def stats(self) -> ShardStats:
+        now = time.monotonic()
+        if now > self._sampled_at:
+            self._rate = (self._processed - self._sampled_processed) / (now - self._sampled_at)
+            self._sampled_at, self._sampled_processed = now, self._processed
+
+        return ShardStats(shard=self.index,
+                          depth=self.queue.qsize(),
+                          max_depth=self._max_depth,
+                          max_size=self._max_size,
+                          processed=self._processed,
+                          batches=self._batches,
+                          rate=self._rate,
+                          oldest_age_ms=(now - self._enqueued_at[0]) * 1000 if self._enqueued_at else 0,
+                          shed=self._shed,
+                          blocked=self._blocked)
+
+class DeliveryTracker:
+    """
+    Acknowledgement bookkeeping of a client's events. Shards complete events out of order, the
+    acknowledged sequence number only moves past events that were dealt with, and so did every
+    event before them.
+    """
+
+    def __init__(self) -> None:
+        self.ack = EventAck()
+        self._received = 0
+        self._in_flight: list[int] = []
+        self._completed: set[int] = set()
+
+    @property
+    def received(self) -> int:
+        """The last sequence number received"""
+        return self._received
+
+    @property
+    def settled(self) -> bool:
+        """Whether every event received was dealt with"""
+        return not self._in_flight
+
+    def receive(self, seq: Optional[int]) -> None:
+        """Events arrive in order, gaps are events lost on the way"""
+        if seq is None or seq <= self._received:
+            return
+        self.ack.lost += seq - self._received - 1
+        self._received = seq
+        heapq.heappush(self._in_flight, seq)
+
+    def complete(self, seq: Optional[int], processed: bool) -> None:
+        if processed:
+            self.ack.processed += 1
+        else:
+            self.ack.dropped += 1
+        if seq is None:
+            return
+
+        # Handled without being received through a shard
+        self.receive(seq)
+        self._completed.add(seq)
+        while self._in_flight and self._in_flight[0] in self._completed:
+            self._completed.remove(heapq.heappop(self._in_flight))
+        self.ack.seq = self._in_flight[0] - 1 if self._in_flight else self._received
@@ -0,0 +1,207 @@
+import multiprocessing
+import struct
+from multiprocessing.shared_memory import SharedMemory
+from multiprocessing.synchronize import Lock
+from typing import Final, Optional
+
+from agentwatch.models import RingStats
+
+# Producer and consumer fields live on separate cache lines
+_HEAD_OFFSET: Final[int] = 0
+_PIPE_FRAMES_SENT_OFFSET: Final[int] = 8
+_CAPACITY_OFFSET: Final[int] = 16
+_TAIL_OFFSET: Final[int] = 64
+_PIPE_FRAMES_CONSUMED_OFFSET: Final[int] = 72
+_CONSUMER_WAITING_OFFSET: Final[int] = 80
+_HEADER_SIZE: Final[int] = 128
+
+_U64: Final[struct.Struct] = struct.Struct("=Q")
+_RECORD_HEADER: Final[struct.Struct] = struct.Struct("=I")
+_WRAP_MARKER: Final[int] = 0xFFFFFFFF
+
+
+class ShmRing:
+    """
+    A single-producer/single-consumer ring buffer of variable size records in shared memory.
+
+    The producer only ever writes `head` and the consumer only ever writes `tail`, both are
+    ever-increasing byte offsets. Record bytes are copied outside of the ring's lock, but every
+    access to the header goes through it: the lock is what orders a record's bytes before the
+    `head` that publishes it (and a read before the `tail` that frees it) on every architecture,
+    not only on x86-64.
+
+    Besides the ring itself, the header holds the bookkeeping of the pipe transport that goes
+    with it (see Pipes): whether the consumer is about to sleep and how many frames went
+    through the pipe instead of the ring. As those fields are only accessed under the lock too,
+    a consumer that announces it's waiting before its last look at `head` can't miss a record
+    the producer published without seeing it waiting.
+
+    The lock isn't part of the shared memory, the process attaching to the ring by name must be
+    handed the creator's `lock`.
+    """
+
+    def __init__(self,
+                 name: Optional[str] = None,
+                 capacity: int = 0,
+                 create: bool = False,
+                 lock: Optional[Lock] = None) -> None:
+        if create:
+            if capacity <= _RECORD_HEADER.size:
+                raise ValueError("capacity is too small")
+            self._shm = SharedMemory(name=name, create=True, size=_HEADER_SIZE + capacity)
+        else:
+            if lock is None:
+                raise ValueError("attaching to a ring requires its lock")
+            self._shm = SharedMemory(name=name)
+        self._lock: Lock = lock if lock is not None else multiprocessing.Lock()
+
+        self._owner = create
+        self._buf: memoryview = self._shm.buf  # type: ignore[assignment]
+        if create:
+            self._buf[:_HEADER_SIZE] = bytes(_HEADER_SIZE)
+            self._set(_CAPACITY_OFFSET, capacity)
+        # The mapping may be rounded up to a page, the header holds the actual capacity
+        self._capacity = self._get(_CAPACITY_OFFSET)
+
+        # Producer side counters (not shared)
+        self._ring_frames = 0
+        self._full = 0
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def lock(self) -> Lock:
+        return self._lock
+
+    @property
+    def consumer_waiting(self) -> bool:
+        with self._lock:
+            return self._get(_CONSUMER_WAITING_OFFSET) != 0
+
+    @consumer_waiting.setter
+    def consumer_waiting(self, waiting: bool) -> None:
+        with self._lock:
+            self._set(_CONSUMER_WAITING_OFFSET, int(waiting))
+
+    @property
+    def pipe_frames_sent(self) -> int:
+        with self._lock:
+            return self._get(_PIPE_FRAMES_SENT_OFFSET)
+
+    @pipe_frames_sent.setter
+    def pipe_frames_sent(self, value: int) -> None:
+        with self._lock:
+            self._set(_PIPE_FRAMES_SENT_OFFSET, value)
+
+    @property
+    def pipe_frames_consumed(self) -> int:
+        with self._lock:
+            return self._get(_PIPE_FRAMES_CONSUMED_OFFSET)
+
+    @pipe_frames_consumed.setter
+    def pipe_frames_consumed(self, value: int) -> None:
+        with self._lock:
+            self._set(_PIPE_FRAMES_CONSUMED_OFFSET, value)
+
+    def used(self) -> int:
+        with self._lock:
+            return self._get(_HEAD_OFFSET) - self._get(_TAIL_OFFSET)
+
+    def take_consumer_waiting(self) -> bool:
+        """
+        Producer side. Whether the consumer is waiting for a wakeup, which it no longer is after this call.
+        """
+        with self._lock:
+            waiting = self._get(_CONSUMER_WAITING_OFFSET) != 0
+            self._set(_CONSUMER_WAITING_OFFSET, 0)
+        return waiting
+
+    def write(self, data: bytes) -> bool:
+        """
+        Producer side. Returns False if there's not enough free space for the record.
+        """
+        record_size = _RECORD_HEADER.size + len(data)
+        with self._lock:
+            head = self._get(_HEAD_OFFSET)
+            tail = self._get(_TAIL_OFFSET)
+        position = head % self._capacity
+
+        # Records are contiguous, skip the end of the buffer if the record doesn't fit there
+        skip = self._capacity - position if self._capacity - position < record_size else 0
+        if record_size + skip > self._capacity - (head - tail):
+            self._full += 1
+            return False
+
+        if skip:
+            if skip >= _RECORD_HEADER.size:
+                _RECORD_HEADER.pack_into(self._buf, _HEADER_SIZE + position, _WRAP_MARKER)
+            head += skip
+            position = 0
+
+        offset = _HEADER_SIZE + position
+        _RECORD_HEADER.pack_into(self._buf, offset, len(data))
+        self._buf[offset + _RECORD_HEADER.size:offset + record_size] = data
+
+        with self._lock:
+            self._set(_HEAD_OFFSET, head + record_size)
+        self._ring_frames += 1
+        return True
+
+    def read_all(self) -> list[bytes]:
+        """
+        Consumer side. Returns every record published so far, in order.
+        """
+        records: list[bytes] = []
+        with self._lock:
+            head = self._get(_HEAD_OFFSET)
+            tail = self._get(_TAIL_OFFSET)
+
+        while tail < head:
+            position = tail % self._capacity
+            remaining = self._capacity - position
+            if remaining < _RECORD_HEADER.size:
+                tail += remaining
+                continue
+
+            offset = _HEADER_SIZE + position
+            (length,) = _RECORD_HEADER.unpack_from(self._buf, offset)
+            if length == _WRAP_MARKER:
+                tail += remaining
+                continue
+
+            start = offset + _RECORD_HEADER.size
+            records.append(bytes(self._buf[start:start + length]))
+            tail += _RECORD_HEADER.size + length
+
+        # The records were copied out, the producer can reuse their space
+        with self._lock:
+            self._set(_TAIL_OFFSET, tail)
+        return records
+
+    def stats(self) -> RingStats:
+        """Producer side counters"""
+        return RingStats(capacity=self._capacity,
+                         used=self.used(),
+                         ring_frames=self._ring_frames,
+                         ring_full=self._full,
+                         pipe_frames=self.pipe_frames_sent)
+
+    def close(self) -> None:
+        self._shm.close()
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _get(self, offset: int) -> int:
+        return int(_U64.unpack_from(self._buf, offset)[0])
+
+    def _set(self, offset: int, value: int) -> None:
+        _U64.pack_into(self._buf, offset, value)
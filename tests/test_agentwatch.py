@@ -1,11 +1,32 @@
 import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
 from unittest.mock import MagicMock, patch
 
 import pytest
 
 from agentwatch.client import AgentwatchClient
-from agentwatch.enums import CommandAction
-from agentwatch.models import Command, CommandResponse
+from agentwatch.enums import CommandAction, HookEventType
+from agentwatch.hooks.http.models import HttpInterceptRule
+from agentwatch.hooks.models import HookEvent
+from agentwatch.models import CollectorStats, Command, CommandResponse, DrainStats, EventAck, HistogramSnapshot, ShardStats
+
+
+def idle_poll(timeout=None):
+    """The mocked pipe never has a response, without busy looping the response dispatcher"""
+    time.sleep(timeout or 0)
+    return False
+
+def respond_with(client, *responses):
+    """Make the mocked collector answer every command with `responses`, then with a matching one"""
+    def write(fd, cmd, ring=None):
+        for response in responses:
+            client._dispatcher.dispatch(response)
+        client._dispatcher.dispatch(CommandResponse(callback_id=cmd.callback_id, success=True, data={"action": cmd.action.value}))
+    return write
 
 
 @pytest.fixture
@@ -19,6 +40,7 @@ def mock_setup():
         # Create mocks we need to access in tests
         mock_client_fd = mock_pipe.return_value[0]
         mock_agentwatch_fd = mock_pipe.return_value[1]
+        mock_agentwatch_fd.poll.side_effect = idle_poll
         
         # Create a real event for testing
         exit_event = multiprocessing.Event()
@@ -71,81 +93,176 @@ def test_send_command_not_running(client):
 
 def test_send_command_wait(client):
     """Test that send_command_wait sends command and waits for response"""
-    with patch('agentwatch.pipes.Pipes.write_payload_sync') as mock_write, \
-         patch('agentwatch.pipes.Pipes.read_response') as mock_read, \
-         patch('agentwatch.models.Command.from_dict') as mock_command:
-        
-        # Setup mock response
-        mock_response = CommandResponse(callback_id="test-id", data={"result": "test"}, success=True)
-        mock_read.return_value = mock_response
-        
-        # Make command ID match response ID
-        mock_command.return_value = Command(
-            execution_id="test-execution-id",
-            action=CommandAction.EVENT,
-            params={"param1": "value1"},
-            callback_id="test-id"
-        )
-        
-        response = client.send_command_wait(CommandAction.EVENT, {"param1": "value1"})
-        
-        # Verify command was written
+    with patch('agentwatch.pipes.Pipes.write_payload_sync') as mock_write:
+        mock_write.side_effect = respond_with(client)
+
+        response = client.send_command_wait(CommandAction.PING)
+
         mock_write.assert_called_once()
-        
-        # Verify response was read and returned
-        mock_read.assert_called_once()
-        assert response == mock_response
+        assert response.callback_id == mock_write.call_args[0][1].callback_id
+        assert response.data == {"action": "ping"}
 
 
 def test_send_command_wait_timeout(client):
     """Test that send_command_wait raises timeout error when no response"""
-    with patch('agentwatch.pipes.Pipes.write_payload_sync'), \
-         patch('agentwatch.pipes.Pipes.read_response') as mock_read:
-        
-        # Setup mock to raise TimeoutError
-        mock_read.side_effect = TimeoutError("Timeout")
-        
+    with patch('agentwatch.pipes.Pipes.write_payload_sync'):
         with pytest.raises(TimeoutError):
-            client.send_command_wait(CommandAction.EVENT, {"param1": "value1"})
+            client.send_command_wait(CommandAction.PING, timeout=0.05)
+
+    assert client._dispatcher._pending == {}
 
 
 def test_send_command_wait_skip_other_responses(client):
-    """Test that send_command_wait skips responses with mismatched callback IDs"""
-    with patch('agentwatch.pipes.Pipes.write_payload_sync'), \
-         patch('agentwatch.pipes.Pipes.read_response') as mock_read, \
-         patch('agentwatch.models.Command.from_dict') as mock_command:
-        
-        # Setup responses with different callback IDs, then the matching one
-        response1 = CommandResponse(callback_id="other-id", success=True, data={})
-        response2 = CommandResponse(callback_id="test-id", success=True, data={"result": "test"})
-        mock_read.side_effect = [response1, response2]
-        
-        # Make command ID match second response ID
-        mock_command.return_value = Command(
-            execution_id="test-execution-id",
-            action=CommandAction.EVENT,
-            params={"param1": "value1"},
-            callback_id="test-id"
-        )
-        
-        response = client.send_command_wait(CommandAction.EVENT, {"param1": "value1"})
-        
-        # Verify correct response was returned
-        assert response == response2
-        assert mock_read.call_count == 2
+    """Test that send_command_wait ignores responses meant for other callers and acknowledgements"""
+    other = CommandResponse(callback_id="other-id", success=True, data={})
+    ack = CommandResponse(success=True, ack=EventAck(seq=3, processed=3))
+
+    with patch('agentwatch.pipes.Pipes.write_payload_sync') as mock_write:
+        mock_write.side_effect = respond_with(client, other, ack)
+
+        response = client.send_command_wait(CommandAction.PING)
+
+    assert response.callback_id == mock_write.call_args[0][1].callback_id
+    assert client.get_delivery_stats().acked == 3
+
+
+def test_send_command_wait_concurrent(client):
+    """Test that concurrent waiters each get their own response, whatever order they arrive in"""
+    written: list[Command] = []
+    results: dict[str, CommandResponse] = {}
+
+    def wait(index):
+        results[index] = client.send_command_wait(CommandAction.PING, {"index": index})
+
+    with patch('agentwatch.pipes.Pipes.write_payload_sync', side_effect=lambda fd, cmd, ring=None: written.append(cmd)):
+        threads = [threading.Thread(target=wait, args=(index,)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        while len(written) < len(threads):
+            time.sleep(0.01)
+
+        for cmd in reversed(written):
+            client._dispatcher.dispatch(CommandResponse(callback_id=cmd.callback_id, success=True, data=cmd.params["index"]))
+        for thread in threads:
+            thread.join(5)
+
+    assert {index: response.data for index, response in results.items()} == {index: index for index in range(8)}
+
+
+@pytest.mark.asyncio
+async def test_send_command_async(client):
+    """Test that responses can be awaited from an event loop"""
+    with patch('agentwatch.pipes.Pipes.write_payload_sync') as mock_write:
+        mock_write.side_effect = respond_with(client)
+
+        response = await client.send_command_async(CommandAction.PING)
+
+        assert response.callback_id == mock_write.call_args[0][1].callback_id
+
+        mock_write.side_effect = None
+        with pytest.raises(TimeoutError):
+            await client.send_command_async(CommandAction.PING, timeout=0.05)
+
+def test_hook_callback_is_buffered(client):
+    """Test that hook callbacks are written to the pipe by the flusher thread"""
+    event = HookEvent(event_type=HookEventType.HTTP_REQUEST, data={"url": "http://test.com"})
+
+    with patch('agentwatch.pipes.Pipes.write_frame_sync') as mock_write:
+        client.on_hook_callback_sync(MagicMock(), event)
+        assert client._event_buffer.flush(timeout=5)
+
+        mock_write.assert_called_once()
+        [cmd] = mock_write.call_args[0][1]
+        assert cmd.action == CommandAction.EVENT
+        assert cmd.params == event.model_dump()
+
+    stats = client.get_buffer_stats()
+    assert stats.enqueued == 1
+    assert stats.flushed == 1
+
+def test_failed_write_is_counted(client):
+    """Test that events the pipe didn't take count as flush errors and don't take a seq"""
+    event = HookEvent(event_type=HookEventType.HTTP_REQUEST, data={"url": "http://test.com"})
+
+    with patch('agentwatch.pipes.Pipes.write_frame_sync', side_effect=BrokenPipeError(32, "Broken pipe")):
+        client.on_hook_callback_sync(MagicMock(), event)
+        assert client._event_buffer.flush(timeout=5)
+
+    assert client.get_buffer_stats().flush_errors == 1
+    assert client.get_delivery_stats().sent == 0
+
+    with patch('agentwatch.pipes.Pipes.write_frame_sync') as mock_write:
+        client.on_hook_callback_sync(MagicMock(), event)
+        assert client._event_buffer.flush(timeout=5)
+
+    [cmd] = mock_write.call_args[0][1]
+    assert cmd.seq == 1
+
+def test_events_are_buffered_until_collector_is_ready(mock_setup):
+    """Test that creating the client doesn't wait for the collector, events are held until it's initialized"""
+    initialized = threading.Event()
+    mock_setup['mock_event'].return_value = initialized
+    event = HookEvent(event_type=HookEventType.HTTP_REQUEST, data={"url": "http://test.com"})
+
+    with patch('agentwatch.pipes.Pipes.write_frame_sync') as mock_write:
+        client = AgentwatchClient()
+        assert not client.wait_until_ready(timeout=0)
+        client.on_hook_callback_sync(MagicMock(), event)
+        assert not client._event_buffer.flush(timeout=0.2)
+        mock_write.assert_not_called()
+
+        initialized.set()
+        assert client.wait_until_ready(timeout=5)
+        assert client._event_buffer.flush(timeout=5)
+        mock_write.assert_called_once()
+
+    startup = client.get_startup_stats()
+    assert startup.ready_ms is not None and startup.ready_ms >= startup.hooks_ms
+    assert startup.buffered == 1
+    assert not startup.timed_out
 
 def test_shutdown():
     agentwatch = AgentwatchClient()
     event_processor = agentwatch._process
 
     assert event_processor.is_alive()
+    assert agentwatch.wait_until_ready(5)
     agentwatch.shutdown()
     assert not event_processor.is_alive()
+    assert agentwatch.get_drain_stats() is not None
+
+def test_shutdown_while_collector_starts():
+    """Test that a collector shut down before it was ready still drains what it was sent"""
+    agentwatch = AgentwatchClient()
+    event = HookEvent(event_type=HookEventType.HTTP_REQUEST, data={"method": "GET", "url": "http://test.com", "headers": {}})
+    for _ in range(3):
+        agentwatch.on_hook_callback_sync(MagicMock(), event)
+
+    agentwatch.shutdown()
+    assert not agentwatch._process.is_alive()
+    drain = agentwatch.get_drain_stats()
+    assert drain is not None and drain.flushed == 3
+    
+def test_shutdown_reports_the_drain(client):
+    """Test that shutdown tells the collector how many events were sent and keeps its drain report"""
+    client._event_seq = 12
+    drain = DrainStats(flushed=10, abandoned=2, timed_out=True, duration_ms=500)
+
+    def write(fd, cmd, ring=None):
+        if cmd.action == CommandAction.SHUTDOWN:
+            assert cmd.params == {"last_seq": 12, "timeout": 0.5}
+            client._dispatcher.dispatch(CommandResponse(callback_id=cmd.callback_id, success=True, data=drain.model_dump()))
+
+    with patch('agentwatch.pipes.Pipes.write_payload_sync', side_effect=write):
+        client._ready.set()
+        client.shutdown(drain_timeout=0.5)
+
+    assert client.get_drain_stats() == drain
     
 
 def test_shutdown_force_kill(client):
     """Test shutdown with force kill"""
-    with patch('agentwatch.pipes.Pipes.write_payload_sync'), \
+    with patch('agentwatch.pipes.Pipes.write_payload_sync', side_effect=respond_with(client)), \
          patch('time.sleep'), \
          patch('os.kill') as mock_kill:
         
@@ -171,7 +288,8 @@ def test_cleanup(client):
     client._process = process_mock
     
     # Call cleanup
-    client._cleanup()
+    with patch('agentwatch.pipes.Pipes.write_payload_sync', side_effect=respond_with(client)):
+        client._cleanup()
     
     # Verify process terminated
     process_mock.terminate.assert_called_once()
@@ -187,4 +305,75 @@ def test_cleanup_not_running(client):
     client._cleanup()
     
     # Verify process not terminated
-    process_mock.terminate.assert_not_called()
\ No newline at end of file
+    process_mock.terminate.assert_not_called()
+def test_set_intercept_rules(client):
+    """Test that intercept rules are swapped on the hooks, without involving the collector"""
+    rules = [HttpInterceptRule(host="*.example.com", path_prefix="/v1/")]
+    client._running = False
+
+    with patch('agentwatch.pipes.Pipes.write_payload_sync') as mock_write:
+        client.set_intercept_rules(rules)
+        mock_write.assert_not_called()
+
+    for hook in client._hooks:
+        assert hook.intercept_rules == rules
+        assert hook.should_intercept("api.example.com", path="/v1/chat")
+        assert not hook.should_intercept("api.openai.com")
+
+def test_get_stats(client):
+    """Test that client side overhead is merged with the collector's stats"""
+    event = HookEvent(event_type=HookEventType.HTTP_REQUEST, data={"url": "http://test.com"})
+    collector_stats = CollectorStats(overhead={"process": HistogramSnapshot(bounds_us=[10], counts=[1, 0], count=1, total_us=5, max_us=5)},
+                                     shards=[ShardStats(shard=0, depth=2, max_depth=5, processed=10)]).model_dump()
+
+    with patch('agentwatch.pipes.Pipes.write_frame_sync'), \
+         patch.object(client, 'send_command_wait', return_value=CommandResponse(success=True, data=collector_stats)) as mock_wait:
+        client.on_hook_callback_sync(MagicMock(), event)
+        assert client._event_buffer.flush(timeout=5)
+
+        stats = client.get_stats()
+
+    mock_wait.assert_called_once_with(CommandAction.STATS, timeout=1.0)
+    assert stats.overhead["command"].count >= 1
+    assert stats.buffer.flushed == 1
+    assert stats.collector["process"].count == 1
+    assert stats.shards[0].depth == 2
+
+@pytest.mark.parametrize("error", [BrokenPipeError(), EOFError(), ConnectionError("agentwatch response pipe closed")])
+def test_get_stats_without_collector(client, error):
+    """Test that a collector that went away only leaves the collector's part of the stats empty"""
+    with patch.object(client, 'send_command_wait', side_effect=error):
+        stats = client.get_stats()
+
+    assert stats.collector == {}
+    assert stats.shards == []
+
+def test_events_are_acknowledged_in_bulk(client):
+    """Test that events are numbered and that the collector's acknowledgements update the delivery stats"""
+    event = HookEvent(event_type=HookEventType.HTTP_REQUEST, data={"url": "http://test.com"})
+
+    with patch('agentwatch.pipes.Pipes.write_frame_sync') as mock_write:
+        client.on_hook_callback_sync(MagicMock(), event)
+        client.on_hook_callback_sync(MagicMock(), event)
+        assert client._event_buffer.flush(timeout=5)
+
+    assert [cmd.seq for call in mock_write.call_args_list for cmd in call[0][1]] == [1, 2]
+
+    client._dispatcher.dispatch(CommandResponse(success=True, ack=EventAck(seq=1, processed=1)))
+
+    delivery = client.get_delivery_stats()
+    assert delivery.sent == 2
+    assert delivery.acked == 1
+    assert delivery.lag == 1
+    assert delivery.processed == 1
+    assert delivery.last_ack is not None
+
+def test_client_doesnt_import_the_processing_side():
+    """Test that the agent process only loads the hooks and the transport, the collector imports the rest"""
+    collector_modules = ("agentwatch.event_processor", "agentwatch.processing", "agentwatch.llm", "agentwatch.graph",
+                         "agentwatch.webhooks", "agentwatch.export", "aiohttp", "jsonpath_ng")
+    code = ("import sys; import agentwatch.client; "
+            f"print(sorted(m for m in sys.modules if m.startswith({collector_modules!r})))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            env={**os.environ, "AGENTWATCH_INTERNAL": "1", "PYTHONPATH": os.pathsep.join(sys.path)})
+    assert result.stdout.strip() == "[]"
@@ -22,6 +22,7 @@ class TestAgentwatchClient(unittest.TestCase):
         
         self.mock_client_fd = mock_pipe.return_value[0]
         self.mock_agentwatch_fd = mock_pipe.return_value[1]
+        self.mock_agentwatch_fd.poll.side_effect = self._idle_poll
         
         # Create a real event for testing
         self.exit_event = multiprocessing.Event()
@@ -30,6 +31,18 @@ class TestAgentwatchClient(unittest.TestCase):
         # Create client instance
         self.client = AgentwatchClient()
         
+    @staticmethod
+    def _idle_poll(timeout=None):
+        time.sleep(timeout or 0)
+        return False
+
+    def _answer(self, fd, cmd, ring=None):
+        self.client._dispatcher.dispatch(CommandResponse(callback_id=cmd.callback_id, success=True))
+
+    def _respond(self, fd, cmd, ring=None):
+        self.client._dispatcher.dispatch(CommandResponse(callback_id="other-id", success=True, data={}))
+        self.client._dispatcher.dispatch(CommandResponse(callback_id=cmd.callback_id, success=True, data={"result": "test"}))
+
     def test_init(self):
         """Test that initialization creates appropriate objects and starts process"""
         self.mock_atexit.assert_called_once_with(self.client._cleanup)
@@ -56,61 +69,23 @@ class TestAgentwatchClient(unittest.TestCase):
             self.client.send_command(CommandAction.EVENT)
             
     @patch('agentwatch.pipes.Pipes.write_payload_sync')
-    @patch('agentwatch.pipes.Pipes.read_response')
-    def test_send_command_wait(self, mock_read, mock_write):
-        """Test that send_command_wait sends command and waits for response"""
-        # Setup mock response
-        mock_response = CommandResponse(callback_id="test-id", data={"result": "test"}, success=True)
-        mock_read.return_value = mock_response
-        
-        # Make command ID match response ID
-        with patch('agentwatch.models.Command.from_dict', return_value=Command(
-            execution_id="test-execution-id",
-            action=CommandAction.EVENT,
-            params={"param1": "value1"},
-            callback_id="test-id"
-        )):
-            response = self.client.send_command_wait(CommandAction.EVENT, {"param1": "value1"})
-        
-        # Verify command was written
+    def test_send_command_wait(self, mock_write):
+        """Test that send_command_wait sends command and waits for its own response"""
+        mock_write.side_effect = self._respond
+
+        response = self.client.send_command_wait(CommandAction.PING, {"param1": "value1"})
+
+        # Verify command was written and the matching response returned
         mock_write.assert_called_once()
-        
-        # Verify response was read and returned
-        mock_read.assert_called_once()
-        self.assertEqual(response, mock_response)
-        
+        self.assertEqual(response.callback_id, mock_write.call_args[0][1].callback_id)
+        self.assertEqual(response.data, {"result": "test"})
+
     @patch('agentwatch.pipes.Pipes.write_payload_sync')
-    @patch('agentwatch.pipes.Pipes.read_response')
-    def test_send_command_wait_timeout(self, mock_read, mock_write):
+    def test_send_command_wait_timeout(self, mock_write):
         """Test that send_command_wait raises timeout error when no response"""
-        # Setup mock to raise TimeoutError
-        mock_read.side_effect = TimeoutError("Timeout")
-        
         with self.assertRaises(TimeoutError):
-            self.client.send_command_wait(CommandAction.EVENT, {"param1": "value1"})
-            
-    @patch('agentwatch.pipes.Pipes.write_payload_sync')
-    @patch('agentwatch.pipes.Pipes.read_response')
-    def test_send_command_wait_skip_other_responses(self, mock_read, mock_write):
-        """Test that send_command_wait skips responses with mismatched callback IDs"""
-        # Setup responses with different callback IDs, then the matching one
-        response1 = CommandResponse(callback_id="other-id", success=True, data={})
-        response2 = CommandResponse(callback_id="test-id", success=True, data={"result": "test"})
-        mock_read.side_effect = [response1, response2]
-        
-        # Make command ID match second response ID
-        with patch('agentwatch.models.Command.from_dict', return_value=Command(
-            execution_id="test-execution-id",
-            action=CommandAction.EVENT,
-            params={"param1": "value1"},
-            callback_id="test-id"
-        )):
-            response = self.client.send_command_wait(CommandAction.EVENT, {"param1": "value1"})
-        
-        # Verify correct response was returned
-        self.assertEqual(response, response2)
-        self.assertEqual(mock_read.call_count, 2)
-        
+            self.client.send_command_wait(CommandAction.PING, {"param1": "value1"}, timeout=0.05)
+
     @patch('agentwatch.pipes.Pipes.write_payload_sync')
     def test_shutdown(self, mock_write):
         """Test normal shutdown process"""
@@ -122,10 +97,9 @@ class TestAgentwatchClient(unittest.TestCase):
         # Simulate normal shutdown
         self.client.shutdown()
         
-        # Verify shutdown command sent
-        mock_write.assert_called_once()
-        cmd = mock_write.call_args[0][1]
-        self.assertEqual(cmd.action, CommandAction.SHUTDOWN)
+        # Nobody's left to receive a shutdown command, the pipes are just closed
+        mock_write.assert_not_called()
+        self.mock_agentwatch_fd.close.assert_called()
         
         # Verify process state checked
         process_mock.is_alive.assert_called()
@@ -141,6 +115,7 @@ class TestAgentwatchClient(unittest.TestCase):
         process_mock.is_alive.return_value = True  # Always alive
         process_mock.pid = 12345
         self.client._process = process_mock
+        mock_write.side_effect = self._answer
         
         # Shutdown client
         self.client.shutdown()
@@ -157,7 +132,8 @@ class TestAgentwatchClient(unittest.TestCase):
         self.client._process = process_mock
         
         # Call cleanup
-        self.client._cleanup()
+        with patch('agentwatch.pipes.Pipes.write_payload_sync', side_effect=self._answer):
+            self.client._cleanup()
         
         # Verify process terminated
         process_mock.terminate.assert_called_once()
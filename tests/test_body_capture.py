@@ -0,0 +1,81 @@
+import gzip
+
+import pytest
+from pydantic import ValidationError
+
+from agentwatch.hooks.http.body import BodyCapture, decode_body, get_charset
+from agentwatch.hooks.http.models import HttpCapturePolicy, HTTPRequestData
+
+
+def test_capture_unbounded():
+    capture = BodyCapture()
+    capture.feed(b"hello ")
+    capture.feed(b"world")
+
+    assert capture.getvalue() == b"hello world"
+    assert capture.size == 11
+    assert capture.truncated is False
+
+def test_capture_keeps_head_and_tail():
+    capture = BodyCapture(head_bytes=4, tail_bytes=3, truncation_marker="[{dropped}]")
+    for chunk in (b"0123", b"4567", b"89abcdef"):
+        capture.feed(chunk)
+
+    assert capture.size == 16
+    assert capture.truncated is True
+    assert capture.getvalue() == b"0123[9]def"
+
+def test_capture_within_limits_is_not_truncated():
+    capture = BodyCapture(head_bytes=4, tail_bytes=4)
+    capture.feed(b"0123456")
+
+    assert capture.truncated is False
+    assert capture.getvalue() == b"0123456"
+
+def test_policy_split():
+    policy = HttpCapturePolicy(max_body_bytes=100, tail_ratio=0.2)
+
+    assert policy.head_bytes == 80
+    assert policy.tail_bytes == 20
+    assert HttpCapturePolicy(max_body_bytes=None).head_bytes is None
+
+@pytest.mark.parametrize("limits", [{"tail_ratio": 1.5}, {"tail_ratio": -0.1}, {"max_body_bytes": 0}, {"max_body_bytes": -1}])
+def test_policy_rejects_invalid_limits(limits):
+    with pytest.raises(ValidationError):
+        HttpCapturePolicy(**limits)
+
+def test_get_charset():
+    assert get_charset("application/json") == "utf-8"
+    assert get_charset('text/plain; charset="ISO-8859-1"') == "iso8859-1"
+    assert get_charset("text/plain; charset=unknown-charset") == "utf-8"
+    assert get_charset(None) == "utf-8"
+
+def test_decode_body_gzip():
+    content = gzip.compress('{"text": "héllo"}'.encode())
+
+    assert decode_body(content, {"content-encoding": "gzip"}) == '{"text": "héllo"}'
+
+def test_decode_body_truncated_gzip():
+    content = gzip.compress(b"x" * 10_000)[:20]
+
+    # Partial content decodes as far as it goes and never raises
+    assert set(decode_body(content, {"content-encoding": "gzip"})) <= {"x"}
+
+def test_decode_body_invalid_utf8():
+    assert decode_body(b"\xff\xfeabc", {}) == "��abc"
+
+def test_request_data_is_binary_safe_over_json():
+    data = HTTPRequestData(method="POST",
+                           url="https://api.example.com",
+                           headers={"content-type": "text/plain; charset=latin-1"},
+                           content=b"caf\xe9\xff")
+
+    restored = HTTPRequestData.model_validate_json(data.model_dump_json())
+
+    assert restored.content == b"caf\xe9\xff"
+    assert restored.text == "caf\xe9\xff"
+
+def test_text_prefers_body():
+    data = HTTPRequestData(method="GET", url="https://api.example.com", headers={}, body="text", content=b"raw")
+
+    assert data.text == "text"
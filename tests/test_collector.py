@@ -0,0 +1,123 @@
+import multiprocessing
+import os
+import signal
+import socket
+import stat
+import time
+from unittest.mock import patch
+
+import pytest
+
+from agentwatch.collector import authkey_path, connect_collector, default_collector_address, run_collector
+from agentwatch.consts import AGENTWATCH_COLLECTOR
+from agentwatch.enums import CommandAction, HookEventType
+from agentwatch.hooks.models import HookEvent
+from agentwatch.models import Command, CommandResponse
+from agentwatch.pipes import Pipes
+
+
+def _read_response(conn) -> CommandResponse:
+    """The next response on the control connection, skipping event acknowledgements"""
+    while True:
+        response = Pipes.read_response(conn, timeout=5)
+        assert response is not None
+        if response.ack is None:
+            return response
+
+def test_connect_without_collector(tmp_path):
+    """Test that clients fall back to a private collector when nothing listens"""
+    assert connect_collector(str(tmp_path / "missing.sock")) is None
+
+def test_shared_collector(tmp_path):
+    """Test that several clients share a single collector and that it cleans up after itself"""
+    address = str(tmp_path / "collector.sock")
+    collector = multiprocessing.Process(target=run_collector, args=(address,), daemon=True)
+    collector.start()
+
+    try:
+        deadline = time.monotonic() + 10
+        while not (os.path.exists(address) and os.path.exists(authkey_path(address))):
+            assert time.monotonic() < deadline, "collector didn't start"
+            time.sleep(0.05)
+        assert os.stat(authkey_path(address)).st_mode & 0o077 == 0
+
+        event = HookEvent(event_type=HookEventType.HTTP_REQUEST, data={"url": "http://test.com"})
+        clients = []
+        for execution_id in ("first", "second"):
+            connections = connect_collector(address)
+            assert connections is not None
+            events, control = connections
+            Pipes.write_payload_sync(control, Command(execution_id=execution_id, action=CommandAction.HELLO))
+            Pipes.write_frame_sync(events, [Command(execution_id=execution_id, action=CommandAction.EVENT,
+                                                    params=event.model_dump(), seq=seq) for seq in range(1, 11)])
+            clients.append((execution_id, events, control))
+
+        # Responses go back to the client that asked, the shutdown command only ends its session
+        for execution_id, events, control in clients:
+            ping = Command(execution_id=execution_id, action=CommandAction.PING)
+            Pipes.write_payload_sync(control, ping)
+            assert _read_response(control).callback_id == ping.callback_id
+
+            shutdown = Command(execution_id=execution_id, action=CommandAction.SHUTDOWN)
+            Pipes.write_payload_sync(control, shutdown)
+            assert _read_response(control).callback_id == shutdown.callback_id
+            events.close()
+            control.close()
+
+        assert collector.is_alive()
+        connections = connect_collector(address)
+        assert connections is not None
+        for connection in connections:
+            connection.close()
+    finally:
+        os.kill(collector.pid, signal.SIGTERM)
+        collector.join(10)
+
+    assert collector.exitcode == 0
+    assert not os.path.exists(address)
+    assert not os.path.exists(authkey_path(address))
+
+def test_connect_refuses_collector_of_another_user(tmp_path):
+    """Test that a socket or key other users can access is never connected to, nor its key read"""
+    address = str(tmp_path / "collector.sock")
+    listener = socket.socket(socket.AF_UNIX)
+    listener.bind(address)
+    os.chmod(address, 0o600)
+    with open(authkey_path(address), "wb") as f:
+        f.write(b"key")
+
+    try:
+        os.chmod(authkey_path(address), 0o644)
+        with patch("agentwatch.collector.Client") as client:
+            assert connect_collector(address) is None
+            client.assert_not_called()
+
+        os.chmod(authkey_path(address), 0o600)
+        os.chmod(address, 0o666)
+        with patch("agentwatch.collector.Client") as client:
+            assert connect_collector(address) is None
+            client.assert_not_called()
+    finally:
+        listener.close()
+
+def test_collector_doesnt_write_the_key_through_a_symlink(tmp_path):
+    """Test that a key path planted as a symlink makes the collector refuse to start"""
+    address = str(tmp_path / "collector.sock")
+    target = tmp_path / "target"
+    target.write_bytes(b"")
+    os.symlink(target, authkey_path(address))
+
+    with pytest.raises(RuntimeError):
+        run_collector(address)
+    assert target.read_bytes() == b""
+
+def test_default_collector_dir_is_private(tmp_path, monkeypatch):
+    """Test that the default socket lives in a directory only its user can access"""
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    monkeypatch.delenv(AGENTWATCH_COLLECTOR, raising=False)
+    assert default_collector_address() == str(tmp_path / "agentwatch" / "collector.sock")
+
+    with patch("agentwatch.collector.Listener", side_effect=OSError("stop here")):
+        with pytest.raises(OSError):
+            run_collector()
+    assert stat.S_IMODE(os.stat(tmp_path / "agentwatch").st_mode) == 0o700
@@ -0,0 +1,53 @@
+import pytest
+
+from agentwatch.hooks.http.connection_trace import AsyncConnectionTracer, ConnectionTracer
+
+
+def test_new_connection_phases_are_recorded():
+    tracer = ConnectionTracer()
+    for phase in ["connection.connect_tcp", "connection.start_tls", "http11.send_request_headers"]:
+        tracer(f"{phase}.started", {})
+        tracer(f"{phase}.complete", {"return_value": None})
+
+    assert not tracer.info.reused
+    assert set(tracer.info.phases_ms) == {"connection.connect_tcp", "connection.start_tls", "http11.send_request_headers"}
+    assert all(duration >= 0 for duration in tracer.info.phases_ms.values())
+
+def test_reused_connection():
+    tracer = ConnectionTracer()
+    tracer("http11.send_request_headers.started", {})
+    tracer("http11.send_request_headers.complete", {})
+
+    assert tracer.info.reused
+    assert "connection.connect_tcp" not in tracer.info.phases_ms
+
+def test_failed_phase_is_recorded():
+    tracer = ConnectionTracer()
+    tracer("connection.connect_tcp.started", {})
+    tracer("connection.connect_tcp.failed", {"exception": OSError()})
+
+    assert not tracer.info.reused
+    assert "connection.connect_tcp" in tracer.info.phases_ms
+
+def test_existing_tracer_is_chained():
+    events = []
+    tracer = ConnectionTracer(lambda name, info: events.append(name))
+    tracer("connection.connect_tcp.started", {})
+
+    assert events == ["connection.connect_tcp.started"]
+    # A retry of the same request doesn't chain the previous tracer
+    assert ConnectionTracer(tracer).chained is tracer.chained
+
+@pytest.mark.asyncio
+async def test_async_tracer_chains_coroutines():
+    events = []
+
+    async def user_trace(name, info):
+        events.append(name)
+
+    tracer = AsyncConnectionTracer(user_trace)
+    await tracer("connection.start_tls.started", {})
+    await tracer("connection.start_tls.complete", {})
+
+    assert events == ["connection.start_tls.started", "connection.start_tls.complete"]
+    assert "connection.start_tls" in tracer.info.phases_ms
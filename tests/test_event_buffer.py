@@ -0,0 +1,180 @@
+import threading
+
+import pytest
+
+from agentwatch.enums import OverflowPolicy
+from agentwatch.event_buffer import EventBuffer
+
+
+class RecordingSink:
+    def __init__(self):
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, batch):
+        self.gate.wait(5)
+        self.batches.append(batch)
+
+    @property
+    def items(self):
+        return [item for batch in self.batches for item in batch]
+
+
+def test_put_and_flush():
+    sink = RecordingSink()
+    buffer = EventBuffer(sink, max_size=10)
+    buffer.start()
+
+    for i in range(5):
+        assert buffer.put(i) is True
+
+    assert buffer.flush(timeout=5) is True
+    assert sink.items == [0, 1, 2, 3, 4]
+
+    stats = buffer.stats()
+    assert stats.enqueued == 5
+    assert stats.flushed == 5
+    assert stats.dropped == 0
+    buffer.stop(timeout=5)
+
+def test_batches_are_capped_in_bytes():
+    sink = RecordingSink()
+    buffer = EventBuffer(sink, max_size=10, max_batch_size=10, max_batch_bytes=10, size_of=len)
+    buffer.start(paused=True)
+
+    for item in ("aaaa", "bbbb", "cccc", "dddddddddddd", "e"):
+        buffer.put(item)
+    buffer.resume()
+
+    assert buffer.flush(timeout=5) is True
+    # An item larger than the cap still goes out, on its own
+    assert sink.batches == [["aaaa", "bbbb"], ["cccc"], ["dddddddddddd"], ["e"]]
+    buffer.stop(timeout=5)
+
+def test_put_before_start_is_dropped():
+    buffer = EventBuffer(RecordingSink(), max_size=10)
+
+    assert buffer.put(1) is False
+    assert buffer.stats().dropped == 1
+
+def _fill_while_blocked(policy):
+    sink = RecordingSink()
+    sink.gate.clear()
+    buffer = EventBuffer(sink, max_size=2, overflow_policy=policy)
+    buffer.start()
+
+    # The first item is picked up by the flusher, which then blocks inside the sink
+    buffer.put(0)
+    assert buffer.flush(timeout=0.1) is False
+    return sink, buffer
+
+def test_drop_newest():
+    sink, buffer = _fill_while_blocked(OverflowPolicy.DROP_NEWEST)
+
+    results = [buffer.put(i) for i in range(1, 5)]
+    sink.gate.set()
+    buffer.stop(timeout=5)
+
+    assert results == [True, True, False, False]
+    assert sink.items == [0, 1, 2]
+    assert buffer.stats().dropped == 2
+
+def test_drop_oldest():
+    sink, buffer = _fill_while_blocked(OverflowPolicy.DROP_OLDEST)
+
+    results = [buffer.put(i) for i in range(1, 5)]
+    sink.gate.set()
+    buffer.stop(timeout=5)
+
+    assert results == [True, True, True, True]
+    assert sink.items == [0, 3, 4]
+    assert buffer.stats().dropped == 2
+
+def test_block_waits_for_space():
+    sink, buffer = _fill_while_blocked(OverflowPolicy.BLOCK)
+    buffer.put(1)
+    buffer.put(2)
+
+    producer = threading.Thread(target=buffer.put, args=(3,))
+    producer.start()
+    producer.join(0.1)
+    assert producer.is_alive()
+
+    sink.gate.set()
+    producer.join(5)
+    buffer.stop(timeout=5)
+
+    assert sink.items == [0, 1, 2, 3]
+    assert buffer.stats().dropped == 0
+
+def test_sink_errors_are_counted():
+    def failing_sink(batch):
+        raise RuntimeError("collector is gone")
+
+    buffer = EventBuffer(failing_sink, max_size=10)
+    buffer.start()
+    buffer.put(1)
+    buffer.stop(timeout=5)
+
+    assert buffer.stats().flush_errors == 1
+
+def test_invalid_size():
+    with pytest.raises(ValueError):
+        EventBuffer(RecordingSink(), max_size=0)
+
+def test_linger_batches_items():
+    sink = RecordingSink()
+    buffer = EventBuffer(sink, max_size=100, max_batch_size=4, linger=1)
+    buffer.start()
+
+    # A full batch doesn't wait for the linger to expire
+    for i in range(4):
+        buffer.put(i)
+    assert buffer.flush(timeout=0.5) is True
+
+    # A partial batch is flushed on stop, without waiting for the linger either
+    buffer.put(4)
+    buffer.stop(timeout=0.5)
+
+    assert sink.batches == [[0, 1, 2, 3], [4]]
+
+def test_batches_are_bounded():
+    sink = RecordingSink()
+    sink.gate.clear()
+    buffer = EventBuffer(sink, max_size=100, max_batch_size=3)
+    buffer.start()
+
+    buffer.put(0)
+    for i in range(1, 8):
+        buffer.put(i)
+    sink.gate.set()
+
+    assert buffer.flush(timeout=5) is True
+    assert sink.items == list(range(8))
+    assert all(len(batch) <= 3 for batch in sink.batches)
+    buffer.stop(timeout=5)
+
+def test_paused_buffer_holds_items_until_resumed():
+    sink = RecordingSink()
+    buffer = EventBuffer(sink, max_size=10)
+    buffer.start(paused=True)
+
+    assert buffer.put(1) is True
+    assert buffer.put(2) is True
+    assert buffer.flush(timeout=0.1) is False
+    assert sink.items == []
+
+    buffer.resume()
+    assert buffer.flush(timeout=5) is True
+    assert sink.items == [1, 2]
+    buffer.stop(timeout=5)
+
+def test_stop_drains_a_paused_buffer():
+    sink = RecordingSink()
+    buffer = EventBuffer(sink, max_size=10)
+    buffer.start(paused=True)
+    buffer.put(1)
+
+    buffer.stop(timeout=5)
+    assert sink.items == [1]
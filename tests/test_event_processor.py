@@ -0,0 +1,82 @@
+import asyncio
+from multiprocessing import Pipe
+
+import pytest
+
+from agentwatch.enums import CommandAction, HookEventType
+from agentwatch.event_processor import EventProcessor
+from agentwatch.hooks.models import HookEvent
+from agentwatch.models import Command, CommandResponse, EventAck
+from agentwatch.pipes import Pipes
+
+
+@pytest.mark.asyncio
+async def test_collector_tracks_event_sequence():
+    """Test that events get no response and that gaps and undecodable events are reported in the ack"""
+    processor = EventProcessor()
+    event = HookEvent(event_type=HookEventType.HTTP_REQUEST, data={"url": "http://test.com"})
+
+    for seq in [1, 2, 5]:
+        cmd = Command(execution_id="test", action=CommandAction.EVENT, params=event.model_dump(), seq=seq)
+        assert await processor._on_command(cmd) is None
+    await processor._on_command(Command(execution_id="test", action=CommandAction.EVENT, params={"data": 1}, seq=6))
+
+    assert processor._deliveries["test"].ack == EventAck(seq=6, processed=3, dropped=1, lost=2)
+
+async def _read_response(conn, timeout=5.0) -> CommandResponse:
+    """The next response on the control pipe, skipping event acknowledgements"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        while not conn.poll():
+            assert loop.time() < deadline, "no response"
+            await asyncio.sleep(0.001)
+
+        response = CommandResponse.model_validate_json(conn.recv())
+        if response.ack is None:
+            return response
+
+@pytest.mark.asyncio
+async def test_control_commands_bypass_event_backlog():
+    """Test that ping and shutdown are served right away while thousands of events are queued"""
+    events_reader, events_writer = Pipe()
+    control_reader, control_writer = Pipe()
+    processor = EventProcessor(queue_size=0)
+    processor._pipe = events_reader
+    processor._control_pipe = control_reader
+
+    collector = asyncio.create_task(processor._start())
+    while not processor._shards or not processor._pollers:
+        await asyncio.sleep(0.001)
+
+    event = HookEvent(event_type=HookEventType.HTTP_REQUEST, data={"url": "http://test.com"})
+    for seq in range(1, 20_001):
+        await processor._route_event(Command(execution_id="test", action=CommandAction.EVENT, params=event.model_dump(), seq=seq))
+
+    ping = Command(execution_id="test", action=CommandAction.PING)
+    Pipes.write_payload_sync(control_writer, ping)
+    response = await _read_response(control_writer)
+    assert response.callback_id == ping.callback_id
+    assert sum(shard.queue.qsize() for shard in processor._shards) > 0
+
+    shutdown = Command(execution_id="test", action=CommandAction.SHUTDOWN)
+    Pipes.write_payload_sync(control_writer, shutdown)
+    await asyncio.wait_for(collector, timeout=5)
+    assert (await _read_response(control_writer)).callback_id == shutdown.callback_id
+
+@pytest.mark.asyncio
+async def test_collector_stops_when_client_goes_away():
+    """Test that closing the pipes without a shutdown command still stops the collector"""
+    events_reader, events_writer = Pipe()
+    control_reader, control_writer = Pipe()
+    processor = EventProcessor()
+    processor._pipe = events_reader
+    processor._control_pipe = control_reader
+
+    collector = asyncio.create_task(processor._start())
+    while not processor._pollers:
+        await asyncio.sleep(0.001)
+
+    events_writer.close()
+    control_writer.close()
+    await asyncio.wait_for(collector, timeout=5)
@@ -0,0 +1,165 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from agentwatch.export.aggregator import Aggregator
+from agentwatch.export.consts import DEFAULT_AGGREGATOR_PORT
+from agentwatch.export.exporter import EventExporter, parse_export_address
+from agentwatch.export.models import ExportBatch, ExportRecord
+from agentwatch.export.protocol import decode_batch, encode_batch
+from agentwatch.graph.models import LLMNode, ModelGenerateEdge, ToolCallEdge
+from agentwatch.pipes import FrameError
+from agentwatch.webhooks.models import Webhook
+
+
+def _structure(prompt: str):
+    node = LLMNode(node_id="model")
+    edge = ModelGenerateEdge(source_node_id="app", target_node_id="model", prompt=prompt)
+    return [node], [edge]
+
+async def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+def test_parse_export_address():
+    assert parse_export_address("aggregator:9000") == ("aggregator", 9000)
+    assert parse_export_address("aggregator") == ("aggregator", DEFAULT_AGGREGATOR_PORT)
+    assert parse_export_address("[::1]:9000") == ("::1", 9000)
+
+def test_batch_roundtrip():
+    """Test that batches survive encoding and that corrupted frames are rejected"""
+    batch = ExportBatch(host="node-1", records=[ExportRecord(execution_id="run", nodes=[{"node_id": "a", "node_type": "llm"}])])
+    frame = encode_batch(batch)
+    assert decode_batch(frame[4:]) == batch
+
+    with pytest.raises(FrameError):
+        decode_batch(b"not zlib")
+
+@pytest.mark.asyncio
+async def test_export_merges_per_host_and_execution():
+    """Test that the graphs of different hosts and executions are kept apart and rebuilt with their types"""
+    aggregator = Aggregator()
+    port = await aggregator.start("127.0.0.1", 0)
+    exporters = [EventExporter("127.0.0.1", port, linger=0.01, hostname=hostname) for hostname in ("node-1", "node-2")]
+    try:
+        for exporter in exporters:
+            exporter.start()
+        exporters[0].add("run", _structure("first"))
+        exporters[0].add("run", _structure("second"))
+        exporters[0].add("other-run", _structure("third"))
+        exporters[1].add("run", _structure("fourth"))
+
+        await _wait_for(lambda: sum(exporter.stats().sent_records for exporter in exporters) == 4)
+        assert sorted(aggregator.graphs()) == [("node-1", "other-run"), ("node-1", "run"), ("node-2", "run")]
+
+        structure = aggregator.get_structure("node-1", "run")
+        assert structure is not None
+        nodes, edges = structure
+        assert [node.node_id for node in nodes] == ["app", "model"]
+        assert isinstance(edges[0], ModelGenerateEdge)
+        assert [edge.prompt for edge in edges if isinstance(edge, ModelGenerateEdge)] == ["first", "second"]
+        assert aggregator.get_structure("node-3", "run") is None
+    finally:
+        for exporter in exporters:
+            await exporter.close()
+        await aggregator.close()
+
+@pytest.mark.asyncio
+async def test_export_buffers_until_aggregator_is_up():
+    """Test that updates are buffered (up to the buffer size) while the aggregator is unreachable"""
+    aggregator = Aggregator()
+    port = await aggregator.start("127.0.0.1", 0)
+    await aggregator.close()
+
+    exporter = EventExporter("127.0.0.1", port, buffer_size=3, linger=0.01, hostname="node-1")
+    exporter.start()
+    try:
+        for index in range(5):
+            exporter.add("run", ([], [ToolCallEdge(source_node_id="model", target_node_id="tool", tool_input={"index": index})]))
+        stats = exporter.stats()
+        assert (stats.buffered, stats.dropped, stats.connected) == (3, 2, False)
+
+        await aggregator.start("127.0.0.1", port)
+        await _wait_for(lambda: exporter.stats().sent_records == 3, timeout=10)
+
+        structure = aggregator.get_structure("node-1", "run")
+        assert structure is not None
+        assert [edge.tool_input["index"] for edge in structure[1] if isinstance(edge, ToolCallEdge)] == [2, 3, 4]
+    finally:
+        await exporter.close()
+        await aggregator.close()
+
+@pytest.mark.asyncio
+async def test_exporters_authenticate_with_the_token():
+    """Test that only exporters holding the aggregator's token get their updates merged"""
+    aggregator = Aggregator(token="secret")
+    port = await aggregator.start("127.0.0.1", 0)
+    intruder = EventExporter("127.0.0.1", port, linger=0.01, hostname="intruder", token="guess")
+    exporter = EventExporter("127.0.0.1", port, linger=0.01, hostname="node-1", token="secret")
+    try:
+        for each in (intruder, exporter):
+            each.start()
+            each.add("run", _structure("prompt"))
+
+        await _wait_for(lambda: exporter.stats().sent_records == 1 and aggregator.stats().rejected_connections >= 1)
+        assert aggregator.graphs() == [("node-1", "run")]
+        assert intruder.stats().sent_records == 0
+    finally:
+        await intruder.close(timeout=0.1)
+        await exporter.close()
+        await aggregator.close()
+
+@pytest.mark.asyncio
+async def test_aggregator_requires_a_token_beyond_loopback():
+    with pytest.raises(RuntimeError):
+        await Aggregator().start("0.0.0.0", 0)
+
+def test_aggregator_evicts_least_recently_updated_graphs():
+    aggregator = Aggregator(max_graphs=2)
+    for execution_id in ("first", "second", "first", "third"):
+        record = ExportRecord(execution_id=execution_id, nodes=[{"node_id": "model", "node_type": "llm"}])
+        aggregator.merge(ExportBatch(host="node-1", records=[record]))
+
+    assert aggregator.graphs() == [("node-1", "first"), ("node-1", "third")]
+    assert aggregator.stats().evicted == 1
+
+def test_aggregator_skips_records_sent_again():
+    """Test that a batch resent after a lost acknowledgement doesn't duplicate its edges"""
+    aggregator = Aggregator()
+    records = [ExportRecord(execution_id="run", edges=[edge.model_dump(mode="json")], seq=seq)
+               for seq, edge in enumerate([_structure("first")[1][0], _structure("second")[1][0]], start=1)]
+
+    aggregator.merge(ExportBatch(host="node-1", exporter_id="exporter", records=records[:1]))
+    _, edges = aggregator.merge(ExportBatch(host="node-1", exporter_id="exporter", records=records))
+    assert [edge.prompt for edge in edges] == ["second"]
+
+    # A restarted exporter numbers its records from the start again
+    aggregator.merge(ExportBatch(host="node-1", exporter_id="restarted", records=records[:1]))
+
+    _, edges = aggregator.get_structure("node-1", "run")
+    assert [edge.prompt for edge in edges] == ["first", "second", "first"]
+    assert aggregator.stats().duplicates == 1
+
+@pytest.mark.asyncio
+async def test_aggregator_forwards_merged_updates_to_webhooks():
+    """Test that every merged batch is posted to the webhooks, so the merged graphs can be seen"""
+    aggregator = Aggregator(webhooks=[Webhook(url="http://localhost:8000/api/events")])
+    port = await aggregator.start("127.0.0.1", 0)
+    webhook_handler = aggregator._webhook_handler
+    aggregator._webhook_handler = MagicMock(notify_webhooks=AsyncMock(), close=AsyncMock())
+    exporter = EventExporter("127.0.0.1", port, linger=0.01, hostname="node-1")
+    try:
+        exporter.start()
+        exporter.add("run", _structure("prompt"))
+
+        await _wait_for(lambda: aggregator._webhook_handler.notify_webhooks.await_count == 1)
+        nodes, edges = aggregator._webhook_handler.notify_webhooks.await_args[0][0]
+        assert [node.node_id for node in nodes] == ["model"]
+        assert [edge.prompt for edge in edges] == ["prompt"]
+    finally:
+        await exporter.close()
+        await aggregator.close()
+        await webhook_handler.close()
@@ -0,0 +1,25 @@
+from agentwatch.graph.graph import GraphBuilder
+from agentwatch.graph.models import LatencyStats, LLMNode
+
+
+def _sample(latency_ms: float) -> LatencyStats:
+    latency = LatencyStats()
+    latency.add(latency_ms)
+    return latency
+
+def test_append_nodes_merges_latency():
+    builder = GraphBuilder()
+    builder.append_nodes([LLMNode(node_id="gpt-4", latency=_sample(100))])
+    builder.append_nodes([LLMNode(node_id="gpt-4", latency=_sample(300))])
+    builder.append_nodes([LLMNode(node_id="gpt-4")])
+
+    nodes, _ = builder.get_structure()
+    llm_nodes = [node for node in nodes if node.node_id == "gpt-4"]
+    assert len(llm_nodes) == 1
+
+    latency = llm_nodes[0].latency
+    assert latency is not None
+    assert latency.count == 2
+    assert latency.min_ms == 100 and latency.max_ms == 300
+    assert latency.avg_ms == 200
+    assert latency.last_ms == 300
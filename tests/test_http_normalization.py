@@ -0,0 +1,96 @@
+import timeit
+
+import httpx
+import pytest
+from httpcore import URL, Request, Response
+
+from agentwatch.hooks.http.body import BodyCapture
+from agentwatch.hooks.http.normalization import (format_url, get_header, is_event_stream, normalize_headers,
+                                                 request_data, response_data)
+
+RAW_HEADERS = [
+    (b"Content-Type", b"application/json; charset=utf-8"),
+    (b"Content-Encoding", b"gzip"),
+    (b"X-Request-Id", b"req_0123456789"),
+    (b"Set-Cookie", b"a=1"),
+    (b"Set-Cookie", b"b=2"),
+    (b"Date", b"Sun, 18 Oct 2026 10:00:00 GMT"),
+    (b"Openai-Processing-Ms", b"812"),
+    (b"Strict-Transport-Security", b"max-age=31536000; includeSubDomains; preload"),
+]
+
+def test_normalize_headers_matches_httpx():
+    assert normalize_headers(RAW_HEADERS) == dict(httpx.Headers(RAW_HEADERS))
+
+def test_normalize_headers_non_ascii_value():
+    assert normalize_headers([(b"X-Name", "héllo".encode())]) == {"x-name": "héllo"}
+
+def test_get_header():
+    assert get_header(RAW_HEADERS, b"x-request-id") == b"req_0123456789"
+    assert get_header(RAW_HEADERS, b"set-cookie") == b"a=1"
+    assert get_header(RAW_HEADERS, b"host") is None
+
+def test_is_event_stream():
+    assert is_event_stream([(b"content-type", b"Text/Event-Stream; charset=utf-8")])
+    assert not is_event_stream(RAW_HEADERS)
+    assert not is_event_stream([])
+
+def test_format_url():
+    assert format_url(URL("https://api.openai.com/v1/chat/completions?x=1")) == "https://api.openai.com/v1/chat/completions?x=1"
+    assert format_url(URL("https://api.openai.com:443/v1")) == "https://api.openai.com/v1"
+    assert format_url(URL("http://localhost:8000/mcp")) == "http://localhost:8000/mcp"
+
+def test_request_data():
+    request = Request(b"POST", "https://api.openai.com/v1/chat", headers=RAW_HEADERS, content=b"{}")
+    capture = BodyCapture()
+    capture.feed(b"{}")
+
+    data = request_data(request, capture)
+
+    assert data.method == "POST"
+    assert data.url == "https://api.openai.com/v1/chat"
+    assert data.headers["content-type"] == "application/json; charset=utf-8"
+    assert data.content == b"{}"
+
+def _httpx_response_data(response, content):
+    httpx_response = httpx.Response(status_code=response.status, headers=response.headers, content=content)
+    return {"status_code": httpx_response.status_code, "headers": dict(httpx_response.headers), "body": httpx_response.text}
+
+def test_response_data_matches_httpx():
+    """The raw-header normalization yields what going through httpx objects would"""
+    content = b'{"id": "chatcmpl-1", "choices": []}' * 20
+    headers = [header for header in RAW_HEADERS if header[0] != b"Content-Encoding"]
+    response = Response(200, headers=headers, content=content)
+    capture = BodyCapture()
+    capture.feed(content)
+
+    data = response_data(response, capture)
+
+    expected = _httpx_response_data(response, content)
+    assert data.status_code == expected["status_code"]
+    # httpx adds a content-length of its own
+    assert data.headers == {name: value for name, value in expected["headers"].items() if name != "content-length"}
+    # The body is only decoded when needed
+    assert data.body is None
+    assert data.text == expected["body"]
+
+@pytest.mark.benchmark
+def test_normalization_microbenchmark():
+    """Times the raw-header normalization against going through httpx objects, run with `-m benchmark -s`"""
+    content = b'{"id": "chatcmpl-1", "choices": []}' * 20
+    headers = [header for header in RAW_HEADERS if header[0] != b"Content-Encoding"]
+    response = Response(200, headers=headers, content=content)
+
+    def fast():
+        capture = BodyCapture()
+        capture.feed(content)
+        response_data(response, capture)
+
+    def via_httpx():
+        _httpx_response_data(response, content)
+
+    iterations = 2000
+    fast_time = min(timeit.repeat(fast, number=iterations, repeat=3))
+    httpx_time = min(timeit.repeat(via_httpx, number=iterations, repeat=3))
+
+    print(f"normalization: {fast_time / iterations * 1e6:.1f}us, via httpx: {httpx_time / iterations * 1e6:.1f}us")
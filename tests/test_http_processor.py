@@ -1,14 +1,24 @@
 
+import gzip
+import multiprocessing
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch
 
 import pytest
 
-from agentwatch.enums import HookEventType
+from agentwatch.enums import CommandAction, HookEventType
 from agentwatch.graph.consts import APP_NODE_ID
-from agentwatch.graph.models import LLMNode, ModelGenerateEdge, ToolCallEdge, ToolNode
+from agentwatch.graph.models import (LLMNode, McpCallEdge, MCPMethodType, MCPServerNode, ModelGenerateEdge, ToolCallEdge,
+                                     ToolNode)
+from agentwatch.hooks.http.models import HttpExchange, HTTPRequestData, HTTPResponseData, SSEFrame
 from agentwatch.llm.anthropic_models import AnthropicRequestModel, AnthropicResponseModel
 from agentwatch.llm.enums import Role
+from agentwatch.llm.jsonrpc_models import (InputSchema, JSONRPCRequest, JSONRPCResponse, Params, ToolCallResult,
+                                          ToolListResult)
+from agentwatch.llm.jsonrpc_models import Tool as McpTool
 from agentwatch.llm.models import AssistantMessage, TextContent, Tool, ToolUse, UserMessage
+from agentwatch.models import Command
 from agentwatch.processing.http_processing import HttpProcessor
 
 
@@ -47,7 +57,8 @@ def sample_message_response():
 def test_init(http_processor):
     assert http_processor._supported_events == [
         HookEventType.HTTP_REQUEST,
-        HookEventType.HTTP_RESPONSE
+        HookEventType.HTTP_RESPONSE,
+        HookEventType.HTTP_RESPONSE_DELTA
     ]
 
 @pytest.mark.asyncio
@@ -156,4 +167,178 @@ def test_parse_nodes_and_edges_message_response(http_processor, sample_message_r
         edge.target_node_id == APP_NODE_ID and 
         edge.prompt == "Hello there"
         for edge in edges
-    )
\ No newline at end of file
+    )
+class RecordingExecutor(ProcessPoolExecutor):
+    def __init__(self):
+        super().__init__(1, mp_context=multiprocessing.get_context("spawn"))
+        self.submitted = 0
+
+    def submit(self, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(*args, **kwargs)
+
+@pytest.mark.asyncio
+async def test_large_payloads_are_parsed_in_process_pool(sample_message_request, caplog):
+    """Test that only bodies above the threshold are parsed by the pool, yielding the same structure"""
+    request_data = HTTPRequestData(method="POST", url="http://test.com", headers={}, body=sample_message_request.model_dump_json())
+
+    with RecordingExecutor() as executor:
+        inline = await HttpProcessor(executor=executor, offload_threshold=1024 * 1024).process(HookEventType.HTTP_REQUEST, request_data.model_dump())
+        assert executor.submitted == 0
+
+        offloaded = await HttpProcessor(executor=executor, offload_threshold=16).process(HookEventType.HTTP_REQUEST, request_data.model_dump())
+        assert executor.submitted == 1
+
+    assert "parsing inline" not in caplog.text
+    assert offloaded is not None and inline is not None
+    assert [type(node) for node in offloaded[0]] == [type(node) for node in inline[0]]
+    assert [edge.model_dump(exclude={"created_at"}) for edge in offloaded[1]] == \
+           [edge.model_dump(exclude={"created_at"}) for edge in inline[1]]
+
+@pytest.mark.asyncio
+async def test_process_gzip_response_content(http_processor, sample_message_response):
+    response_data = HTTPResponseData(
+        status_code=200,
+        headers={"content-type": "application/json", "content-encoding": "gzip"},
+        content=gzip.compress(sample_message_response.model_dump_json().encode())
+    )
+
+    command = Command(execution_id="test", action=CommandAction.EVENT, params=response_data.model_dump())
+    restored = Command.model_validate_json(command.model_dump_json())
+
+    result = await http_processor.process(HookEventType.HTTP_RESPONSE, restored.params)
+
+    assert result is not None
+    _, edges = result
+    assert any(isinstance(edge, ModelGenerateEdge) for edge in edges)
+
+@pytest.mark.asyncio
+async def test_exchange_pairs_response_with_request(http_processor, sample_message_request, sample_message_response):
+    exchange = HttpExchange()
+    request_data = HTTPRequestData(method="POST",
+                                   url="https://api.anthropic.com/v1/messages",
+                                   headers={},
+                                   body=sample_message_request.model_dump_json(),
+                                   exchange_id=exchange.exchange_id)
+    await http_processor.process(HookEventType.HTTP_REQUEST, request_data.model_dump())
+
+    exchange.mark_last_byte()
+    response_data = HTTPResponseData(status_code=200,
+                                     headers={},
+                                     body=sample_message_response.model_dump_json(),
+                                     exchange_id=exchange.exchange_id,
+                                     timings=exchange.timings)
+    result = await http_processor.process(HookEventType.HTTP_RESPONSE, response_data.model_dump())
+
+    assert result is not None
+    nodes, edges = result
+    assert all(edge.exchange_id == exchange.exchange_id for edge in edges)
+    assert all(edge.latency_ms == exchange.timings.latency_ms for edge in edges)
+
+    # The model node of the request carries the exchange's latency
+    assert len(nodes) == 1
+    assert nodes[0].node_id == "gpt-4"
+    assert nodes[0].latency is not None and nodes[0].latency.count == 1
+    assert not http_processor._pending_exchanges
+
+@pytest.mark.asyncio
+async def test_jsonrpc_response_gets_its_request(http_processor):
+    exchange = HttpExchange()
+    request_body = JSONRPCRequest(method=MCPMethodType.TOOL_CALL,
+                                  params=Params(name="search", arguments={"q": "python"}),
+                                  jsonrpc="2.0",
+                                  id=1)
+    request_data = HTTPRequestData(method="POST",
+                                   url="http://localhost:8000/mcp",
+                                   headers={"host": "localhost:8000"},
+                                   body=request_body.model_dump_json(),
+                                   exchange_id=exchange.exchange_id)
+    await http_processor.process(HookEventType.HTTP_REQUEST, request_data.model_dump())
+
+    # Only the parsed request waits for the response, not its body
+    pending = http_processor._pending_exchanges[exchange.exchange_id]
+    assert pending.request == {"method": "POST", "url": "http://localhost:8000/mcp",
+                               "headers": {"host": "localhost:8000"}, "exchange_id": exchange.exchange_id}
+    assert pending.context == [request_body]
+
+    response_body = JSONRPCResponse(jsonrpc="2.0", id=1, result=ToolCallResult(content=[], isError=False))
+    response_data = HTTPResponseData(status_code=200,
+                                     headers={"host": "localhost:8000"},
+                                     body=response_body.model_dump_json(),
+                                     exchange_id=exchange.exchange_id)
+
+    with patch.object(JSONRPCResponse, "attach_request", autospec=True, side_effect=JSONRPCResponse.attach_request) as attach:
+        await http_processor.process(HookEventType.HTTP_RESPONSE, response_data.model_dump())
+
+    response_model = attach.call_args[0][0]
+    assert response_model.request == request_body
+
+def _mcp_results() -> list[str]:
+    tools = ToolListResult(tools=[McpTool(name="search", description="Searches", inputSchema=InputSchema(properties={}, title="search"))])
+    return [JSONRPCResponse(jsonrpc="2.0", id=1, result=tools).model_dump_json(exclude_none=True),
+            JSONRPCResponse(jsonrpc="2.0", id=2, result=ToolCallResult(content=[], isError=False)).model_dump_json(exclude_none=True)]
+
+@pytest.mark.asyncio
+async def test_every_message_of_an_event_stream_is_processed(http_processor):
+    """Test that a (legacy MCP) event stream yields the structure of each of its messages"""
+    body = "event: endpoint\ndata: /messages?session_id=1\n\n" + "".join(f"event: message\ndata: {result}\n\n" for result in _mcp_results())
+    response = HTTPResponseData(status_code=200, headers={"content-type": "text/event-stream", "host": "mcp.local"}, body=body)
+
+    result = await http_processor.process(HookEventType.HTTP_RESPONSE, response.model_dump())
+
+    assert result is not None
+    nodes, edges = result
+    assert any(isinstance(node, MCPServerNode) for node in nodes)
+    assert [node.node_id for node in nodes if isinstance(node, ToolNode)] == ["search"]
+    assert [edge.method for edge in edges if isinstance(edge, McpCallEdge)] == [MCPMethodType.TOOL_LIST, MCPMethodType.TOOL_CALL]
+
+@pytest.mark.asyncio
+async def test_stream_deltas_and_remaining_frames_are_processed(http_processor):
+    """Test that the messages reported in a delta are processed, and that the response only processes its own frames"""
+    headers = {"content-type": "text/event-stream", "host": "mcp.local"}
+    tool_list, tool_call = _mcp_results()
+
+    delta = {"status_code": 200, "headers": headers, "frames": [SSEFrame(data=tool_list).model_dump()]}
+    nodes, edges = await http_processor.process(HookEventType.HTTP_RESPONSE_DELTA, delta)
+    assert [edge.method for edge in edges] == [MCPMethodType.TOOL_LIST]
+
+    # The frames are what the deltas didn't report
+    response = HTTPResponseData(status_code=200, headers=headers, frames=[SSEFrame(data=tool_call)])
+    nodes, edges = await http_processor.process(HookEventType.HTTP_RESPONSE, response.model_dump())
+    assert [edge.method for edge in edges] == [MCPMethodType.TOOL_CALL]
+
+@pytest.mark.asyncio
+async def test_exchange_survives_a_stream_split_into_deltas(http_processor):
+    """Test that deltas get the context of their request and the response still pairs the exchange and records its latency"""
+    exchange = HttpExchange()
+    headers = {"content-type": "text/event-stream", "host": "localhost:8000"}
+    request_body = JSONRPCRequest(method=MCPMethodType.TOOL_LIST, jsonrpc="2.0", id=1)
+    request_data = HTTPRequestData(method="POST",
+                                   url="http://localhost:8000/mcp",
+                                   headers={"host": "localhost:8000"},
+                                   body=request_body.model_dump_json(),
+                                   exchange_id=exchange.exchange_id)
+    await http_processor.process(HookEventType.HTTP_REQUEST, request_data.model_dump())
+
+    tool_list, _ = _mcp_results()
+    delta = {"status_code": 200, "headers": headers, "exchange_id": exchange.exchange_id,
+             "frames": [SSEFrame(data=tool_list).model_dump()]}
+    with patch.object(JSONRPCResponse, "attach_request", autospec=True, side_effect=JSONRPCResponse.attach_request) as attach:
+        _, edges = await http_processor.process(HookEventType.HTTP_RESPONSE_DELTA, delta)
+
+    assert attach.call_args[0][0].request == request_body
+    assert edges and all(edge.exchange_id == exchange.exchange_id for edge in edges)
+    assert exchange.exchange_id in http_processor._pending_exchanges
+
+    # Every message was reported in the delta, the response only closes the exchange
+    exchange.mark_last_byte()
+    response = HTTPResponseData(status_code=200, headers=headers, exchange_id=exchange.exchange_id,
+                                timings=exchange.timings, frames=[])
+    result = await http_processor.process(HookEventType.HTTP_RESPONSE, response.model_dump())
+
+    assert result is not None
+    nodes, edges = result
+    assert not edges
+    assert len(nodes) == 1 and isinstance(nodes[0], MCPServerNode)
+    assert nodes[0].latency is not None and nodes[0].latency.count == 1
+    assert not http_processor._pending_exchanges
@@ -4,6 +4,7 @@ import pytest
 from httpcore import Request, Response
 
 from agentwatch.hooks.http.httpcore_hook import HttpcoreHook
+from agentwatch.hooks.http.models import HttpSamplingRule
 
 
 @pytest.fixture
@@ -16,6 +17,7 @@ def callback_handler():
 @pytest.fixture
 def httpcore_hook(callback_handler):
     hook = HttpcoreHook(callback_handler)
+    hook.add_intercept_rule("api.example.com")
     return hook
 
 def test_init(callback_handler):
@@ -34,20 +36,6 @@ def test_request_callback_sync(httpcore_hook, callback_handler):
         expected_event
     )
 
-def test_response_callback_sync(httpcore_hook, callback_handler):
-    request = Request(b"GET", "https://api.example.com")
-    request.headers = [(b"Content-Type", b"application/json")]
-    response = Response(200)
-    response.headers = [(b"Content-Type", b"application/json")]
-    expected_event = httpcore_hook._normalize_response_sync(response)
-    
-    httpcore_hook._response_callback_sync(response)
-    
-    callback_handler.on_hook_callback_sync.assert_called_once_with(
-        httpcore_hook, 
-        expected_event
-    )
-
 @pytest.mark.asyncio
 async def test_request_callback(httpcore_hook, callback_handler):
     request = Request("GET", "https://api.example.com")
@@ -60,14 +48,162 @@ async def test_request_callback(httpcore_hook, callback_handler):
         expected_event
     )
 
+def test_non_matching_request_is_passed_through(httpcore_hook, callback_handler):
+    original = Response(200, content=b"data")
+    httpcore_hook._original_handle_request = Mock(return_value=original)
+
+    request = Request(b"GET", "https://s3.amazonaws.com/bucket/key")
+    response = httpcore_hook._intercepted_handle_request(Mock(), request)
+
+    assert response is original
+    callback_handler.on_hook_callback_sync.assert_not_called()
+
+def test_intercepted_handle_request_streams_before_emitting(httpcore_hook, callback_handler):
+    chunks = [b'{"hello": ', b'"world"}']
+    original = Response(200, headers=[(b"Content-Type", b"application/json")], content=iter(chunks))
+    httpcore_hook._original_handle_request = Mock(return_value=original)
+
+    request = Request(b"POST", "https://api.example.com", content=b"{}")
+    response = httpcore_hook._intercepted_handle_request(Mock(), request)
+
+    # Only the request has been reported, the body is still unread
+    assert callback_handler.on_hook_callback_sync.call_count == 1
+
+    received = [chunk for chunk in response.iter_stream()]
+    response.close()
+
+    assert received == chunks
+    assert callback_handler.on_hook_callback_sync.call_count == 2
+    response_event = callback_handler.on_hook_callback_sync.call_args[0][1]
+    assert response_event.data["content"] == b'{"hello": "world"}'
+
 @pytest.mark.asyncio
-async def test_response_callback(httpcore_hook, callback_handler):
-    response = Response(200)
-    expected_event = httpcore_hook._normalize_response_sync(response)
-    
-    await httpcore_hook._response_callback(response)
-    
-    callback_handler.on_hook_callback.assert_awaited_once_with(
-        httpcore_hook, 
-        expected_event
-    )
\ No newline at end of file
+async def test_async_event_stream_emits_single_response(httpcore_hook, callback_handler):
+    async def stream():
+        for i in range(3):
+            yield f"data: {i}\n\n".encode()
+
+    original = Response(200, headers=[(b"Content-Type", b"text/event-stream")], content=stream())
+    httpcore_hook._original_handle_async_request = AsyncMock(return_value=original)
+
+    request = Request(b"POST", "https://api.example.com", headers=[(b"Host", b"api.example.com")], content=b"{}")
+    response = await httpcore_hook._intercepted_handle_async_request(Mock(), request)
+    received = [chunk async for chunk in response.aiter_stream()]
+    await response.aclose()
+
+    assert len(received) == 3
+    # One request and one consolidated response, regardless of the number of chunks
+    assert callback_handler.on_hook_callback.await_count == 2
+    response_event = callback_handler.on_hook_callback.await_args[0][1]
+    assert response_event.data["content"] == b"data: 0\n\ndata: 1\n\ndata: 2\n\n"
+
+@pytest.mark.asyncio
+async def test_event_stream_deltas_and_response_split_the_messages(httpcore_hook, callback_handler):
+    async def stream():
+        for i in range(3):
+            yield f"data: {i}\n\n".encode()
+
+    httpcore_hook.set_stream_deltas(size_bytes=16)
+    original = Response(200, headers=[(b"Content-Type", b"text/event-stream")], content=stream())
+    httpcore_hook._original_handle_async_request = AsyncMock(return_value=original)
+
+    request = Request(b"POST", "https://api.example.com", headers=[(b"Host", b"api.example.com")], content=b"{}")
+    response = await httpcore_hook._intercepted_handle_async_request(Mock(), request)
+    [chunk async for chunk in response.aiter_stream()]
+    await response.aclose()
+
+    _, delta, response_event = [call[0][1] for call in callback_handler.on_hook_callback.await_args_list]
+    # Every message is reported once, either in a delta or in the response
+    assert [frame["data"] for frame in delta.data["frames"]] == ["0", "1"]
+    assert [frame["data"] for frame in response_event.data["frames"]] == ["2"]
+    # The body isn't shipped a second time, only its size
+    assert response_event.data["content"] is None
+    assert response_event.data["content_size"] == 27
+
+@pytest.mark.asyncio
+async def test_exchange_is_correlated_and_timed(httpcore_hook, callback_handler):
+    async def stream():
+        yield b'{"hello": '
+        yield b'"world"}'
+
+    original = Response(200, headers=[(b"Content-Type", b"application/json")], content=stream())
+    httpcore_hook._original_handle_async_request = AsyncMock(return_value=original)
+
+    request = Request(b"POST", "https://api.example.com", content=b"{}")
+    response = await httpcore_hook._intercepted_handle_async_request(Mock(), request)
+    await response.aread()
+    await response.aclose()
+
+    request_event, response_event = [call[0][1] for call in callback_handler.on_hook_callback.await_args_list]
+    assert request_event.data["exchange_id"] is not None
+    assert response_event.data["exchange_id"] == request_event.data["exchange_id"]
+    assert response_event.data["request_bytes"] == 2
+    assert response_event.data["content_size"] == 18
+
+    timings = response_event.data["timings"]
+    assert timings["request_start"] <= timings["headers_received"] <= timings["first_byte"] <= timings["last_byte"]
+
+def test_connection_reuse_is_tracked_per_host(httpcore_hook, callback_handler):
+    def handle_request(conn_self, request):
+        trace = request.extensions["trace"]
+        if conn_self.new:
+            trace("connection.connect_tcp.started", {})
+            trace("connection.connect_tcp.complete", {})
+            trace("connection.start_tls.started", {})
+            trace("connection.start_tls.complete", {})
+        return Response(200, content=b"{}")
+
+    httpcore_hook._original_handle_request = handle_request
+    user_trace = Mock()
+
+    for new in [True, False, False]:
+        request = Request(b"GET", "https://api.example.com", extensions={"trace": user_trace})
+        response = httpcore_hook._intercepted_handle_request(Mock(new=new), request)
+        response.read()
+        response.close()
+
+    # The caller's tracer keeps receiving events
+    assert user_trace.call_count == 4
+
+    stats = httpcore_hook.connection_stats()["api.example.com"]
+    assert stats.requests == 3
+    assert stats.new_connections == 1
+    assert stats.reused_connections == 2
+    assert stats.phases["connection.start_tls"].count == 1
+
+    response_event = callback_handler.on_hook_callback_sync.call_args[0][1]
+    assert response_event.data["connection"]["reused"] is True
+
+@pytest.mark.asyncio
+async def test_sampled_out_exchange_is_only_counted(httpcore_hook, callback_handler):
+    async def stream():
+        yield b"{}"
+
+    httpcore_hook.set_sampling_rules([HttpSamplingRule(host="api.example.com", rate=0)])
+    httpcore_hook._original_handle_async_request = AsyncMock(return_value=Response(200, content=stream()))
+
+    request = Request(b"POST", "https://api.example.com", content=b"{}")
+    response = await httpcore_hook._intercepted_handle_async_request(Mock(), request)
+    assert await response.aread() == b"{}"
+    await response.aclose()
+
+    callback_handler.on_hook_callback.assert_not_awaited()
+
+    stats = httpcore_hook.traffic_stats()["api.example.com"]
+    assert stats.requests == 1
+    assert stats.sampled_out == 1
+    assert stats.latency.count == 1
+
+def test_sampled_exchange_is_captured_and_counted(httpcore_hook, callback_handler):
+    httpcore_hook._original_handle_request = Mock(return_value=Response(200, content=b"{}"))
+
+    response = httpcore_hook._intercepted_handle_request(Mock(), Request(b"GET", "https://api.example.com"))
+    response.read()
+    response.close()
+
+    # Request and response
+    assert callback_handler.on_hook_callback_sync.call_count == 2
+
+    stats = httpcore_hook.traffic_stats()["api.example.com"]
+    assert stats.sampled == 1
+    assert stats.latency.count == 1
@@ -0,0 +1,65 @@
+import pytest
+
+from agentwatch.hooks.http.intercept_matcher import InterceptMatcher, parent_domains, parse_host_pattern
+from agentwatch.hooks.http.models import HttpInterceptRule
+
+
+@pytest.fixture
+def matcher():
+    return InterceptMatcher([
+        HttpInterceptRule(host="api.openai.com"),
+        HttpInterceptRule(host="*.anthropic.com"),
+        HttpInterceptRule(host="localhost", port=8000),
+        HttpInterceptRule(host="internal.example.com", path_prefix="/llm/"),
+    ])
+
+def test_exact_host(matcher):
+    assert matcher.matches(b"api.openai.com")
+    assert matcher.matches(b"API.OpenAI.com")
+    assert not matcher.matches(b"openai.com")
+    assert not matcher.matches(b"s3.amazonaws.com")
+
+def test_wildcard_host(matcher):
+    assert matcher.matches(b"api.anthropic.com")
+    assert matcher.matches(b"eu.api.anthropic.com")
+    assert not matcher.matches(b"anthropic.com")
+    assert not matcher.matches(b"notanthropic.com")
+
+def test_port_constraint(matcher):
+    assert matcher.matches(b"localhost", 8000, scheme=b"http")
+    assert not matcher.matches(b"localhost", 9000, scheme=b"http")
+    assert not matcher.matches(b"localhost", scheme=b"http")
+
+def test_path_prefix_constraint(matcher):
+    assert matcher.matches(b"internal.example.com", target=b"/llm/chat?x=1")
+    assert not matcher.matches(b"internal.example.com", target=b"/files/1")
+
+def test_default_port_by_scheme():
+    matcher = InterceptMatcher([HttpInterceptRule(host="api.openai.com", port=443)])
+
+    assert matcher.matches(b"api.openai.com", None, scheme=b"https")
+    assert not matcher.matches(b"api.openai.com", None, scheme=b"http")
+
+def test_unconstrained_rule_wins():
+    matcher = InterceptMatcher([
+        HttpInterceptRule(host="localhost", port=8000),
+        HttpInterceptRule(host="localhost"),
+    ])
+
+    assert matcher.matches(b"localhost", 1234)
+
+def test_match_all():
+    matcher = InterceptMatcher([HttpInterceptRule(host="*", path_prefix="/v1/")])
+
+    assert matcher.matches(b"anything.com", target=b"/v1/chat")
+    assert not matcher.matches(b"anything.com", target=b"/v2/chat")
+
+def test_empty():
+    assert not InterceptMatcher([]).matches(b"api.openai.com")
+
+def test_host_patterns():
+    assert parse_host_pattern(" API.OpenAI.com ") == (b"api.openai.com", False)
+    assert parse_host_pattern("*.anthropic.com") == (b"anthropic.com", True)
+    assert parse_host_pattern("*") == (None, False)
+    assert list(parent_domains(b"api.eu.example.com")) == [b"eu.example.com", b"example.com", b"com"]
+    assert list(parent_domains(b"localhost")) == []
@@ -0,0 +1,34 @@
+import time
+
+from agentwatch.enums import OverheadStage
+from agentwatch.metrics import Histogram, OverheadMetrics
+from agentwatch.models import HistogramSnapshot
+
+
+def test_histogram_buckets():
+    histogram = Histogram(bounds_us=(10, 100))
+    for duration_us in [1, 10, 50, 1000]:
+        histogram.record_ns(duration_us * 1000)
+
+    snapshot = histogram.snapshot()
+    assert snapshot.counts == [2, 1, 1]
+    assert snapshot.count == 4
+    assert snapshot.total_us == 1061
+    assert snapshot.max_us == 1000
+
+def test_percentile():
+    snapshot = HistogramSnapshot(bounds_us=[10, 100, 1000], counts=[90, 9, 1, 0], count=100, total_us=2000, max_us=700)
+
+    assert snapshot.percentile(50) == 10
+    assert snapshot.percentile(99) == 100
+    # Capped by the largest sample
+    assert snapshot.percentile(100) == 700
+    assert HistogramSnapshot(bounds_us=[10], counts=[0, 0]).percentile(99) == 0
+
+def test_overhead_metrics_snapshot_skips_empty_stages():
+    metrics = OverheadMetrics()
+    metrics.record(OverheadStage.NORMALIZE, time.perf_counter_ns())
+
+    snapshot = metrics.snapshot()
+    assert list(snapshot) == ["normalize"]
+    assert snapshot["normalize"].count == 1
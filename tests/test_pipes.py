@@ -1,11 +1,14 @@
+import asyncio
 import multiprocessing
+import struct
 from multiprocessing import Pipe
 
 import pytest
 from pydantic import BaseModel
 
-from agentwatch.models import CommandResponse
-from agentwatch.pipes import Pipes
+from agentwatch.enums import CommandAction
+from agentwatch.models import Command, CommandResponse
+from agentwatch.pipes import FrameError, FrameReader, Pipes
 
 
 class MockPayload(BaseModel):
@@ -19,8 +22,91 @@ def test_write_payload_sync():
     
     Pipes.write_payload_sync(parent_conn, payload)
     
-    received = child_conn.recv()
-    assert received == payload.model_dump_json()
+    received = Pipes.decode_frame(child_conn.recv_bytes())
+    assert received == [payload.model_dump()]
+
+@pytest.mark.asyncio
+async def test_write_and_read_frame():
+    """Test that a batch of commands travels as a single frame."""
+    parent_conn, child_conn = Pipe()
+    commands = [
+        Command(execution_id="test", action=CommandAction.EVENT, params={"content": b"\x00\xff", "index": i})
+        for i in range(100)
+    ]
+
+    Pipes.write_frame_sync(parent_conn, commands)
+
+    assert await Pipes.wait_readable(child_conn, timeout=1)
+    received = Pipes.read_available(FrameReader(child_conn))
+    assert [Command.model_validate(payload) for payload in received] == commands
+    assert not child_conn.poll()
+
+@pytest.mark.asyncio
+async def test_read_available_drains_every_frame():
+    """Test that a single wakeup decodes all the frames waiting in the pipe, skipping corrupted ones."""
+    parent_conn, child_conn = Pipe()
+    for i in range(5):
+        Pipes.write_frame_sync(parent_conn, [MockPayload(message="frame", value=i)])
+    parent_conn.send_bytes(b"\x09garbage")
+    Pipes.write_frame_sync(parent_conn, [MockPayload(message="frame", value=5)])
+
+    reader = FrameReader(child_conn)
+    received = Pipes.read_available(reader)
+    assert [payload["value"] for payload in received] == list(range(6))
+    assert Pipes.read_available(reader) == []
+
+def test_read_available_skips_partial_frame():
+    """Test that a frame still being written is buffered instead of blocking the reader."""
+    parent_conn, child_conn = Pipe()
+    reader = FrameReader(child_conn)
+    frame = Pipes.encode_frame([MockPayload(message="large", value=1)] * 1000)
+    message = struct.pack("!i", len(frame)) + frame
+
+    parent_conn._send(message[:len(message) // 2])
+    assert Pipes.read_available(reader) == []
+
+    parent_conn._send(message[len(message) // 2:])
+    Pipes.write_frame_sync(parent_conn, [MockPayload(message="next", value=2)])
+    received = Pipes.read_available(reader)
+    assert [payload["value"] for payload in received] == [1] * 1000 + [2]
+
+def test_frame_reader_eof():
+    """Test that the reader reports the writer closing once the complete frames were read."""
+    parent_conn, child_conn = Pipe()
+    reader = FrameReader(child_conn)
+    Pipes.write_frame_sync(parent_conn, [MockPayload(message="last", value=1)])
+    parent_conn.close()
+
+    assert [payload["value"] for payload in Pipes.read_available(reader)] == [1]
+    with pytest.raises(EOFError):
+        Pipes.read_available(reader)
+    reader.close()
+
+@pytest.mark.asyncio
+async def test_wait_readable_timeout():
+    """Test that waiting on an idle pipe times out without an executor thread."""
+    parent_conn, child_conn = Pipe()
+
+    assert not await Pipes.wait_readable(child_conn, timeout=0.01)
+
+def test_write_error_is_raised():
+    """Test that a frame the pipe didn't take is reported to the writer."""
+    parent_conn, child_conn = Pipe()
+    child_conn.close()
+
+    with pytest.raises(OSError):
+        Pipes.write_frame_sync(parent_conn, [MockPayload(message="lost", value=1)])
+
+def test_decode_invalid_frame():
+    """Test that corrupted frames are rejected."""
+    frame = Pipes.encode_frame([MockPayload(message="test", value=1)])
+
+    with pytest.raises(FrameError):
+        Pipes.decode_frame(frame[:2])
+    with pytest.raises(FrameError):
+        Pipes.decode_frame(b"\x09" + frame[1:])
+    with pytest.raises(FrameError):
+        Pipes.decode_frame(frame[:-3])
 
 @pytest.mark.asyncio
 async def test_write_payload_async():
@@ -33,6 +119,17 @@ async def test_write_payload_async():
     received = child_conn.recv()
     assert received == payload.model_dump_json()
 
+@pytest.mark.asyncio
+async def test_concurrent_writes_to_one_pipe():
+    """Test that payloads written concurrently to the same pipe (i.e. a response and an ack) all get through."""
+    parent_conn, child_conn = Pipe()
+    payloads = [MockPayload(message="concurrent", value=value) for value in range(3)]
+
+    await asyncio.wait_for(asyncio.gather(*(Pipes.write_payload(parent_conn, payload) for payload in payloads)), timeout=1)
+
+    assert sorted(child_conn.recv() for _ in payloads) == sorted(payload.model_dump_json() for payload in payloads)
+    assert not Pipes._fd_waiters
+
 @pytest.mark.asyncio
 async def test_read_payload():
     """Test reading payload asynchronously."""
@@ -59,10 +156,17 @@ def test_read_response_success():
     assert result.success is True
     assert result.data == "Operation completed"
 
+def test_read_response_timeout():
+    """Test that reading a response honors the timeout instead of blocking."""
+    parent_conn, child_conn = Pipe()
+
+    with pytest.raises(TimeoutError):
+        Pipes.read_response(parent_conn, timeout=0.01)
+
 def multiprocess_communication_worker(send_conn, receive_conn):
     """Simulated worker process for multiprocessing communication test."""
     # Simulate receiving a payload
-    payload = receive_conn.recv()
+    [payload] = Pipes.decode_frame(receive_conn.recv_bytes())
     
     # Create and send a response
     response = CommandResponse(
@@ -102,7 +206,7 @@ def test_multiprocessing_communication():
         # Assertions
         assert response is not None
         assert response.success is True
-        assert response.data == "Processed payload: " + payload.model_dump_json()
+        assert response.data == f"Processed payload: {payload.model_dump()}"
 
     finally:
         # Clean up
@@ -0,0 +1,43 @@
+from multiprocessing import Pipe
+
+import pytest
+
+from agentwatch.models import CommandResponse, EventAck
+from agentwatch.response_dispatcher import ResponseDispatcher
+
+
+def test_dispatch_out_of_order():
+    """Test that responses complete the future of their own callback, in whatever order they arrive"""
+    reader, writer = Pipe()
+    acks: list[EventAck] = []
+    dispatcher = ResponseDispatcher(reader, on_ack=acks.append)
+    dispatcher.start()
+
+    try:
+        first = dispatcher.register("first")
+        second = dispatcher.register("second")
+
+        writer.send(CommandResponse(success=True, callback_id="second", data=2).model_dump_json())
+        writer.send(CommandResponse(success=True, ack=EventAck(seq=10, processed=10)).model_dump_json())
+        writer.send(CommandResponse(success=True, callback_id="unknown").model_dump_json())
+        writer.send(CommandResponse(success=True, callback_id="first", data=1).model_dump_json())
+
+        assert first.result(timeout=5).data == 1
+        assert second.result(timeout=5).data == 2
+        assert acks == [EventAck(seq=10, processed=10)]
+    finally:
+        dispatcher.stop(timeout=5)
+
+def test_stop_fails_pending():
+    """Test that waiters don't hang once the dispatcher stops"""
+    reader, _ = Pipe()
+    dispatcher = ResponseDispatcher(reader)
+    dispatcher.start()
+
+    future = dispatcher.register("pending")
+    dispatcher.stop(timeout=5)
+
+    with pytest.raises(ConnectionError):
+        future.result(timeout=5)
+    with pytest.raises(RuntimeError):
+        dispatcher.register("late")
@@ -0,0 +1,43 @@
+from unittest.mock import patch
+
+from agentwatch.enums import SamplingDecision
+from agentwatch.hooks.http.models import HttpSamplingRule
+from agentwatch.hooks.http.sampling import Sampler, TokenBucket
+
+
+def test_hosts_without_rules_are_sampled():
+    sampler = Sampler([HttpSamplingRule(host="api.openai.com", rate=0)])
+    assert sampler.sample(b"api.anthropic.com") == SamplingDecision.SAMPLED
+    assert sampler.sample(b"api.openai.com") == SamplingDecision.SAMPLED_OUT
+
+def test_most_specific_rule_wins():
+    sampler = Sampler([
+        HttpSamplingRule(host="*", rate=0),
+        HttpSamplingRule(host="*.example.com", rate=1),
+        HttpSamplingRule(host="noisy.example.com", rate=0),
+    ])
+
+    assert sampler.sample(b"api.example.com") == SamplingDecision.SAMPLED
+    assert sampler.sample(b"NOISY.example.com") == SamplingDecision.SAMPLED_OUT
+    assert sampler.sample(b"other.com") == SamplingDecision.SAMPLED_OUT
+
+def test_sample_rate():
+    sampler = Sampler([HttpSamplingRule(host="*", rate=0.25)])
+    with patch("agentwatch.hooks.http.sampling.random.random", side_effect=[0.1, 0.3, 0.24, 0.9]):
+        decisions = [sampler.sample(b"api.example.com") for _ in range(4)]
+
+    assert decisions.count(SamplingDecision.SAMPLED) == 2
+
+def test_rate_limit():
+    sampler = Sampler([HttpSamplingRule(host="*", max_per_second=1, burst=2)])
+    decisions = [sampler.sample(b"api.example.com") for _ in range(3)]
+
+    assert decisions == [SamplingDecision.SAMPLED, SamplingDecision.SAMPLED, SamplingDecision.RATE_LIMITED]
+
+def test_token_bucket_refills():
+    with patch("agentwatch.hooks.http.sampling.time.monotonic", side_effect=[0, 0, 0, 0.5, 1.0]):
+        bucket = TokenBucket(rate=2, burst=1)
+        assert bucket.try_acquire()
+        assert not bucket.try_acquire()
+        assert bucket.try_acquire()
+        assert bucket.try_acquire()
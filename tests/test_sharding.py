@@ -0,0 +1,270 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from agentwatch.enums import BacklogPolicy, CommandAction, HookEventType
+from agentwatch.event_processor import EventProcessor
+from agentwatch.graph.models import LLMNode
+from agentwatch.hooks.models import HookEvent
+from agentwatch.models import Command, EventAck
+from agentwatch.sharding import DeliveryTracker, EventShard, shard_index, shard_key
+
+
+def _event(execution_id: str, exchange_id: str, seq: int) -> Command:
+    event = HookEvent(event_type=HookEventType.HTTP_REQUEST, data={"url": "http://test.com", "exchange_id": exchange_id})
+    return Command(execution_id=execution_id, action=CommandAction.EVENT, params=event.model_dump(), seq=seq)
+
+def test_shard_key():
+    """Test that every event of an execution shares a shard key, whatever its exchange"""
+    assert shard_key(_event("run", "exchange", 1)) == shard_key(_event("run", "other", 2)) == "run"
+    assert shard_key(Command(execution_id="run", action=CommandAction.EVENT, params={"data": {}})) == "run"
+    assert shard_index("run", 4) == shard_index("run", 4)
+
+def test_delivery_tracker_acknowledges_contiguous_events():
+    """Test that the acknowledged sequence number never moves past an event that is still in flight"""
+    tracker = DeliveryTracker()
+    for seq in [1, 2, 3, 6]:
+        tracker.receive(seq)
+
+    tracker.complete(2, processed=True)
+    tracker.complete(3, processed=False)
+    assert tracker.ack == EventAck(seq=0, processed=1, dropped=1, lost=2)
+
+    # 4 and 5 were lost, they don't hold the acknowledgement back
+    tracker.complete(1, processed=True)
+    assert tracker.ack.seq == 5
+
+    tracker.complete(6, processed=True)
+    assert tracker.ack == EventAck(seq=6, processed=3, dropped=1, lost=2)
+
+@pytest.mark.asyncio
+async def test_events_are_processed_in_order_per_execution():
+    """Test that events of an execution keep their order while the executions are spread across shards"""
+    processor = EventProcessor(num_shards=4)
+    processed: list[tuple[str, str]] = []
+
+    async def process_event(event):
+        await asyncio.sleep(0)
+        processed.append((event.data["execution"], event.data["url"]))
+        return None
+
+    processor._process_event = process_event
+    await processor._setup()
+    try:
+        for step in range(5):
+            for execution in range(8):
+                cmd = _event(f"run-{execution}", f"exchange-{step}", step + 1)
+                cmd.params["data"].update(url=str(step), execution=cmd.execution_id)
+                await processor._route_event(cmd)
+
+        await asyncio.gather(*(shard.queue.join() for shard in processor._shards))
+        for execution in range(8):
+            assert [url for execution_id, url in processed if execution_id == f"run-{execution}"] == ["0", "1", "2", "3", "4"]
+
+        stats = [shard.stats() for shard in processor._shards]
+        assert sum(shard.processed for shard in stats) == 40
+        assert sum(1 for shard in stats if shard.processed) > 1
+        assert all(shard.depth == 0 for shard in stats)
+        assert all(processor._deliveries[f"run-{execution}"].ack == EventAck(seq=5, processed=5) for execution in range(8))
+    finally:
+        await processor._shutdown()
+
+@pytest.mark.asyncio
+async def test_exchanges_of_an_execution_are_committed_in_send_order():
+    """Test that a slow exchange isn't overtaken by the next exchange of the same execution"""
+    processor = EventProcessor(num_shards=4, batch_size=1, batch_linger=0)
+
+    async def process_event(event):
+        if event.data["exchange_id"] == "exchange-0":
+            await asyncio.sleep(0.05)
+        return [LLMNode(node_id=event.data["exchange_id"])], []
+
+    processor._process_event = process_event
+    await processor._setup()
+    try:
+        for seq in range(1, 3):
+            await processor._route_event(_event("run", f"exchange-{seq - 1}", seq))
+
+        await asyncio.gather(*(shard.queue.join() for shard in processor._shards))
+        nodes, _ = processor._graph_builder.get_structure()
+        assert [node.node_id for node in nodes[1:]] == ["exchange-0", "exchange-1"]
+    finally:
+        await processor._shutdown()
+
+def _delta(seq: int) -> Command:
+    event = HookEvent(event_type=HookEventType.HTTP_RESPONSE_DELTA, data={"frames": []})
+    return Command(execution_id="run", action=CommandAction.EVENT, params=event.model_dump(), seq=seq)
+
+@pytest.mark.asyncio
+async def test_shard_sheds_low_priority_events_first():
+    """Test that deltas are shed before the queue is full and everything else once it is"""
+    shard = EventShard(0, max_size=10, policy=BacklogPolicy.SHED)
+
+    for seq in range(1, 9):
+        assert await shard.put(_event("run", "exchange", seq))
+    assert not await shard.put(_delta(9))
+    assert await shard.put(_event("run", "exchange", 10))
+    assert await shard.put(_event("run", "exchange", 11))
+    assert not await shard.put(_event("run", "exchange", 12))
+
+    stats = shard.stats()
+    assert (stats.depth, stats.max_size, stats.shed, stats.blocked) == (10, 10, 2, 0)
+    assert stats.oldest_age_ms > 0
+
+@pytest.mark.asyncio
+async def test_shed_events_are_acknowledged_as_dropped():
+    processor = EventProcessor(num_shards=1, queue_size=1, backlog_policy=BacklogPolicy.SHED)
+    processor._shards = [EventShard(0, max_size=1, policy=BacklogPolicy.SHED)]
+
+    await processor._route_event(_event("run", "exchange", 1))
+    await processor._route_event(_event("run", "exchange", 2))
+
+    assert processor._deliveries["run"].ack == EventAck(seq=0, dropped=1)
+    assert processor._shards[0].stats().shed == 1
+
+@pytest.mark.asyncio
+async def test_full_shard_applies_backpressure():
+    """Test that putting into a full shard waits until the worker makes room"""
+    shard = EventShard(0, max_size=2)
+    await shard.put(_event("run", "exchange", 1))
+    await shard.put(_event("run", "exchange", 2))
+
+    put = asyncio.create_task(shard.put(_event("run", "exchange", 3)))
+    await asyncio.sleep(0.01)
+    assert not put.done()
+
+    await shard.queue.get()
+    shard.done()
+    assert await asyncio.wait_for(put, timeout=1)
+
+    stats = shard.stats()
+    assert (stats.depth, stats.processed, stats.shed, stats.blocked) == (2, 1, 0, 1)
+
+@pytest.mark.asyncio
+async def test_events_are_committed_and_notified_per_batch():
+    """Test that a burst of events updates the graph and notifies the webhooks once per batch"""
+    processor = EventProcessor(num_shards=1, batch_size=16, batch_linger=0)
+
+    async def process_event(event):
+        return [LLMNode(node_id=event.data["url"])], []
+
+    processor._process_event = process_event
+    await processor._setup()
+    webhook_handler = processor._webhook_handler
+    processor._webhook_handler = MagicMock(notify_webhooks=AsyncMock())
+    try:
+        for seq in range(1, 41):
+            cmd = _event("run", f"exchange-{seq}", seq)
+            cmd.params["data"]["url"] = f"model-{seq}"
+            await processor._route_event(cmd)
+
+        await processor._shards[0].queue.join()
+        stats = processor._shards[0].stats()
+        assert (stats.processed, stats.batches) == (40, 3)
+        assert processor._webhook_handler.notify_webhooks.await_count == 3
+
+        nodes, _ = processor._graph_builder.get_structure()
+        assert [node.node_id for node in nodes[1:]] == [f"model-{seq}" for seq in range(1, 41)]
+    finally:
+        processor._webhook_handler = webhook_handler
+        await processor._shutdown()
+
+@pytest.mark.asyncio
+async def test_shutdown_drains_queued_events():
+    """Test that the events queued when shutting down are processed and acknowledged"""
+    processor = EventProcessor(num_shards=2, batch_size=4)
+
+    async def process_event(event):
+        await asyncio.sleep(0.001)
+        return None
+
+    processor._process_event = process_event
+    await processor._setup()
+    for seq in range(1, 21):
+        await processor._route_event(_event("run", f"exchange-{seq}", seq))
+
+    drain = await processor._shutdown({"run": 20}, timeout=5)
+    assert (drain.flushed, drain.abandoned, drain.timed_out) == (20, 0, False)
+    assert processor._deliveries["run"].ack == EventAck(seq=20, processed=20)
+
+@pytest.mark.asyncio
+async def test_shutdown_abandons_events_past_the_deadline():
+    """Test that the events left once the drain deadline expires are reported as abandoned"""
+    processor = EventProcessor(num_shards=1, batch_size=1, batch_linger=0)
+    stuck = asyncio.Event()
+
+    async def process_event(event):
+        if event.data["exchange_id"] == "exchange-3":
+            await stuck.wait()
+        return None
+
+    processor._process_event = process_event
+    await processor._setup()
+    for seq in range(1, 6):
+        await processor._route_event(_event("run", f"exchange-{seq}", seq))
+
+    # Events 6 and 7 were sent but never read
+    drain = await processor._shutdown({"run": 7}, timeout=0.1)
+    assert (drain.flushed, drain.abandoned, drain.timed_out) == (2, 5, True)
+    assert processor._deliveries["run"].ack.seq == 2
+
+@pytest.mark.asyncio
+async def test_shutdown_drops_events_waiting_for_room():
+    """Test that an event whose poller is cancelled while waiting for a full shard is dropped and abandoned"""
+    processor = EventProcessor(num_shards=1, queue_size=1, batch_size=1, batch_linger=0)
+    stuck = asyncio.Event()
+
+    async def process_event(event):
+        await stuck.wait()
+        return None
+
+    processor._process_event = process_event
+    await processor._setup()
+    await processor._route_event(_event("run", "exchange-1", 1))
+    await asyncio.sleep(0.01)
+    await processor._route_event(_event("run", "exchange-2", 2))
+
+    async def poll():
+        # The shard is full, the poller waits for room until it's cancelled
+        try:
+            await processor._route_event(_event("run", "exchange-3", 3))
+        except asyncio.CancelledError:
+            pass
+
+    processor._pollers.append(asyncio.create_task(poll()))
+    await asyncio.sleep(0.01)
+
+    drain = await processor._shutdown({"run": 3}, timeout=0.1)
+    assert (drain.flushed, drain.abandoned, drain.timed_out) == (0, 3, True)
+    assert processor._deliveries["run"].ack == EventAck(seq=0, dropped=1)
+
+@pytest.mark.asyncio
+async def test_disconnected_client_is_forgotten_once_its_events_are_done():
+    """Test that a dropped client's delivery is kept until its queued events were processed, then forgotten"""
+    processor = EventProcessor(num_shards=1)
+    release = asyncio.Event()
+
+    async def process_event(event):
+        await release.wait()
+        return None
+
+    processor._process_event = process_event
+    await processor._setup()
+    try:
+        connection = MagicMock()
+        processor._response_pipes["run"] = connection
+        for seq in range(1, 4):
+            await processor._route_event(_event("run", f"exchange-{seq}", seq))
+        processor._sent_acks["run"] = EventAck()
+
+        processor._drop_connection(connection)
+        assert "run" in processor._deliveries
+
+        release.set()
+        await processor._shards[0].queue.join()
+        assert "run" not in processor._deliveries
+        assert "run" not in processor._sent_acks
+        assert "run" not in processor._disconnected
+    finally:
+        await processor._shutdown()
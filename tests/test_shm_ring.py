@@ -0,0 +1,131 @@
+from multiprocessing import Pipe, Process
+
+import pytest
+
+from agentwatch.enums import CommandAction
+from agentwatch.models import Command
+from agentwatch.pipes import FrameReader, Pipes
+from agentwatch.shm_ring import ShmRing
+
+
+@pytest.fixture
+def ring():
+    ring = ShmRing(capacity=64, create=True)
+    yield ring
+    ring.close()
+
+def _command(index: int) -> Command:
+    return Command(execution_id="test", action=CommandAction.EVENT, params={"index": index})
+
+def test_write_and_read(ring):
+    consumer = ShmRing(name=ring.name, lock=ring.lock)
+    try:
+        assert consumer.capacity == 64
+        assert ring.write(b"hello")
+        assert ring.write(b"world")
+        assert consumer.read_all() == [b"hello", b"world"]
+        assert consumer.read_all() == []
+        assert ring.used() == 0
+    finally:
+        consumer.close()
+
+def test_attaching_requires_the_lock(ring):
+    with pytest.raises(ValueError):
+        ShmRing(name=ring.name)
+
+def test_wrap_around(ring):
+    for i in range(20):
+        record = bytes([i]) * 20
+        assert ring.write(record)
+        assert ring.read_all() == [record]
+
+    assert ring.stats().ring_frames == 20
+
+def test_full(ring):
+    assert ring.write(b"x" * 40)
+    assert not ring.write(b"y" * 40)
+    assert not ring.write(b"z" * 100)
+
+    assert ring.read_all() == [b"x" * 40]
+    assert ring.write(b"y" * 40)
+    assert ring.stats().ring_full == 2
+
+def test_frames_go_through_ring():
+    ring = ShmRing(capacity=4096, create=True)
+    writer, connection = Pipe()
+    reader = FrameReader(connection)
+    try:
+        Pipes.write_frame_sync(writer, [_command(0), _command(1)], ring)
+
+        # Nothing but the ring was used
+        assert not reader.poll()
+        payloads = Pipes.read_frames_sync(reader, ring, timeout=0)
+        assert [payload["params"]["index"] for payload in payloads] == [0, 1]
+    finally:
+        ring.close()
+
+def test_waiting_reader_is_woken_up():
+    ring = ShmRing(capacity=4096, create=True)
+    writer, connection = Pipe()
+    reader = FrameReader(connection)
+    try:
+        # The reader found nothing and is about to sleep
+        assert Pipes.read_frames_sync(reader, ring, timeout=0) == []
+        assert ring.consumer_waiting
+
+        Pipes.write_frame_sync(writer, [_command(0)], ring)
+        assert reader.poll()
+
+        payloads = Pipes.read_frames_sync(reader, ring, timeout=1)
+        assert [payload["params"]["index"] for payload in payloads] == [0]
+    finally:
+        ring.close()
+
+def test_pipe_fallback_keeps_order():
+    ring = ShmRing(capacity=256, create=True)
+    writer, connection = Pipe()
+    reader = FrameReader(connection)
+    try:
+        big = Command(execution_id="test", action=CommandAction.EVENT, params={"index": 1, "body": "x" * 512})
+        Pipes.write_frame_sync(writer, [_command(0)], ring)
+        # Doesn't fit, goes through the pipe
+        Pipes.write_frame_sync(writer, [big], ring)
+        # Fits, but must not overtake the pending pipe frame
+        Pipes.write_frame_sync(writer, [_command(2)], ring)
+
+        received = []
+        while len(received) < 3:
+            received.extend(payload["params"]["index"] for payload in Pipes.read_frames_sync(reader, ring, timeout=1))
+
+        assert received == [0, 1, 2]
+        assert ring.stats().pipe_frames == 2
+    finally:
+        ring.close()
+
+def _produce(name, lock, writer, count):
+    ring = ShmRing(name=name, lock=lock)
+    try:
+        for i in range(count):
+            Pipes.write_frame_sync(writer, [_command(i)], ring)
+    finally:
+        ring.close()
+
+def test_no_wakeup_is_missed_across_processes():
+    count = 2000
+    ring = ShmRing(capacity=1024, create=True)
+    writer, connection = Pipe()
+    reader = FrameReader(connection)
+    producer = Process(target=_produce, args=(ring.name, ring.lock, writer, count))
+    producer.start()
+    try:
+        received = []
+        while len(received) < count:
+            # Without the periodic look at the ring, a missed wakeup leaves the reader asleep
+            payloads = Pipes.read_frames_sync(reader, ring, timeout=5)
+            assert payloads, f"reader stalled after {len(received)} frames"
+            received.extend(payload["params"]["index"] for payload in payloads)
+
+        assert received == list(range(count))
+    finally:
+        producer.join()
+        ring.close()
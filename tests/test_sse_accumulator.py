@@ -0,0 +1,54 @@
+import time
+
+from agentwatch.hooks.http.sse_accumulator import SSEAccumulator
+
+
+def test_feed_splits_frames_across_chunks():
+    accumulator = SSEAccumulator()
+
+    assert accumulator.feed(b'event: message\ndata: {"a"') == []
+    frames = accumulator.feed(b': 1}\n\ndata: second\r\n\r\ndata: third')
+
+    assert [frame.data for frame in frames] == ['{"a": 1}', "second"]
+    assert frames[0].event == "message"
+    assert accumulator.frames_count == 2
+
+    trailing = accumulator.finish()
+    assert [frame.data for frame in trailing] == ["third"]
+    assert accumulator.frames_count == 3
+
+def test_feed_ignores_comments_and_joins_multiline_data():
+    accumulator = SSEAccumulator()
+
+    frames = accumulator.feed(b": keep-alive\n\ndata: line 1\ndata: line 2\nid: 7\n\n")
+
+    assert len(frames) == 1
+    assert frames[0].data == "line 1\nline 2"
+    assert frames[0].id == "7"
+
+def test_no_deltas_by_default():
+    accumulator = SSEAccumulator()
+    accumulator.feed(b"data: 1\n\n" * 100)
+
+    assert accumulator.should_emit_delta() is False
+    assert accumulator.take_delta() == []
+
+def test_delta_by_size():
+    accumulator = SSEAccumulator(delta_bytes=20)
+
+    accumulator.feed(b"data: 1\n\n")
+    assert accumulator.should_emit_delta() is False
+
+    accumulator.feed(b"data: 2\n\ndata: 3\n\n")
+    assert accumulator.should_emit_delta() is True
+    assert [frame.data for frame in accumulator.take_delta()] == ["1", "2", "3"]
+    assert accumulator.should_emit_delta() is False
+
+def test_delta_by_interval():
+    accumulator = SSEAccumulator(delta_interval_ms=10)
+
+    accumulator.feed(b"data: 1\n\n")
+    assert accumulator.should_emit_delta() is False
+
+    time.sleep(0.02)
+    assert accumulator.should_emit_delta() is True